@@ -97,6 +97,8 @@ class CreatorAgent(NovelAgentAdapter):
 
     async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """执行创意生成任务"""
+        if "prompt" in context:
+            return await self.complete_prompt(context)
         self.log_activity("执行", "创意生成器就绪")
         return {
             "status": "ready",
@@ -97,6 +97,8 @@ class WriterAgent(NovelAgentAdapter):
 
     async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """执行写作任务"""
+        if "prompt" in context:
+            return await self.complete_prompt(context)
         self.log_activity("执行", "写作者就绪")
         return {
             "status": "ready",
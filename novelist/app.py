@@ -7,6 +7,7 @@ import logging
 from datetime import datetime
 import yaml
 
+from .core.budget import RunBudget
 from .core.workflow import WorkflowManager
 from .core.llm_factory import LLMFactory
 from .agents.creator_agent import CreatorAgent
@@ -61,8 +62,8 @@ async def main():
         # 加载故事种子
         story_seed = load_story_seed()
 
-        # 创建并配置工作流
-        workflow = WorkflowManager()
+        # 创建并配置工作流（BATCH_前缀的预算限制整个进程的用量）
+        workflow = WorkflowManager(batch_budget=RunBudget.from_env("BATCH"))
         workflow.update_context({"story_seed": story_seed})
 
         # 注册所有参与创作的Agents
@@ -79,7 +80,11 @@ async def main():
 
         # 执行工作流
         logger.info("开始小说创作工作流")
-        result = await workflow.run_workflow()
+        try:
+            result = await workflow.run_workflow()
+        finally:
+            for agent in agents.values():
+                await agent.close()
 
         if "final_draft" not in result:
             raise ValueError("工作流未生成最终作品")
@@ -13,6 +13,8 @@ try:
 except ImportError:
     raise ImportError("请先安装autogen-core==0.4.8.2")
 
+from .llm_client import ChatCompletionClient
+from .llm_factory import LLMFactory
 from .logging import NovelLogger
 
 logger = NovelLogger().get_logger(__name__)
@@ -43,6 +45,7 @@ class NovelAgentAdapter(AgentBase, ABC):
         super().__init__()
 
         self._message_handlers = {}
+        self._client: Optional[ChatCompletionClient] = None
         self.logger = NovelLogger().get_logger(f"novelist.{name}")
         self.logger.info(f"创建了{name} Agent")
 
@@ -126,6 +129,45 @@ class NovelAgentAdapter(AgentBase, ABC):
             "capabilities": ["conversation", "task_execution"],
         }
 
+    async def complete_prompt(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        通过端点连接池把context中的prompt发送给LLM
+
+        context中的llm_config覆盖Agent的默认配置；传入on_token时以流式请求逐段回报内容，
+        on_retry在切换端点重试前被调用。
+
+        Args:
+            context: 工作流传入的上下文，至少包含prompt
+
+        Returns:
+            content、usage、finish_reason和实际使用的endpoint
+        """
+        agent_config = LLMFactory.get_agent_config(self.name)
+        llm_config = context.get("llm_config") or agent_config["llm_config"]
+        if self._client is None:
+            self._client = LLMFactory.create_client(self.name)
+        messages = [{"role": "user", "content": context["prompt"]}]
+        if agent_config.get("role_prompt"):
+            messages.insert(0, {"role": "system", "content": agent_config["role_prompt"]})
+        params = {
+            key: llm_config[key]
+            for key in ("temperature", "max_tokens")
+            if llm_config.get(key) is not None
+        }
+        return await self._client.complete(
+            llm_config.get("model"),
+            messages,
+            on_retry=context.get("on_retry"),
+            on_token=context.get("on_token"),
+            **params,
+        )
+
+    async def close(self) -> None:
+        """关闭Agent使用的LLM客户端"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
     def log_activity(self, action: str, message: str) -> None:
         """记录Agent活动日志"""
         self.logger.info(f"[{action}] {message}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, Any, Callable, List, Optional, Sequence
+from typing_extensions import TypedDict
+
+from .fact_index import FactIndex
+from .quality_metrics import QualityMetrics
+from .repetition import RepetitionDetector
+from .sections import split_sections
+
+# 各项本地信号的权重：通过预检的候选总是排在未通过的候选之前
+SIGNAL_WEIGHTS: Dict[str, float] = {
+    "passed": 10.0,
+    "coverage": 1.0,
+    "diversity": 0.5,
+    "sections": 0.5,
+    "repetition": -2.0,
+    "conflicts": -0.2,
+    "truncated": -1.0,
+}
+# 设定冲突的惩罚上限（条数）
+MAX_CONFLICT_PENALTY = 5
+
+_CHOICE = re.compile(r"最佳候选[：:]\s*(?:候选)?\s*(\d+)")
+
+
+class Candidate(TypedDict):
+    index: int  # 生成顺序（从0开始）
+    content: str
+    score: float  # 本地信号的加权和
+    signals: Dict[str, float]
+    result: Dict[str, Any]  # Agent的原始返回
+
+
+class CandidateRanker:
+    """
+    用本地信号为同一阶段的多个候选排序
+
+    信号包括质量预检是否通过、人物和关键场景覆盖率、词汇多样性、
+    是否按章节划分、近似重复段落占比、设定冲突数和输出是否被截断，
+    全部在本地计算，不调用LLM。
+    """
+
+    def __init__(
+        self,
+        quality: QualityMetrics,
+        facts: Optional[FactIndex] = None,
+        detector_factory: Callable[[], RepetitionDetector] = RepetitionDetector,
+    ):
+        """
+        初始化
+
+        Args:
+            quality: 本地质量指标
+            facts: 设定索引，None表示不检查设定冲突
+            detector_factory: 创建复读检测器（与工作流的复读检测使用相同的相似度和占比上限）
+        """
+        self.quality = quality
+        self.facts = facts
+        self.detector_factory = detector_factory
+
+    def signals(
+        self, content: str, finish_reason: Optional[str] = None, sectioned: bool = False
+    ) -> Dict[str, float]:
+        """
+        计算单个候选的本地信号
+
+        Args:
+            content: 候选内容
+            finish_reason: Agent返回的结束原因，被截断或因复读中止时扣分
+            sectioned: 是否要求按“第X章”划分章节（如流水线所需的大纲）
+        """
+        report = self.quality.measure(content)
+        metrics = report["metrics"]
+        coverage = [
+            metrics[key]
+            for key in ("character_coverage", "scene_coverage")
+            if key in metrics
+        ]
+        detector = self.detector_factory()
+        detector.trim(content)
+        signals = {
+            "passed": float(report["passed"]),
+            "coverage": sum(coverage) / len(coverage) if coverage else 0.0,
+            "diversity": metrics["lexical_diversity"],
+            "repetition": round(detector.ratio, 3),
+            "conflicts": float(
+                min(MAX_CONFLICT_PENALTY, len(self.facts.check(content)))
+                if self.facts is not None
+                else 0
+            ),
+            "truncated": float(finish_reason in ("length", "repetition")),
+        }
+        if sectioned:
+            signals["sections"] = float(len(split_sections(content)) >= 2)
+        return signals
+
+    def rank(
+        self, results: Sequence[Dict[str, Any]], sectioned: bool = False
+    ) -> List[Candidate]:
+        """
+        为候选排序
+
+        Args:
+            results: 各候选的Agent返回（含content和finish_reason）
+            sectioned: 是否要求按章节划分
+
+        Returns:
+            List[Candidate]: 按得分从高到低排列的候选，得分相同时保持生成顺序
+        """
+        candidates = []
+        for index, result in enumerate(results):
+            content = result.get("content") or ""
+            if not content.strip():
+                continue
+            signals = self.signals(content, result.get("finish_reason"), sectioned)
+            score = sum(SIGNAL_WEIGHTS[key] * value for key, value in signals.items())
+            candidates.append(
+                Candidate(
+                    index=index,
+                    content=content,
+                    score=round(score, 3),
+                    signals=signals,
+                    result=result,
+                )
+            )
+        return sorted(candidates, key=lambda c: (-c["score"], c["index"]))
+
+    @staticmethod
+    def parse_choice(response_text: str, count: int) -> Optional[int]:
+        """从评审意见中解析选中的候选（返回从0开始的序号），无法解析时返回None"""
+        match = _CHOICE.search(response_text or "")
+        if not match:
+            return None
+        choice = int(match.group(1)) - 1
+        return choice if 0 <= choice < count else None
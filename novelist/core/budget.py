@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from typing import Dict, Any, Optional
+
+# 预算用量达到软上限后可采取的策略
+BUDGET_POLICIES = ("downgrade", "skip_optional", "finalize")
+
+
+class BudgetExhausted(RuntimeError):
+    """预算耗尽，需要立即以当前最佳稿件结束"""
+
+
+class RunBudget:
+    """
+    运行预算：实时统计token、费用和耗时
+
+    可以设置父预算（如整批任务的预算），记录用量时会同时计入父预算，
+    任一层级的用量都会影响预算状态。
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        max_seconds: Optional[float] = None,
+        soft_limit: float = 0.8,
+        parent: Optional["RunBudget"] = None,
+    ):
+        """
+        初始化预算
+
+        Args:
+            max_tokens: token上限
+            max_cost: 费用上限
+            max_seconds: 耗时上限（秒）
+            soft_limit: 软上限比例，超过后开始执行降级策略
+            parent: 父预算
+        """
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.max_seconds = max_seconds
+        self.soft_limit = soft_limit
+        self.parent = parent
+        self.tokens = 0
+        self.cost = 0.0
+        self.calls = 0
+        self.by_agent: Dict[str, Dict[str, float]] = {}
+        self._started_at: Optional[float] = None
+
+    @classmethod
+    def from_env(
+        cls, prefix: str = "RUN", parent: Optional["RunBudget"] = None
+    ) -> "RunBudget":
+        """
+        根据环境变量创建预算，如RUN_TOKEN_BUDGET、BATCH_COST_BUDGET
+
+        Args:
+            prefix: 环境变量前缀
+            parent: 父预算
+        """
+
+        def read(name: str, cast):
+            value = os.getenv(f"{prefix}_{name}")
+            return cast(value) if value else None
+
+        return cls(
+            max_tokens=read("TOKEN_BUDGET", int),
+            max_cost=read("COST_BUDGET", float),
+            max_seconds=read("TIME_BUDGET", float),
+            soft_limit=float(os.getenv("BUDGET_SOFT_LIMIT", 0.8)),
+            parent=parent,
+        )
+
+    @property
+    def limited(self) -> bool:
+        """是否设置了任何上限"""
+        own = any(
+            limit is not None
+            for limit in (self.max_tokens, self.max_cost, self.max_seconds)
+        )
+        return own or (self.parent is not None and self.parent.limited)
+
+    def start(self) -> None:
+        """开始计时（重复调用不会重置）"""
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        if self.parent is not None:
+            self.parent.start()
+
+    def reset(self) -> None:
+        """清空用量并停止计时，上限和父预算保持不变"""
+        self.tokens = 0
+        self.cost = 0.0
+        self.calls = 0
+        self.by_agent = {}
+        self._started_at = None
+
+    @property
+    def elapsed(self) -> float:
+        """已耗时（秒）"""
+        if self._started_at is None:
+            return 0.0
+        return time.monotonic() - self._started_at
+
+    def record(
+        self,
+        agent_type: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        pricing: Optional[Dict[str, float]] = None,
+    ) -> float:
+        """
+        记录一次调用的用量
+
+        Args:
+            agent_type: Agent类型
+            prompt_tokens: 输入token数
+            completion_tokens: 输出token数
+            pricing: 模型单价（每千token），包含input和output
+
+        Returns:
+            float: 本次调用的费用
+        """
+        pricing = pricing or {}
+        cost = (
+            prompt_tokens * pricing.get("input", 0.0)
+            + completion_tokens * pricing.get("output", 0.0)
+        ) / 1000
+        tokens = prompt_tokens + completion_tokens
+
+        self.tokens += tokens
+        self.cost += cost
+        self.calls += 1
+        agent_usage = self.by_agent.setdefault(
+            agent_type, {"calls": 0, "tokens": 0, "cost": 0.0}
+        )
+        agent_usage["calls"] += 1
+        agent_usage["tokens"] += tokens
+        agent_usage["cost"] += cost
+
+        if self.parent is not None:
+            self.parent.record(agent_type, prompt_tokens, completion_tokens, pricing)
+        return cost
+
+    def fraction_used(self) -> float:
+        """各项上限中用量占比最高的一项（包括父预算）"""
+        fractions = [0.0]
+        for used, limit in (
+            (self.tokens, self.max_tokens),
+            (self.cost, self.max_cost),
+            (self.elapsed, self.max_seconds),
+        ):
+            if limit:
+                fractions.append(used / limit)
+        if self.parent is not None:
+            fractions.append(self.parent.fraction_used())
+        return max(fractions)
+
+    def status(self) -> str:
+        """
+        获取预算状态
+
+        Returns:
+            str: ok（充足）、soft（超过软上限）或exhausted（耗尽）
+        """
+        used = self.fraction_used()
+        if used >= 1:
+            return "exhausted"
+        if used >= self.soft_limit:
+            return "soft"
+        return "ok"
+
+    def report(self) -> Dict[str, Any]:
+        """生成用量报告"""
+        return {
+            "tokens": self.tokens,
+            "cost": round(self.cost, 6),
+            "elapsed": round(self.elapsed, 3),
+            "calls": self.calls,
+            "fraction_used": round(self.fraction_used(), 4),
+            "status": self.status(),
+            "by_agent": {name: dict(usage) for name, usage in self.by_agent.items()},
+        }
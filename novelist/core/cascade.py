@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Dict, Any, List, Optional, Iterable
+
+from .llm_factory import LLMFactory
+
+
+class ModelCascade:
+    """
+    模型级联：每个角色先使用便宜的小模型，评分持续不达标或停滞时再升级
+
+    每个角色的模型档位按从便宜到昂贵排列，升级只会向更大的模型移动。
+    """
+
+    def __init__(self, tiers: Dict[str, List[str]]):
+        """
+        初始化级联
+
+        Args:
+            tiers: 角色 -> 按从便宜到昂贵排列的模型列表
+        """
+        self.tiers = {role: list(models) for role, models in tiers.items() if models}
+        self.levels: Dict[str, int] = {role: 0 for role in self.tiers}
+        self.escalations: Dict[str, int] = {role: 0 for role in self.tiers}
+        self.calls: Dict[str, Dict[str, int]] = {role: {} for role in self.tiers}
+        self.logger = logging.getLogger("novelist.cascade")
+
+    @classmethod
+    def from_config(cls, roles: Iterable[str]) -> "ModelCascade":
+        """
+        从llm_config.yaml中各角色的cascade配置创建级联
+
+        Args:
+            roles: 需要读取配置的角色
+        """
+        tiers: Dict[str, List[str]] = {}
+        for role in roles:
+            try:
+                cascade = LLMFactory.get_agent_config(role).get("cascade")
+            except ValueError:
+                continue
+            if cascade:
+                tiers[role] = list(cascade)
+        return cls(tiers)
+
+    def model_for(self, role: str) -> Optional[str]:
+        """获取角色当前档位的模型，未配置级联的角色返回None"""
+        if role not in self.tiers:
+            return None
+        model = self.tiers[role][self.levels[role]]
+        self.calls[role][model] = self.calls[role].get(model, 0) + 1
+        return model
+
+    def escalate(self, roles: Optional[Iterable[str]] = None, reason: str = "") -> List[str]:
+        """
+        将角色升级到下一档模型
+
+        Args:
+            roles: 需要升级的角色，默认全部
+            reason: 升级原因，用于日志
+
+        Returns:
+            List[str]: 实际发生升级的角色
+        """
+        escalated = []
+        for role in roles if roles is not None else list(self.tiers):
+            if role not in self.tiers:
+                continue
+            if self.levels[role] + 1 >= len(self.tiers[role]):
+                continue
+            self.levels[role] += 1
+            self.escalations[role] += 1
+            escalated.append(role)
+            self.logger.info(
+                f"{role}升级到模型 {self.tiers[role][self.levels[role]]}"
+                + (f"（{reason}）" if reason else "")
+            )
+        return escalated
+
+    def report(self) -> Dict[str, Any]:
+        """各角色的当前档位、升级次数和各模型调用次数"""
+        return {
+            role: {
+                "model": self.tiers[role][self.levels[role]],
+                "tier": self.levels[role],
+                "escalations": self.escalations[role],
+                "calls": dict(self.calls[role]),
+            }
+            for role in self.tiers
+        }
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from difflib import SequenceMatcher
+from typing import Dict, Any, List, Optional, Union
+
+from .draft import Draft
+
+DraftLike = Union[str, Draft, None]
+
+
+def split_paragraphs(text: DraftLike) -> List[str]:
+    """按行切分段落，忽略空行；Draft按章节块切分"""
+    if isinstance(text, Draft):
+        return text.paragraph_texts()
+    if not text:
+        return []
+    return [line.strip() for line in text.split("\n") if line.strip()]
+
+
+class ConvergenceDetector:
+    """
+    编辑收敛检测器
+
+    比较相邻两版草稿的段落差异，并跟踪评分轨迹，
+    在编辑已经不再产生实质改动或评分停滞时提前结束编辑循环。
+    """
+
+    def __init__(
+        self,
+        edit_ratio_threshold: float = 0.01,
+        max_changed_paragraphs: int = 1,
+        plateau_window: int = 2,
+        plateau_epsilon: float = 2.0,
+    ):
+        """
+        初始化检测器
+
+        Args:
+            edit_ratio_threshold: 改动字符占比不超过该值视为收敛
+            max_changed_paragraphs: 改动段落数不超过该值视为收敛
+            plateau_window: 评分停滞的观察轮数
+            plateau_epsilon: 观察窗口内评分提升不超过该值视为停滞
+        """
+        self.edit_ratio_threshold = edit_ratio_threshold
+        self.max_changed_paragraphs = max_changed_paragraphs
+        self.plateau_window = max(1, plateau_window)
+        self.plateau_epsilon = plateau_epsilon
+        self.scores: List[float] = []
+
+    def compare(self, previous: DraftLike, current: DraftLike) -> Dict[str, Any]:
+        """
+        计算两版草稿之间的差异
+
+        段落级比较只对段落哈希做序列匹配，仅对被替换的段落做字符级比较，
+        因此开销随改动量而不是全文长度增长。
+
+        Returns:
+            Dict[str, Any]: edit_ratio（改动字符占比）、changed_paragraphs和total_paragraphs
+        """
+        old = split_paragraphs(previous)
+        new = split_paragraphs(current)
+        total_chars = sum(map(len, old)) + sum(map(len, new))
+        if total_chars == 0:
+            return {"edit_ratio": 0.0, "changed_paragraphs": 0, "total_paragraphs": 0}
+
+        matcher = SequenceMatcher(None, [hash(p) for p in old], [hash(p) for p in new])
+        changed_chars = 0.0
+        changed_paragraphs = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            changed_paragraphs += max(i2 - i1, j2 - j1)
+            pairs = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+            for a, b in zip(old[i1 : i1 + pairs], new[j1 : j1 + pairs]):
+                similarity = SequenceMatcher(None, a, b, autojunk=False).ratio()
+                changed_chars += (1 - similarity) * (len(a) + len(b))
+            changed_chars += sum(map(len, old[i1 + pairs : i2]))
+            changed_chars += sum(map(len, new[j1 + pairs : j2]))
+
+        return {
+            "edit_ratio": changed_chars / total_chars,
+            "changed_paragraphs": changed_paragraphs,
+            "total_paragraphs": len(new),
+        }
+
+    def check_edit(self, previous: DraftLike, current: DraftLike) -> Optional[str]:
+        """
+        判断本轮编辑是否已收敛
+
+        Returns:
+            Optional[str]: 收敛原因；未收敛时返回None
+        """
+        diff = self.compare(previous, current)
+        if (
+            diff["edit_ratio"] <= self.edit_ratio_threshold
+            and diff["changed_paragraphs"] <= self.max_changed_paragraphs
+        ):
+            return (
+                f"编辑已收敛：改动比例{diff['edit_ratio']:.2%}，"
+                f"改动段落{diff['changed_paragraphs']}/{diff['total_paragraphs']}"
+            )
+        return None
+
+    def record_score(self, score: float) -> Optional[str]:
+        """
+        记录评分并判断是否停滞
+
+        Returns:
+            Optional[str]: 停滞原因；评分仍在提升时返回None
+        """
+        self.scores.append(score)
+        if len(self.scores) <= self.plateau_window:
+            return None
+        baseline = self.scores[-self.plateau_window - 1]
+        gain = max(self.scores[-self.plateau_window :]) - baseline
+        if gain <= self.plateau_epsilon:
+            return f"评分停滞：最近{self.plateau_window}轮提升{gain:.1f}分"
+        return None
+
+    def reset(self) -> None:
+        """开始新一轮修订时清空评分轨迹"""
+        self.scores = []
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 运行超过截止时间后的处理策略：best_draft以目前最佳版本结束，fail直接报错
+DEADLINE_POLICIES = ("best_draft", "fail")
+
+# 当前协程链上生效的截止时间，asyncio.create_task会复制它，子任务因此继承截止时间
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar(
+    "novelist_deadline", default=None
+)
+
+
+class DeadlineExceeded(RuntimeError):
+    """运行、阶段或单次请求超过截止时间"""
+
+
+class RequestTimeout(RuntimeError):
+    """单次请求超过自身的超时（运行和阶段的截止时间未到），可以重试"""
+
+
+class Deadline:
+    """
+    截止时间
+
+    子截止时间不会晚于父截止时间，整次运行的截止时间因此逐级传递到阶段和单次请求。
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        """
+        初始化截止时间
+
+        Args:
+            seconds: 从现在起的秒数，None表示不限制
+            parent: 父截止时间
+        """
+        self.expires_at: Optional[float] = (
+            time.monotonic() + seconds if seconds is not None else None
+        )
+        if parent is not None and parent.expires_at is not None:
+            if self.expires_at is None or parent.expires_at < self.expires_at:
+                self.expires_at = parent.expires_at
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限制时返回None"""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """单次操作可用的超时：默认超时与剩余时间中较小的一个"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return max(0.0, remaining)
+        return max(0.0, min(default, remaining))
+
+    def activate(self) -> Any:
+        """设为当前截止时间，返回用于恢复的token"""
+        return _current_deadline.set(self)
+
+    @staticmethod
+    def restore(token: Any) -> None:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """获取当前生效的截止时间"""
+    return _current_deadline.get()
+
+
+def effective_timeout(default: Optional[float]) -> Optional[float]:
+    """结合当前截止时间计算单次操作的超时"""
+    deadline = current_deadline()
+    return deadline.timeout(default) if deadline is not None else default
+
+
+async def run_with_timeout(
+    awaitable: Awaitable[T], timeout: Optional[float], what: str
+) -> T:
+    """
+    在超时内等待操作完成，超时时取消操作并抛出DeadlineExceeded
+
+    Args:
+        awaitable: 待执行的协程
+        timeout: 超时秒数，None表示不限制
+        what: 操作名称，用于错误信息
+    """
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"{what}已超过截止时间")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{what}超时（{timeout:.1f}秒）") from None
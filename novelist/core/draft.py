@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .sections import CHAPTER_HEADING
+
+
+class Chapter:
+    """
+    章节块：从章节标题开始、到下一个章节标题之前的文本
+
+    相同文本的章节在进程内只有一个实例，通过Chapter.of获取，
+    未改动的章节在各版本草稿之间因此是同一个对象。
+    段落不单独保存，需要时从章节文本按行切分。
+    """
+
+    __slots__ = ("text", "heading", "__weakref__")
+
+    _pool: "weakref.WeakValueDictionary[str, Chapter]" = weakref.WeakValueDictionary()
+
+    def __init__(self, text: str, heading: bool):
+        self.text = text
+        self.heading = heading  # 是否包含章节标题
+
+    @classmethod
+    def of(cls, text: str, heading: bool) -> "Chapter":
+        """获取文本对应的章节实例"""
+        chapter = cls._pool.get(text)
+        if chapter is None:
+            chapter = cls(text, heading)
+            cls._pool[text] = chapter
+        return chapter
+
+    def lines(self) -> List[str]:
+        return self.text.split("\n")
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __repr__(self) -> str:
+        return f"Chapter({self.text[:20]!r})"
+
+
+class Draft:
+    """
+    由章节块组成的草稿
+
+    各版本草稿共享未改动的章节，只有改动过的章节占用新的内存；
+    草稿只保存章节块，不再另外缓存完整文本，
+    完整文本在需要时（构建prompt、保存文件）拼接。
+    """
+
+    __slots__ = ("chapters",)
+
+    def __init__(self, chapters: Tuple[Chapter, ...]):
+        self.chapters = chapters
+
+    @classmethod
+    def from_text(cls, text: str) -> "Draft":
+        """
+        将文本切分为章节块
+
+        遇到章节标题行时开始新的章节，第一个标题之前的内容（如书名）并入第一章；
+        章节之间以换行分隔，text可以逐字符还原原始文本。
+        """
+        starts = [match.start() for match in CHAPTER_HEADING.finditer(text)]
+        if not starts:
+            return cls((Chapter.of(text, False),))
+        # 第一个标题之前的内容并入第一章，后续章节从标题行开始（不含前面的换行）
+        starts[0] = 0
+        ends = [start - 1 for start in starts[1:]] + [len(text)]
+        return cls(
+            tuple(
+                Chapter.of(text[begin:end], True) for begin, end in zip(starts, ends)
+            )
+        )
+
+    @property
+    def text(self) -> str:
+        """完整文本（只有一个章节时直接返回该章节的文本）"""
+        if len(self.chapters) == 1:
+            return self.chapters[0].text
+        return "\n".join(chapter.text for chapter in self.chapters)
+
+    def paragraphs(self) -> Iterator[str]:
+        """按行切分的段落（保留原始空白）"""
+        for chapter in self.chapters:
+            yield from chapter.lines()
+
+    def paragraph_texts(self) -> List[str]:
+        """非空段落（去除首尾空白），与convergence.split_paragraphs的结果一致"""
+        return [line.strip() for line in self.paragraphs() if line.strip()]
+
+    def sections(self) -> List[str]:
+        """章节文本，与sections.split_sections的结果一致"""
+        if not any(chapter.heading for chapter in self.chapters):
+            text = self.text
+            return [text] if text else []
+        return [
+            section
+            for section in (chapter.text.strip("\n") for chapter in self.chapters)
+            if section.strip()
+        ]
+
+    def section_spans(self) -> List[Tuple[int, int]]:
+        """sections()中每个章节在完整文本中的[起始, 结束)偏移"""
+        if not any(chapter.heading for chapter in self.chapters):
+            return [(0, len(self))] if len(self) else []
+        spans = []
+        offset = 0
+        for chapter in self.chapters:
+            text = chapter.text
+            if text.strip():
+                start = offset + len(text) - len(text.lstrip("\n"))
+                end = offset + len(text.rstrip("\n"))
+                spans.append((start, end))
+            offset += len(text) + 1
+        return spans
+
+    def replace_sections(self, replacements: Dict[int, str]) -> "Draft":
+        """
+        替换指定章节，其余内容（包括章节之间的空行）保持不变
+
+        只切分替换后的章节，其余章节块原样复用，完整文本在需要时才重新拼接。
+
+        Args:
+            replacements: sections()中的章节下标 -> 新的章节文本
+        """
+        if not replacements:
+            return self
+        if not any(chapter.heading for chapter in self.chapters):
+            # 没有章节标题时整篇就是唯一的章节
+            return Draft.from_text(replacements[0].strip("\n"))
+
+        positions = [i for i, chapter in enumerate(self.chapters) if chapter.text.strip()]
+        parsed: Dict[int, Tuple[Chapter, ...]] = {}
+        for index, replacement in replacements.items():
+            position = positions[index]
+            old = self.chapters[position].text
+            lead = old[: len(old) - len(old.lstrip("\n"))]
+            trail = old[len(old.rstrip("\n")) :]
+            blocks = Draft.from_text(lead + replacement.strip("\n") + trail).chapters
+            # 新章节必须以章节标题开头（第一章之前可以有书名等内容），
+            # 否则章节边界会变化（如丢了标题），按完整文本重新切分
+            if not blocks[0].heading or (
+                position and not CHAPTER_HEADING.match(blocks[0].text)
+            ):
+                spans = self.section_spans()
+                text = self.text
+                for i in sorted(replacements, reverse=True):
+                    begin, end = spans[i]
+                    text = text[:begin] + replacements[i].strip("\n") + text[end:]
+                return Draft.from_text(text)
+            parsed[position] = blocks
+
+        chapters: List[Chapter] = []
+        for position, chapter in enumerate(self.chapters):
+            chapters.extend(parsed.get(position, (chapter,)))
+        return Draft(tuple(chapters))
+
+    def delta_from(self, base: Optional["Draft"]) -> List[Union[int, str]]:
+        """
+        相对于上一版草稿的增量
+
+        按顺序列出每个章节：未改动的章节是它在base.chapters中的下标，改动或新增的章节是完整文本。
+        base为None时全部是文本。接收方用上一版的章节列表按此还原，再以换行拼接得到完整文本。
+        """
+        positions = {}
+        if base is not None:
+            for index, chapter in enumerate(base.chapters):
+                positions.setdefault(id(chapter), index)
+        return [positions.get(id(chapter), chapter.text) for chapter in self.chapters]
+
+    def shared_with(self, other: "Draft") -> Dict[str, int]:
+        """与另一版草稿共享的章节数和字数"""
+        chapters = {id(chapter) for chapter in other.chapters}
+        shared = [chapter for chapter in self.chapters if id(chapter) in chapters]
+        return {"chapters": len(shared), "chars": sum(map(len, shared))}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.chapters)) + max(0, len(self.chapters) - 1)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Draft):
+            return NotImplemented
+        return self.chapters == other.chapters
+
+    def __hash__(self) -> int:
+        return hash(self.chapters)
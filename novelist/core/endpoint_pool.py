@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+from .deadline import DeadlineExceeded
+
+T = TypeVar("T")
+
+
+class EndpointError(RuntimeError):
+    """
+    端点请求失败；retryable为True时可以切换到其他端点重试
+
+    fault表示失败是否由端点引起（计入熔断），默认与retryable相同。
+    """
+
+    def __init__(
+        self, message: str, retryable: bool = True, fault: Optional[bool] = None
+    ):
+        super().__init__(message)
+        self.retryable = retryable
+        self.fault = retryable if fault is None else fault
+
+
+class Endpoint:
+    """单个API端点的健康状态和延迟统计"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0  # 进行中的请求数
+        self.ewma_latency: Optional[float] = None  # 指数加权平均延迟（秒）
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 熔断截止时间，0表示未熔断
+        self.half_open_probe = False  # 冷却结束后是否已有试探请求
+        self.successes = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        """端点是否可以接收请求（熔断冷却结束后只放行一个试探请求）"""
+        if self.open_until == 0:
+            return True
+        return now >= self.open_until and not self.half_open_probe
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "successes": self.successes,
+            "failures": self.failures,
+            "open": self.open_until != 0,
+        }
+
+
+class EndpointPool:
+    """
+    多端点连接池
+
+    按“进行中请求数 × EWMA延迟”选择负载最轻的端点，
+    连续失败的端点会被熔断一段时间，请求失败时自动切换到其他端点重试。
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        alpha: float = 0.3,
+        max_attempts: Optional[int] = None,
+    ):
+        """
+        初始化连接池
+
+        Args:
+            urls: 端点地址列表
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断冷却时间（秒）
+            alpha: EWMA平滑系数
+            max_attempts: 单个请求最多尝试的端点数，默认每个端点一次
+        """
+        if not urls:
+            raise ValueError("端点列表不能为空")
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.max_attempts = max_attempts or len(self.endpoints)
+        self.failovers = 0
+        self.logger = logging.getLogger("novelist.endpoint_pool")
+
+    def select(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """
+        选择负载最轻的可用端点
+
+        所有端点都被熔断时，选择冷却最早结束的端点，避免请求完全停滞。
+        """
+        now = time.monotonic()
+        candidates = [
+            endpoint
+            for endpoint in self.endpoints
+            if endpoint not in exclude and endpoint.available(now)
+        ]
+        if not candidates:
+            candidates = [e for e in self.endpoints if e not in exclude] or list(
+                self.endpoints
+            )
+            return min(candidates, key=lambda e: e.open_until)
+
+        # 尚无延迟数据的端点优先被试探
+        known = [e.ewma_latency for e in candidates if e.ewma_latency is not None]
+        default_latency = min(known) if known else 1.0
+        return min(
+            candidates,
+            key=lambda e: (
+                (e.outstanding + 1)
+                * (e.ewma_latency if e.ewma_latency is not None else default_latency),
+                e.outstanding,
+            ),
+        )
+
+    async def call(
+        self,
+        request: Callable[[str], Awaitable[T]],
+        on_retry: Optional[Callable[[str, str], None]] = None,
+    ) -> T:
+        """
+        通过连接池执行请求，失败时切换端点重试
+
+        Args:
+            request: 接收端点地址并发起请求的协程函数
+            on_retry: 切换端点重试前的回调，参数为失败的端点和错误信息
+
+        Returns:
+            请求结果
+        """
+        tried: List[Endpoint] = []
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            endpoint = self.select(exclude=tried)
+            tried.append(endpoint)
+            if attempt > 0:
+                self.failovers += 1
+                self.logger.info(f"切换到端点 {endpoint.url} 重试")
+            if endpoint.open_until:
+                endpoint.half_open_probe = True
+
+            endpoint.outstanding += 1
+            started = time.monotonic()
+            try:
+                result = await request(endpoint.url)
+            except (EndpointError, asyncio.TimeoutError, OSError) as e:
+                if isinstance(e, EndpointError) and not e.retryable:
+                    # 请求本身有误（如4xx）时端点是正常响应的，不计入熔断
+                    if e.fault:
+                        self._record_failure(endpoint)
+                    else:
+                        endpoint.half_open_probe = False
+                    raise
+                self._record_failure(endpoint)
+                last_error = e
+                self.logger.warning(f"端点 {endpoint.url} 请求失败: {str(e)}")
+                if on_retry is not None and attempt + 1 < self.max_attempts:
+                    on_retry(endpoint.url, str(e))
+                continue
+            except (asyncio.CancelledError, DeadlineExceeded):
+                # 取消或超过截止时间不是端点的问题，不计入失败和延迟
+                endpoint.half_open_probe = False
+                raise
+            finally:
+                endpoint.outstanding -= 1
+
+            self._record_success(endpoint, time.monotonic() - started)
+            return result
+
+        raise EndpointError(f"所有端点均请求失败: {str(last_error)}")
+
+    def _record_success(self, endpoint: Endpoint, latency: float) -> None:
+        if endpoint.ewma_latency is None:
+            endpoint.ewma_latency = latency
+        else:
+            endpoint.ewma_latency = (
+                self.alpha * latency + (1 - self.alpha) * endpoint.ewma_latency
+            )
+        endpoint.successes += 1
+        endpoint.consecutive_failures = 0
+        endpoint.open_until = 0.0
+        endpoint.half_open_probe = False
+
+    def _record_failure(self, endpoint: Endpoint) -> None:
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.half_open_probe = False
+        if (
+            endpoint.open_until
+            or endpoint.consecutive_failures >= self.failure_threshold
+        ):
+            endpoint.open_until = time.monotonic() + self.cooldown
+            self.logger.warning(f"端点 {endpoint.url} 已熔断{self.cooldown}秒")
+
+    def stats(self) -> Dict[str, Any]:
+        """各端点的负载、延迟和熔断状态"""
+        return {
+            "failovers": self.failovers,
+            "endpoints": {e.url: e.stats() for e in self.endpoints},
+        }
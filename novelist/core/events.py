@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Dict, Any, Deque, Iterable, List, Optional
+
+# 工作流发布的事件类型，发布和订阅未列出的类型会报错
+EVENT_TYPES = (
+    "run_start",
+    "run_end",
+    "stage_start",
+    "stage_end",
+    "draft",
+    "token",
+    "score",
+    "cache_hit",
+    "retry",
+    "repetition",
+    "fact_check",
+    "best_of",
+)
+
+
+class Subscription:
+    """
+    事件订阅：有界缓冲区，满了以后丢弃最旧的事件
+
+    发布方从不等待订阅方，消费慢的订阅者只会丢事件，不会拖慢创作流程。
+    """
+
+    def __init__(self, bus: "EventBus", maxsize: int, types: Optional[Iterable[str]]):
+        self._bus = bus
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=max(1, maxsize))
+        self._ready = asyncio.Event()
+        self.types = frozenset(types) if types else None
+        self.dropped = 0  # 因缓冲区已满被丢弃的事件数
+        self.closed = False
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        if self.closed or (self.types is not None and event["type"] not in self.types):
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(event)
+        self._ready.set()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """等待下一个事件；订阅已关闭且缓冲区为空时返回None"""
+        while not self._buffer:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._buffer.popleft()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """取出缓冲区中的全部事件"""
+        events = list(self._buffer)
+        self._buffer.clear()
+        return events
+
+    def close(self) -> None:
+        """取消订阅，已缓冲的事件仍可以取出"""
+        self.closed = True
+        self._bus.unsubscribe(self)
+        self._ready.set()
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class EventBus:
+    """进程内异步事件总线"""
+
+    def __init__(self, default_maxsize: int = 256):
+        """
+        初始化事件总线
+
+        Args:
+            default_maxsize: 订阅缓冲区的默认大小
+        """
+        self.default_maxsize = default_maxsize
+        self._subscribers: List[Subscription] = []
+        self._seq = itertools.count(1)
+        self.published = 0
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(
+        self, maxsize: Optional[int] = None, types: Optional[Iterable[str]] = None
+    ) -> Subscription:
+        """
+        订阅事件
+
+        Args:
+            maxsize: 缓冲区大小，默认使用default_maxsize
+            types: 只接收这些类型的事件，默认全部
+
+        Raises:
+            ValueError: 未知的事件类型
+        """
+        for event_type in types or ():
+            _check_type(event_type)
+        subscription = Subscription(self, maxsize or self.default_maxsize, types)
+        self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    def publish(self, event_type: str, **data: Any) -> None:
+        """
+        发布事件（同步、不阻塞）；没有订阅者时直接返回
+
+        Raises:
+            ValueError: 未知的事件类型
+        """
+        _check_type(event_type)
+        if not self._subscribers:
+            return
+        self.published += 1
+        event = {
+            "type": event_type,
+            "seq": next(self._seq),
+            "time": time.time(),
+            "data": data,
+        }
+        for subscription in self._subscribers:
+            subscription._offer(event)
+
+    def stats(self) -> Dict[str, int]:
+        """已发布事件数、订阅者数和被丢弃的事件数"""
+        return {
+            "published": self.published,
+            "subscribers": len(self._subscribers),
+            "dropped": sum(s.dropped for s in self._subscribers),
+        }
+
+
+def _check_type(event_type: str) -> None:
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"未知的事件类型: {event_type}")
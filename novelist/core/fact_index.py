@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, Any, List, Optional, Set, Tuple
+from typing_extensions import TypedDict
+
+from .proofreader import CJK
+from .sections import split_sections
+
+SEASONS = "春夏秋冬"
+
+# 明确指出季节的词语
+SEASON_MARKERS: Dict[str, Tuple[str, ...]] = {
+    "春": ("春天", "春季", "初春", "早春", "暮春", "春日"),
+    "夏": ("夏天", "夏季", "初夏", "盛夏", "炎夏", "夏日"),
+    "秋": ("秋天", "秋季", "初秋", "深秋", "晚秋", "秋日"),
+    "冬": ("冬天", "冬季", "初冬", "寒冬", "隆冬", "冬日"),
+}
+
+# 与时代背景明显冲突的词语
+ANCIENT_MARKERS = ("皇上", "朝廷", "衙门", "圣旨", "太监", "丞相", "县令")
+MODERN_MARKERS = ("手机", "电脑", "微信", "地铁", "高铁", "互联网", "电视")
+MODERN_ERAS = ("现代", "当代", "都市", "未来")
+# 古代背景使用完整的朝代名称（单独的“朝”会匹配“朝鲜”“朝着”等词）
+ANCIENT_ERAS = ("古代", "古风", "先秦", "三国", "南北朝", "五代十国") + tuple(
+    dynasty + suffix for dynasty in "秦汉晋隋唐宋元明清" for suffix in "朝代"
+)
+
+# 地点特征及与之矛盾的特征
+LOCATION_TRAITS: Dict[str, Tuple[str, ...]] = {
+    "沿海": ("内陆",),
+    "海滨": ("内陆",),
+    "内陆": ("沿海", "海滨"),
+    "南方": ("北方",),
+    "北方": ("南方",),
+}
+# 只检查指代故事所在地的说法（如“这座内陆城市”），“来自内陆城市”等描述别处的说法不算冲突
+_PLACE = re.compile(
+    r"(?:这座|这个|这片|这里的|当地的?)("
+    + "|".join(LOCATION_TRAITS)
+    + r")(?:城市|小城|城|小镇|镇|地区|地方)?"
+)
+
+_NUMERALS = {
+    "零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+    "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+}
+_NUMBER = r"\d{1,3}|[零一二两三四五六七八九十]{1,3}"
+_AGE_PREFIX = r"(?:今年|已经|已|才|刚|刚满|年方)?"
+_MEASURE = r"(?:一名|一位|一个|个|名|位)?"
+
+
+class FactViolation(TypedDict):
+    type: str  # name/age/occupation/season/era/location
+    text: str  # 原文片段
+    expected: str  # 设定中的写法
+    section: int  # 所在章节（从0开始）
+
+
+def parse_number(text: str) -> Optional[int]:
+    """解析阿拉伯数字或一百以内的中文数字"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        if len(tens) > 1 or len(ones) > 1:
+            return None
+        value = (_NUMERALS.get(tens) if tens else 1) or 0
+        return value * 10 + (_NUMERALS.get(ones, 0) if ones else 0)
+    if len(text) == 1 and text in _NUMERALS:
+        return _NUMERALS[text]
+    return None
+
+
+class FactIndex:
+    """
+    本地人物与设定索引
+
+    从故事种子（人物姓名、年龄、职业，时代、地点和季节）和已通过的章节
+    （人物出现位置、正文中确立的年龄和地点特征、季节时间线）建立索引，
+    在LLM评估之前用正则检查明显的设定冲突，耗时在毫秒级。
+    """
+
+    def __init__(
+        self,
+        story_seed: Optional[Dict[str, Any]] = None,
+        max_variant_count: int = 2,
+    ):
+        """
+        初始化索引
+
+        Args:
+            story_seed: 故事种子
+            max_variant_count: 疑似错写的人名出现次数上限，超过时视为另一个人物
+        """
+        story_seed = story_seed or {}
+        self.max_variant_count = max_variant_count
+        self.characters: Dict[str, Dict[str, Any]] = {}
+        for character in story_seed.get("characters") or []:
+            if isinstance(character, dict) and character.get("name"):
+                self.characters[str(character["name"])] = {
+                    "age": character.get("age"),
+                    "occupation": character.get("occupation"),
+                }
+
+        settings = story_seed.get("settings") or {}
+        self.seasons: Set[str] = {s for s in str(settings.get("season") or "") if s in SEASONS}
+        era = str(settings.get("time") or "")
+        if any(marker in era for marker in MODERN_ERAS):
+            self.era_conflicts: Tuple[str, ...] = ANCIENT_MARKERS
+        elif any(marker in era for marker in ANCIENT_ERAS):
+            self.era_conflicts = MODERN_MARKERS
+        else:
+            self.era_conflicts = ()
+
+        self.location = str(settings.get("location") or "")
+        self.location_traits: Set[str] = {t for t in LOCATION_TRAITS if t in self.location}
+
+        # 从已通过章节中建立的索引
+        self.mentions: Dict[str, List[int]] = {name: [] for name in self.characters}
+        self.timeline: Dict[int, List[str]] = {}
+        self.places: Dict[int, List[str]] = {}  # 各章节中指代故事所在地的说法
+        self.established: List[str] = []  # 已通过章节中确立的、设定没有给出的事实
+
+        self._compile()
+
+    def _compile(self) -> None:
+        self._variants: Dict[str, re.Pattern] = {}
+        self._ages: Dict[str, List[re.Pattern]] = {}
+        self._occupations: Dict[str, re.Pattern] = {}
+        occupations = [
+            info["occupation"]
+            for info in self.characters.values()
+            if info.get("occupation")
+        ]
+        for name, info in self.characters.items():
+            escaped = re.escape(name)
+            # 三字及以上的人名：姓氏不变、名字中错了一个字
+            if len(name) >= 3:
+                alternatives = [
+                    re.escape(name[:i]) + f"[{CJK}](?<!{re.escape(name[i])})" + re.escape(name[i + 1 :])
+                    for i in range(1, len(name))
+                ]
+                self._variants[name] = re.compile("|".join(alternatives))
+            self._ages[name] = [
+                re.compile(rf"({_NUMBER})岁的{escaped}"),
+                re.compile(rf"{escaped}{_AGE_PREFIX}({_NUMBER})岁"),
+            ]
+            # 其他人物的职业被安到该人物身上
+            others = [o for o in occupations if o != info.get("occupation")]
+            if others:
+                words = "|".join(re.escape(o) for o in sorted(others, key=len, reverse=True))
+                self._occupations[name] = re.compile(
+                    rf"{escaped}(?:是|成了|当上了?|作为){_MEASURE}(?:{words})"
+                    rf"|(?:身为|作为){_MEASURE}(?:{words})的{escaped}"
+                )
+        self._season_markers = {
+            marker: season
+            for season, markers in SEASON_MARKERS.items()
+            for marker in markers
+        }
+        self._season = re.compile("|".join(self._season_markers))
+        self._era = (
+            re.compile("|".join(map(re.escape, self.era_conflicts)))
+            if self.era_conflicts
+            else None
+        )
+
+    def record_chapter(self, index: int, text: str) -> None:
+        """记录已通过的章节：人物出现位置、正文确立的年龄和地点特征、季节时间线"""
+        for name, info in self.characters.items():
+            if name in text and index not in self.mentions[name]:
+                self.mentions[name].append(index)
+            if info.get("age") is None:
+                for pattern in self._ages[name]:
+                    match = pattern.search(text)
+                    if match:
+                        info["age"] = parse_number(match.group(1))
+                        if info["age"] is not None:
+                            self.established.append(f"{name}{info['age']}岁")
+                        break
+        seen = {s for seasons in self.timeline.values() for s in seasons} | self.seasons
+        seasons = []
+        for match in self._season.finditer(text):
+            season = self._season_markers[match.group(0)]
+            if season not in seasons:
+                seasons.append(season)
+        if seasons:
+            self.timeline[index] = seasons
+            for season in seasons:
+                if season not in seen:
+                    self.established.append(f"第{index + 1}章时间推进到{season}季")
+        places = []
+        for match in _PLACE.finditer(text):
+            trait = match.group(1)
+            # 设定没有给出的地点特征以正文中先确立的为准
+            if trait not in self.location_traits and trait not in self.conflicting_traits():
+                self.location_traits.add(trait)
+                self.established.append(f"故事所在地：{trait}")
+            if match.group(0) not in places:
+                places.append(match.group(0))
+        if places:
+            self.places[index] = places
+
+    def conflicting_traits(self) -> Set[str]:
+        """与设定和已通过章节确立的地点特征相矛盾的特征"""
+        return {c for trait in self.location_traits for c in LOCATION_TRAITS[trait]}
+
+    def allowed_seasons(self) -> Set[str]:
+        """当前允许出现的季节：设定的季节、时间线上出现过的季节及其下一个季节"""
+        if not self.seasons:
+            return set(SEASONS)
+        allowed = set(self.seasons)
+        for index in sorted(self.timeline):
+            allowed.update(self.timeline[index])
+        if self.timeline:
+            latest = self.timeline[max(self.timeline)][-1]
+            allowed.add(SEASONS[(SEASONS.index(latest) + 1) % len(SEASONS)])
+        return allowed
+
+    def check(self, text: Optional[str]) -> List[FactViolation]:
+        """
+        检查文本中与设定明显冲突之处
+
+        Args:
+            text: 草稿或单个章节
+
+        Returns:
+            List[FactViolation]: 发现的冲突，按章节顺序排列
+        """
+        if not text:
+            return []
+        violations: List[FactViolation] = []
+        seen: Set[Tuple[str, str, int]] = set()
+        allowed = self.allowed_seasons()
+        conflicting = self.conflicting_traits()
+        location = self.location or "、".join(sorted(self.location_traits))
+        name_counts = {name: text.count(name) for name in self.characters}
+        for section_index, section in enumerate(split_sections(text)):
+
+            def add(kind: str, found: str, expected: str) -> None:
+                if (kind, found, section_index) in seen:
+                    return
+                seen.add((kind, found, section_index))
+                violations.append(
+                    FactViolation(
+                        type=kind,
+                        text=found,
+                        expected=expected,
+                        section=section_index,
+                    )
+                )
+
+            for name, info in self.characters.items():
+                variants = self._variants.get(name)
+                if variants is not None:
+                    counts: Dict[str, int] = {}
+                    for match in variants.finditer(section):
+                        counts[match.group(0)] = counts.get(match.group(0), 0) + 1
+                    for variant, count in counts.items():
+                        if variant in self.characters:
+                            continue
+                        if count <= self.max_variant_count and count < name_counts[name]:
+                            # 相似的写法也可能是另一个词或另一个人物，只报告给编辑判断
+                            add("name", variant, name)
+
+                age = info.get("age")
+                if age is not None:
+                    for pattern in self._ages[name]:
+                        for match in pattern.finditer(section):
+                            if parse_number(match.group(1)) not in (None, age):
+                                add("age", match.group(0), f"{name}{age}岁")
+
+                occupation = self._occupations.get(name)
+                if occupation is not None:
+                    for match in occupation.finditer(section):
+                        add("occupation", match.group(0), f"{name}是{info['occupation']}")
+
+            for match in self._season.finditer(section):
+                season = self._season_markers[match.group(0)]
+                if season not in allowed:
+                    add("season", match.group(0), "、".join(s for s in SEASONS if s in allowed))
+
+            if conflicting:
+                for match in _PLACE.finditer(section):
+                    if match.group(1) in conflicting:
+                        add("location", match.group(0), location)
+
+            if self._era is not None:
+                for match in self._era.finditer(section):
+                    add("era", match.group(0), "与时代背景一致的用词")
+        return violations
+
+    @staticmethod
+    def report(violations: List[FactViolation]) -> str:
+        """格式化冲突列表，用于定向修正的prompt"""
+        labels = {
+            "name": "人名疑似错写",
+            "age": "人物年龄与设定不符",
+            "occupation": "人物职业与设定不符",
+            "season": "季节与时间线不符",
+            "era": "用词与时代背景不符",
+            "location": "地点与设定不符",
+        }
+        return "\n".join(
+            f"- 第{v['section'] + 1}章：{labels.get(v['type'], v['type'])}："
+            f"“{v['text']}”（应为：{v['expected']}）"
+            for v in violations
+        )
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from typing import Dict, Any, Callable, List, Optional
+import aiohttp
+
+from .deadline import DeadlineExceeded, effective_timeout
+from .endpoint_pool import EndpointPool, EndpointError
+
+# 这些状态码通常是端点暂时不可用，可以切换端点重试
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ChatCompletionClient:
+    """
+    OpenAI兼容的chat completions客户端
+
+    请求通过EndpointPool分发到负载最轻的端点，端点故障时自动切换。
+    """
+
+    def __init__(
+        self,
+        pool: EndpointPool,
+        api_key: Optional[str],
+        timeout: float = 120,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """
+        初始化客户端
+
+        Args:
+            pool: 端点连接池
+            api_key: API密钥
+            timeout: 单次请求超时（秒），当前截止时间更早时以截止时间为准
+            session: 复用的HTTP会话，默认按需创建
+        """
+        self.pool = pool
+        self.api_key = api_key
+        self.timeout = timeout
+        self._session = session
+        self._owns_session = session is None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+            self._owns_session = True
+        return self._session
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        on_retry: Optional[Callable[[str, str], None]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        发送chat completions请求
+
+        Args:
+            model: 模型名称
+            messages: 对话消息
+            on_retry: 切换端点重试前的回调（可直接传入execute上下文中的on_retry）
+            on_token: 流式片段回调，传入时以stream=True请求并逐段回报生成的内容
+            **params: 其他请求参数，如temperature、max_tokens
+
+        Returns:
+            Dict[str, Any]: content、usage、finish_reason和实际使用的endpoint
+        """
+        session = await self._get_session()
+        payload = {"model": model, "messages": messages, **params}
+        if on_token is not None:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        async def request(base: str) -> Dict[str, Any]:
+            # 每次尝试都重新计算超时，切换端点重试不会越过运行的截止时间
+            timeout = effective_timeout(self.timeout)
+            if timeout is not None and timeout <= 0:
+                raise DeadlineExceeded("请求已超过截止时间")
+            clamped = timeout is not None and (self.timeout is None or timeout < self.timeout)
+            streamed: List[str] = []
+            try:
+                async with session.post(
+                    f"{base}/chat/completions",
+                    json=payload,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as response:
+                    if response.status != 200:
+                        text = await response.text()
+                        raise EndpointError(
+                            f"HTTP {response.status}: {text[:200]}",
+                            retryable=response.status in RETRYABLE_STATUS,
+                        )
+                    if on_token is not None:
+                        return await self._read_stream(response, base, streamed, on_token)
+                    data = await response.json()
+            except asyncio.TimeoutError:
+                # 超时被截止时间收紧时，超时不是端点的问题，不计入端点的失败
+                if clamped:
+                    raise DeadlineExceeded(f"请求端点 {base} 时超过截止时间") from None
+                if streamed:
+                    raise self._interrupted(streamed, "请求超时") from None
+                raise
+            except (aiohttp.ClientError, ValueError) as e:
+                if streamed:
+                    raise self._interrupted(streamed, str(e)) from e
+                raise EndpointError(f"连接失败: {str(e)}") from e
+
+            choice = (data.get("choices") or [{}])[0]
+            return {
+                "content": (choice.get("message") or {}).get("content", ""),
+                "usage": data.get("usage") or {},
+                "finish_reason": choice.get("finish_reason"),
+                "endpoint": base,
+            }
+
+        return await self.pool.call(request, on_retry)
+
+    @staticmethod
+    async def _read_stream(
+        response: aiohttp.ClientResponse,
+        base: str,
+        parts: List[str],
+        on_token: Callable[[str], None],
+    ) -> Dict[str, Any]:
+        """解析SSE格式的流式响应，收到的内容追加到parts并逐段回报"""
+        usage: Dict[str, Any] = {}
+        finish_reason = None
+        async for raw in response.content:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    parts.append(text)
+                    on_token(text)
+                finish_reason = choice.get("finish_reason") or finish_reason
+        return {
+            "content": "".join(parts),
+            "usage": usage,
+            "finish_reason": finish_reason,
+            "endpoint": base,
+        }
+
+    @staticmethod
+    def _interrupted(streamed: List[str], reason: str) -> EndpointError:
+        """已经回报过内容的流中断后不能切换端点重试，否则已输出的内容会被重复回报"""
+        return EndpointError(
+            f"流式输出中断（已输出{sum(map(len, streamed))}字）: {reason}",
+            retryable=False,
+            fault=True,
+        )
+
+    async def close(self) -> None:
+        """关闭客户端自己创建的HTTP会话"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
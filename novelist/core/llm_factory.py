@@ -2,13 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import yaml
 from dotenv import load_dotenv
 
 
 from typing_extensions import TypedDict
 
+from .endpoint_pool import EndpointPool
+from .llm_client import ChatCompletionClient
+from .tokens import TokenEstimator
+
 
 class LLMConfig(TypedDict):
     model: str
@@ -29,6 +33,10 @@ class LLMFactory:
 
     _instance = None
     _config: Dict[str, Any] = {}
+    # 相同端点列表的Agent共享同一个连接池，负载和熔断状态才能全局生效
+    _pools: Dict[Tuple[str, ...], EndpointPool] = {}
+    # 每个模型一个token估算器，进程内共享真实用量样本和拟合结果
+    _estimators: Dict[str, TokenEstimator] = {}
 
     def __new__(cls):
         if cls._instance is None:
@@ -96,6 +104,110 @@ class LLMFactory:
 
         return agent_config
 
+    @classmethod
+    def get_model_pricing(cls, model: str) -> Dict[str, float]:
+        """
+        获取模型单价
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            Dict[str, float]: 每千token的input/output单价，未配置时为空
+        """
+        instance = cls()
+        return dict(instance._config.get("pricing", {}).get(model) or {})
+
+    @classmethod
+    def get_token_calibration(cls, model: Optional[str]) -> Dict[str, float]:
+        """
+        获取模型的token估算权重
+
+        Args:
+            model: 模型名称，None表示只使用default
+
+        Returns:
+            Dict[str, float]: token_calibration中default与该模型条目合并后的权重
+        """
+        instance = cls()
+        table = instance._config.get("token_calibration") or {}
+        return {**(table.get("default") or {}), **(table.get(model) or {})}
+
+    @classmethod
+    def get_token_estimator(cls, model: Optional[str]) -> TokenEstimator:
+        """
+        获取模型的token估算器
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            TokenEstimator: 按校准表初始化、可根据真实用量重新拟合的估算器
+        """
+        key = model or "default"
+        if key not in cls._estimators:
+            cls._estimators[key] = TokenEstimator(
+                cls.get_token_calibration(model),
+                refit_interval=int(os.getenv("TOKEN_REFIT_INTERVAL", 50)),
+            )
+        return cls._estimators[key]
+
+    @classmethod
+    def get_endpoints(cls, agent_type: str) -> List[str]:
+        """
+        获取Agent可用的端点列表
+
+        优先使用api_bases（列表或逗号分隔的字符串），未配置时使用api_base。
+
+        Args:
+            agent_type: Agent类型名称
+
+        Returns:
+            List[str]: 端点地址列表
+        """
+        llm_config = cls.get_agent_config(agent_type)["llm_config"]
+        bases = llm_config.get("api_bases") or llm_config.get("api_base") or []
+        if isinstance(bases, str):
+            bases = bases.split(",")
+        return [base.strip().rstrip("/") for base in bases if base and base.strip()]
+
+    @classmethod
+    def get_endpoint_pool(cls, agent_type: str) -> EndpointPool:
+        """
+        获取Agent的端点连接池
+
+        Args:
+            agent_type: Agent类型名称
+
+        Returns:
+            EndpointPool: 与其他相同端点列表的Agent共享的连接池
+        """
+        endpoints = tuple(cls.get_endpoints(agent_type))
+        if not endpoints:
+            raise ValueError(f"Agent '{agent_type}' 未配置API端点")
+        if endpoints not in cls._pools:
+            cls._pools[endpoints] = EndpointPool(
+                endpoints,
+                failure_threshold=int(os.getenv("ENDPOINT_FAILURE_THRESHOLD", 3)),
+                cooldown=float(os.getenv("ENDPOINT_COOLDOWN", 30)),
+            )
+        return cls._pools[endpoints]
+
+    @classmethod
+    def create_client(cls, agent_type: str) -> ChatCompletionClient:
+        """
+        创建使用端点连接池的chat completions客户端
+
+        Args:
+            agent_type: Agent类型名称
+        """
+        llm_config = cls.get_agent_config(agent_type)["llm_config"]
+        return ChatCompletionClient(
+            cls.get_endpoint_pool(agent_type),
+            llm_config.get("api_key"),
+            timeout=float(llm_config.get("timeout", 120)),
+        )
+
     @classmethod
     def validate_config(cls) -> bool:
         """
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+import logging
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+
+from .fact_index import FactIndex
+
+if TYPE_CHECKING:
+    from .workflow import WorkflowManager
+
+
+class ChapterPipeline:
+    """
+    章节流水线：写作、编辑、审核三个阶段按章节并行推进
+
+    第N章在编辑时，第N+1章可以同时写作、第N-1章同时审核。
+    阶段之间使用有界队列实现背压，未达标的章节带着审核意见回到写作阶段定向重写。
+    """
+
+    def __init__(
+        self,
+        workflow: "WorkflowManager",
+        queue_size: int = 2,
+        max_chapter_rewrites: int = 1,
+    ):
+        """
+        初始化流水线
+
+        Args:
+            workflow: 提供Agent调用和评估能力的工作流管理器
+            queue_size: 阶段间队列容量
+            max_chapter_rewrites: 单个章节的最大重写次数
+        """
+        self.workflow = workflow
+        self.queue_size = max(1, queue_size)
+        self.max_chapter_rewrites = max_chapter_rewrites
+        self.logger = logging.getLogger("novelist.pipeline")
+        self.stats: Dict[str, int] = {
+            "written": 0,
+            "rewritten": 0,
+            "edited": 0,
+            "scored": 0,
+        }
+
+    async def run(self, outline_sections: List[str]) -> List[Dict[str, Any]]:
+        """
+        按章节大纲执行流水线
+
+        Args:
+            outline_sections: 每章的大纲
+
+        Returns:
+            List[Dict[str, Any]]: 按章节顺序排列的结果，包含text、score和evaluation
+        """
+        if not outline_sections:
+            return []
+
+        # 写作队列不设上限：回流的重写任务优先处理，避免环形有界队列死锁
+        write_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        edit_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        score_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(outline_sections)
+        remaining = len(outline_sections)
+        finished = asyncio.Event()
+        order = itertools.count()
+
+        for index, section in enumerate(outline_sections):
+            job = {
+                "index": index,
+                "outline": section,
+                "text": None,
+                "feedback": None,
+                "rewrites": 0,
+            }
+            write_queue.put_nowait((1, next(order), job))
+
+        async def write_stage() -> None:
+            while True:
+                _, _, job = await write_queue.get()
+                prompt = self._build_chapter_prompt(job)
+                if job["feedback"] is None:
+                    self.stats["written"] += 1
+                else:
+                    self.stats["rewritten"] += 1
+                # 首次写作没有可参照的长度，使用配置的上限；重写时按原章节长度预留输出
+                expected = (
+                    self.workflow._estimate_tokens("writer", job["text"])
+                    if job["text"]
+                    else None
+                )
+                # 首稿可以并发生成多个候选择优，重写只生成一个；阶段超时按单章计时
+                if job["feedback"] is None:
+                    call = self.workflow._generate_best(
+                        "draft", "writer", prompt, expected, outline=job["outline"]
+                    )
+                else:
+                    call = self.workflow._call_agent(
+                        "writer", prompt, expected_tokens=expected
+                    )
+                result = await self.workflow._run_stage("draft", call)
+                job["text"] = result.get("content") or job["text"] or ""
+                await edit_queue.put(job)
+
+        async def edit_stage() -> None:
+            while True:
+                job = await edit_queue.get()
+                result = await self.workflow._run_stage(
+                    "edit",
+                    self.workflow._call_agent(
+                        "editor",
+                        self.workflow._build_editor_prompt(job["text"]),
+                        expected_tokens=self.workflow._estimate_tokens("editor", job["text"]),
+                    ),
+                )
+                job["text"] = result.get("content") or job["text"]
+                self.stats["edited"] += 1
+                await score_queue.put(job)
+
+        async def score_stage() -> None:
+            nonlocal remaining
+            while True:
+                job = await score_queue.get()
+                violations = self.workflow._check_facts(job["text"])
+                if violations and job["rewrites"] < self.max_chapter_rewrites:
+                    # 设定冲突不必评分，直接带着冲突列表回到写作阶段修正
+                    self.workflow.fact_stats["flagged"] += len(violations)
+                    self.workflow.fact_stats["skipped_evaluations"] += 1
+                    job["rewrites"] += 1
+                    job["feedback"] = "设定冲突：\n" + FactIndex.report(violations)
+                    write_queue.put_nowait((0, next(order), job))
+                    continue
+
+                score, evaluation = await self.workflow._run_stage(
+                    "evaluate", self.workflow.evaluate_content(job["outline"], job["text"])
+                )
+                self.stats["scored"] += 1
+                self.logger.info(f"第{job['index'] + 1}章评分：{score}")
+
+                if (
+                    score < self.workflow.revision_threshold
+                    and job["rewrites"] < self.max_chapter_rewrites
+                ):
+                    # 定向重写：只有该章节带着审核意见回到写作阶段
+                    job["rewrites"] += 1
+                    job["feedback"] = evaluation
+                    write_queue.put_nowait((0, next(order), job))
+                    continue
+
+                self.workflow._record_accepted_chapter(job["index"], job["text"])
+                self.workflow._accept_chapter(job["index"], job["text"])
+                results[job["index"]] = {
+                    "text": job["text"],
+                    "score": score,
+                    "evaluation": evaluation,
+                }
+                remaining -= 1
+                if remaining == 0:
+                    finished.set()
+
+        workers = [
+            asyncio.create_task(write_stage()),
+            asyncio.create_task(edit_stage()),
+            asyncio.create_task(score_stage()),
+        ]
+        done_waiter = asyncio.create_task(finished.wait())
+        try:
+            # 任一阶段异常时立即结束并抛出
+            await asyncio.wait(
+                workers + [done_waiter], return_when=asyncio.FIRST_COMPLETED
+            )
+            for worker in workers:
+                if worker.done() and worker.exception() is not None:
+                    raise worker.exception()
+        finally:
+            for task in workers + [done_waiter]:
+                task.cancel()
+            await asyncio.gather(*workers, done_waiter, return_exceptions=True)
+
+        return results
+
+    def _build_chapter_prompt(self, job: Dict[str, Any]) -> str:
+        """构建单章写作prompt（重写时附带审核意见和上一版正文）"""
+        if self.workflow.story_bible is None:
+            blocks = [("本章大纲", job["outline"])]
+            outline = self.workflow.original_outline
+        else:
+            # 故事圣经和前一章结尾代替完整大纲，prompt长度不随章节数增长
+            blocks = self.workflow._story_bible_blocks(job["index"])
+            blocks.append(("本章大纲", job["outline"]))
+            outline = None
+        if job["feedback"] is not None:
+            blocks += [("评审意见", job["feedback"]), ("当前内容", job["text"])]
+        return self.workflow.prompt_builder.build(
+            "请根据原始大纲创作其中的一章，只输出本章正文，保留章节标题。"
+            "重写时请在当前内容的基础上修正审核指出的问题。",
+            blocks,
+            outline=outline,
+        )
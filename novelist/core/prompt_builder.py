@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    """
+    从usage中读取命中前缀缓存的输入token数
+
+    兼容DeepSeek的prompt_cache_hit_tokens和OpenAI的prompt_tokens_details.cached_tokens，
+    服务端未返回缓存信息时返回None。
+    """
+    if "prompt_cache_hit_tokens" in usage:
+        return int(usage["prompt_cache_hit_tokens"] or 0)
+    details = usage.get("prompt_tokens_details") or {}
+    if "cached_tokens" in details:
+        return int(details["cached_tokens"] or 0)
+    return None
+
+
+class PromptBuilder:
+    """
+    前缀稳定的prompt构建器
+
+    prompt由稳定前缀（故事设定、原始大纲）和易变后缀（任务说明、评审意见、草稿）组成。
+    同一次创作中前缀逐字节不变，任务说明也固定在易变内容之前，
+    服务端的前缀缓存因此可以在每次调用中复用尽可能长的前缀。
+    系统消息由各Agent自行放在对话最前面，不在此处拼接。
+    """
+
+    def __init__(self, story_setting: Optional[str] = None):
+        """
+        初始化构建器
+
+        Args:
+            story_setting: 格式化后的故事设定
+        """
+        self.story_setting = story_setting
+
+    def prefix(self, outline: Optional[str] = None) -> str:
+        """构建稳定前缀"""
+        parts = []
+        if self.story_setting:
+            parts.append(f"故事设定：\n{self.story_setting}")
+        if outline:
+            parts.append(f"原始大纲：\n{outline}")
+        return "\n\n".join(parts)
+
+    def build(
+        self,
+        instructions: str,
+        blocks: Sequence[Tuple[str, Optional[str]]] = (),
+        outline: Optional[str] = None,
+    ) -> str:
+        """
+        构建完整prompt
+
+        Args:
+            instructions: 任务说明（同类调用中保持不变）
+            blocks: 按顺序追加的(标题, 内容)易变内容块，内容为None的块被跳过
+            outline: 放入前缀的大纲，None表示前缀中不包含大纲
+
+        Returns:
+            str: 稳定前缀 + 任务说明 + 易变内容
+        """
+        parts = [self.prefix(outline), instructions.strip()]
+        parts.extend(
+            f"{label}：\n{content}" for label, content in blocks if content is not None
+        )
+        return "\n\n".join(part for part in parts if part)
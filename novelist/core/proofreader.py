@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from typing import Dict, Any, List, Optional, Iterable
+import yaml
+from typing_extensions import TypedDict
+
+CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# 可与中文相邻的全角标点
+CJK_PUNCT = "，。！？；：、“”‘’（）《》「」『』【】…—"
+
+# 全角字母数字 -> 半角
+FULLWIDTH_ALNUM = {
+    code: code - 0xFEE0
+    for code in list(range(0xFF10, 0xFF1A))
+    + list(range(0xFF21, 0xFF3B))
+    + list(range(0xFF41, 0xFF5B))
+}
+
+HALFWIDTH_PUNCT = {",": "，", "!": "！", "?": "？", ";": "；", ":": "："}
+
+# 成对出现的引号和括号
+PAIRED_MARKS = {"“": "”", "‘": "’", "「": "」", "『": "』", "（": "）", "《": "》", "【": "】"}
+
+
+class ProofreadIssue(TypedDict):
+    type: str
+    text: str
+    suggestion: str
+    count: int
+    fixed: bool
+
+
+class ProofreadResult(TypedDict):
+    text: str
+    issues: List[ProofreadIssue]
+    fixed: int
+    unresolved: int
+
+
+class ChineseProofreader:
+    """
+    本地确定性中文校对引擎
+
+    负责标点全半角规范、重复字词、引号括号配对和易混淆字词的检查。
+    只直接修正没有歧义的问题（全半角规范、词典中不会与正常用词混淆的错别字），
+    重复字词和有歧义的易混淆字词只报告，交给LLM编辑处理。
+    """
+
+    def __init__(
+        self,
+        confusables: Optional[Dict[str, str]] = None,
+        duplicate_chars: str = "",
+        exceptions: Optional[Iterable[str]] = None,
+        ambiguous: Optional[Dict[str, str]] = None,
+    ):
+        """
+        初始化校对引擎
+
+        Args:
+            confusables: 易混淆字词表（错误写法 -> 正确写法），直接修正
+            duplicate_chars: 连续重复时可能是错误的单字
+            exceptions: 合法的叠字/叠词和包含易混淆写法的正常词语，与之重叠的位置不做处理
+            ambiguous: 可能是正常用词一部分的易混淆写法（如“以经济”中的“以经”），只报告
+        """
+        self.confusables = {
+            wrong: right for wrong, right in (confusables or {}).items() if wrong != right
+        }
+        self.ambiguous = {
+            wrong: right
+            for wrong, right in (ambiguous or {}).items()
+            if wrong != right and wrong not in self.confusables
+        }
+        self.exceptions = [word for word in (exceptions or []) if word]
+
+        # 以标点开头再回看前一个字符，便于正则引擎快速跳过普通文字
+        self._halfwidth_punct = re.compile(
+            rf"[,!?;:](?:(?<=[{CJK}{CJK_PUNCT}][,!?;:])|(?=[{CJK}“‘「『（《]))"
+        )
+        self._halfwidth_period = re.compile(rf"\.(?<=[{CJK}]\.)(?![.0-9A-Za-z])")
+        self._ellipsis = re.compile(rf"(?<=[{CJK}])(?:\.{{3,}}|。{{3,}})")
+        self._fullwidth_alnum = re.compile("[０-９Ａ-Ｚａ-ｚ]")
+        self._halfwidth_parens = re.compile(rf"\(([^()\n]*[{CJK}][^()\n]*)\)")
+        self._duplicate_char = (
+            re.compile(f"([{re.escape(duplicate_chars)}])\\1+")
+            if duplicate_chars
+            else None
+        )
+        self._duplicate_word = re.compile(rf"([{CJK}]{{2,4}})\1")
+        self._paired_marks = re.compile(
+            "[" + re.escape("".join(PAIRED_MARKS) + "".join(PAIRED_MARKS.values())) + "]"
+        )
+        known = {**self.confusables, **self.ambiguous}
+        self._confusable = (
+            re.compile(
+                "|".join(
+                    re.escape(word) for word in sorted(known, key=len, reverse=True)
+                )
+            )
+            if known
+            else None
+        )
+
+    @classmethod
+    def from_config(cls, config_path: Optional[str] = None) -> "ChineseProofreader":
+        """
+        从词典配置文件创建校对引擎
+
+        Args:
+            config_path: 词典路径，默认使用configs/proofread_dict.yaml
+        """
+        if config_path is None:
+            config_path = os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "configs",
+                "proofread_dict.yaml",
+            )
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        return cls(
+            confusables=config.get("confusables"),
+            duplicate_chars=config.get("duplicate_chars", ""),
+            exceptions=config.get("exceptions"),
+            ambiguous=config.get("ambiguous_confusables"),
+        )
+
+    def proofread(self, text: str) -> ProofreadResult:
+        """
+        校对文本
+
+        Args:
+            text: 待校对文本
+
+        Returns:
+            ProofreadResult: 修正后的文本和发现的问题
+        """
+        issues: List[ProofreadIssue] = []
+        if not text:
+            return {"text": text or "", "issues": issues, "fixed": 0, "unresolved": 0}
+
+        text = self._normalize_width(text, issues)
+        text = self._fix_duplicates(text, issues)
+        text = self._fix_confusables(text, issues)
+        self._check_pairs(text, issues)
+
+        fixed = sum(issue["count"] for issue in issues if issue["fixed"])
+        unresolved = sum(issue["count"] for issue in issues if not issue["fixed"])
+        return {"text": text, "issues": issues, "fixed": fixed, "unresolved": unresolved}
+
+    def _normalize_width(self, text: str, issues: List[ProofreadIssue]) -> str:
+        """全角字母数字转半角，中文语境中的半角标点转全角"""
+        normalized = text
+        # 先做廉价的存在性检查，干净的文本不必逐字替换
+        if self._fullwidth_alnum.search(normalized):
+            count = len(self._fullwidth_alnum.findall(normalized))
+            normalized = normalized.translate(FULLWIDTH_ALNUM)
+            self._add_issue(issues, "全角字母数字", "", "半角", count, True)
+
+        if "..." in normalized or "。。。" in normalized:
+            normalized, count = self._ellipsis.subn("……", normalized)
+            if count:
+                self._add_issue(issues, "省略号", "...", "……", count, True)
+        normalized, count = self._halfwidth_punct.subn(
+            lambda m: HALFWIDTH_PUNCT[m.group(0)], normalized
+        )
+        if count:
+            self._add_issue(issues, "半角标点", ",!?;:", "，！？；：", count, True)
+        normalized, count = self._halfwidth_period.subn("。", normalized)
+        if count:
+            self._add_issue(issues, "半角句号", ".", "。", count, True)
+        normalized, count = self._halfwidth_parens.subn(r"（\1）", normalized)
+        if count:
+            self._add_issue(issues, "半角括号", "()", "（）", count, True)
+        return normalized
+
+    def _protected(self, text: str, start: int, end: int) -> bool:
+        """[start, end)是否与某个例外词的出现位置重叠"""
+        for word in self.exceptions:
+            window = text[max(0, start - len(word) + 1) : end + len(word) - 1]
+            if word in window:
+                return True
+        return False
+
+    def _fix_duplicates(self, text: str, issues: List[ProofreadIssue]) -> str:
+        """
+        报告重复的虚字和词语（不修正）
+
+        重叠是中文常见的修辞（的的确确、对不起对不起、一把把），
+        本地无法区分笔误和有意的重叠，因此只交给LLM编辑判断。
+        """
+        found: Dict[str, List[Any]] = {}
+
+        def doubled(position: int) -> bool:
+            pair = text[position : position + 2]
+            return len(pair) == 2 and pair[0] == pair[1]
+
+        if self._duplicate_char is not None:
+            for match in self._duplicate_char.finditer(text):
+                start, end = match.span()
+                # AABB式重叠（的的确确、从从容容）是合法用法
+                if doubled(end) or doubled(start - 2) or self._protected(text, start, end):
+                    continue
+                found.setdefault(match.group(0), ["重复字", match.group(1), 0])[2] += 1
+
+        for match in self._duplicate_word.finditer(text):
+            word = match.group(1)
+            # 叠字（哈哈哈哈）和例外词不报告
+            if len(set(word)) == 1 or self._protected(text, *match.span()):
+                continue
+            found.setdefault(match.group(0), ["重复词", word, 0])[2] += 1
+
+        for fragment, (issue_type, suggestion, count) in found.items():
+            self._add_issue(issues, issue_type, fragment, suggestion, count, False)
+        return text
+
+    def _fix_confusables(self, text: str, issues: List[ProofreadIssue]) -> str:
+        """按词典修正易混淆字词，有歧义的写法和与例外词重叠的位置只报告"""
+        if self._confusable is None:
+            return text
+        counts: Dict[Any, int] = {}
+
+        def replace(match: "re.Match[str]") -> str:
+            word = match.group(0)
+            fixed = word in self.confusables and not self._protected(text, *match.span())
+            counts[(word, fixed)] = counts.get((word, fixed), 0) + 1
+            return self.confusables[word] if fixed else word
+
+        text = self._confusable.sub(replace, text)
+        for (word, fixed), count in counts.items():
+            suggestion = self.confusables.get(word) or self.ambiguous[word]
+            self._add_issue(issues, "易混淆字词", word, suggestion, count, fixed)
+        return text
+
+    def _check_pairs(self, text: str, issues: List[ProofreadIssue]) -> None:
+        """检查引号和括号是否成对（只报告，不修正）"""
+        closing = {close: open_ for open_, close in PAIRED_MARKS.items()}
+        stack: List[Any] = []
+        unmatched: List[Any] = []
+        for match in self._paired_marks.finditer(text):
+            mark = match.group(0)
+            if mark in PAIRED_MARKS:
+                stack.append((mark, match.start()))
+            elif stack and stack[-1][0] == closing[mark]:
+                stack.pop()
+            else:
+                unmatched.append((mark, match.start()))
+        unmatched.extend(stack)
+
+        for mark, position in sorted(unmatched, key=lambda item: item[1]):
+            context = text[max(0, position - 10) : position + 10]
+            suggestion = PAIRED_MARKS.get(mark) or closing[mark]
+            self._add_issue(issues, "引号括号不配对", context, suggestion, 1, False)
+
+    @staticmethod
+    def _add_issue(
+        issues: List[ProofreadIssue],
+        issue_type: str,
+        text: str,
+        suggestion: str,
+        count: int,
+        fixed: bool,
+    ) -> None:
+        issues.append(
+            {
+                "type": issue_type,
+                "text": text,
+                "suggestion": suggestion,
+                "count": count,
+                "fixed": fixed,
+            }
+        )
+
+
+def format_issues(issues: List[ProofreadIssue]) -> str:
+    """将未修正的问题格式化为可附加在编辑prompt中的说明"""
+    lines = [
+        f"- {issue['type']}：{issue['text']}（建议：{issue['suggestion']}）"
+        for issue in issues
+        if not issue["fixed"]
+    ]
+    return "\n".join(lines)
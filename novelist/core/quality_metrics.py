@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Any, List, Optional, Sequence
+from typing_extensions import TypedDict
+
+import numpy as np
+
+from .convergence import DraftLike, split_paragraphs
+from .sections import CHAPTER_HEADING
+from .tokens import _CJK_RANGES, _in_ranges
+
+# 句末标点
+SENTENCE_ENDS = "。！？!?…"
+# 对白引号（开, 闭）
+QUOTES = (("“", "”"), ("「", "」"), ("『", "』"))
+# 词汇多样性按固定长度的字符二元组窗口计算，避免长文本的比例随长度下降；
+# 长文本均匀抽取部分窗口
+DIVERSITY_WINDOW = 1000
+DIVERSITY_SAMPLES = 64
+
+
+class QualityReport(TypedDict):
+    metrics: Dict[str, float]
+    missing: List[str]  # 正文中没有出现的人物和关键场景
+    issues: List[str]  # 未通过的预检项
+    passed: bool
+
+
+# 字符类别查找表（基本多文种平面），一次查表完成分类；PUNCT及之后的类别都是标点
+WORD, SPACE, NEWLINE, PUNCT, SENTENCE_END, OPEN_QUOTE, CLOSE_QUOTE = range(7)
+
+
+def _class_table() -> np.ndarray:
+    table = np.full(0x10000, PUNCT, dtype=np.uint8)
+    codepoints = np.arange(0x10000, dtype=np.uint32)
+    word = _in_ranges(codepoints, _CJK_RANGES)
+    for low, high in ((0x30, 0x39), (0x41, 0x5A), (0x61, 0x7A)):
+        word[low : high + 1] = True
+    table[word] = WORD
+    table[[0x09, 0x0B, 0x0C, 0x0D, 0x20, 0x3000]] = SPACE
+    table[0x0A] = NEWLINE
+    table[[ord(c) for c in SENTENCE_ENDS]] = SENTENCE_END
+    table[[ord(open_) for open_, _ in QUOTES]] = OPEN_QUOTE
+    table[[ord(close) for _, close in QUOTES]] = CLOSE_QUOTE
+    return table
+
+
+_CLASSES = _class_table()
+
+
+class QualityMetrics:
+    """
+    本地质量指标
+
+    按段落向量化统计段落长度分布、对白占比、词汇多样性、句长变化、
+    标点密度和故事种子关键词（人物、关键场景）覆盖率。
+    全书一次统计在几十毫秒内完成，可以在LLM评估之前拦截明显不合格的草稿，
+    也可以作为评估时的补充信息。
+    """
+
+    def __init__(
+        self,
+        characters: Sequence[str] = (),
+        key_scenes: Sequence[str] = (),
+        min_chars: int = 200,
+        min_diversity: float = 0.25,
+    ):
+        """
+        初始化
+
+        Args:
+            characters: 人物姓名
+            key_scenes: 关键场景（如“海边初遇”）
+            min_chars: 预检要求的最少正文字数
+            min_diversity: 预检要求的最低词汇多样性
+        """
+        self.characters = [name for name in characters if name]
+        self.key_scenes = [scene for scene in key_scenes if scene]
+        self.min_chars = min_chars
+        self.min_diversity = min_diversity
+
+    @classmethod
+    def from_seed(
+        cls, story_seed: Optional[Dict[str, Any]], **kwargs: Any
+    ) -> "QualityMetrics":
+        """从故事种子读取人物姓名和关键场景"""
+        story_seed = story_seed or {}
+        characters = [
+            str(character["name"])
+            for character in story_seed.get("characters") or []
+            if isinstance(character, dict) and character.get("name")
+        ]
+        plot_elements = story_seed.get("plot_elements") or {}
+        key_scenes = [str(scene) for scene in plot_elements.get("key_scenes") or []]
+        return cls(characters, key_scenes, **kwargs)
+
+    def measure(self, text: DraftLike) -> QualityReport:
+        """
+        统计文本的质量指标并做预检
+
+        Args:
+            text: 草稿或单个章节
+
+        Returns:
+            QualityReport: 指标、缺失的关键词和未通过的预检项
+        """
+        paragraphs = [p for p in split_paragraphs(text) if not CHAPTER_HEADING.match(p)]
+        joined = "\n".join(paragraphs)
+        codepoints = np.frombuffer(
+            joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+        )
+        lengths = np.fromiter(map(len, paragraphs), dtype=np.int64, count=len(paragraphs))
+        # 段落之间有一个换行
+        starts = np.cumsum(lengths + 1) - lengths - 1
+
+        classes = _CLASSES[np.minimum(codepoints, 0xFFFF)]
+        # 扩展平面中只有CJK扩展汉字计为文字，其余视为标点符号
+        extended = codepoints > 0xFFFF
+        if extended.any():
+            classes[extended] = np.where(
+                _in_ranges(codepoints[extended], _CJK_RANGES), WORD, PUNCT
+            )
+        word = classes == WORD
+
+        # 引号深度在每个段落开头清零，未闭合的引号不会影响后续段落
+        delta = (classes == OPEN_QUOTE).astype(np.int32) - (classes == CLOSE_QUOTE)
+        depth = np.cumsum(delta, dtype=np.int32)
+        if len(paragraphs):
+            before = np.concatenate([[0], depth])[starts]
+            depth -= np.repeat(before, lengths + 1)[: len(depth)]
+        dialogue = word & (depth > 0)
+
+        def per_paragraph(mask: np.ndarray) -> np.ndarray:
+            # 每段从起点到下一段起点求和，段落之间的换行不计数
+            if not len(paragraphs):
+                return np.zeros(0, dtype=np.int64)
+            return np.add.reduceat(mask, starts, dtype=np.int64)
+
+        words = per_paragraph(word)
+        total_words = int(words.sum())
+        metrics: Dict[str, float] = {
+            "paragraphs": float(len(paragraphs)),
+            "chars": float(total_words),
+        }
+
+        # 段落长度分布
+        if len(paragraphs):
+            p10, median, p90 = np.percentile(words, [10, 50, 90])
+            mean = float(words.mean())
+            metrics.update(
+                paragraph_mean=round(mean, 1),
+                paragraph_median=float(median),
+                paragraph_p10=float(p10),
+                paragraph_p90=float(p90),
+                paragraph_cv=round(float(words.std() / mean), 3) if mean else 0.0,
+            )
+
+        # 对白占比
+        metrics["dialogue_ratio"] = (
+            round(float(per_paragraph(dialogue).sum()) / total_words, 3)
+            if total_words
+            else 0.0
+        )
+
+        # 句长：相邻句末标点之间的字数
+        word_sums = np.concatenate([[0], np.cumsum(word, dtype=np.int32)])
+        boundaries = np.flatnonzero(classes == SENTENCE_END)
+        # 连续的句末标点（如“！？”、省略号）只算一次
+        if boundaries.size:
+            boundaries = boundaries[np.concatenate([[True], np.diff(boundaries) > 1])]
+        sentence_lengths = np.diff(word_sums[np.concatenate([[0], boundaries])])
+        sentence_lengths = sentence_lengths[sentence_lengths > 0]
+        metrics["sentences"] = float(sentence_lengths.size)
+        if sentence_lengths.size:
+            sentence_mean = float(sentence_lengths.mean())
+            metrics["sentence_mean"] = round(sentence_mean, 1)
+            metrics["sentence_cv"] = round(float(sentence_lengths.std()) / sentence_mean, 3)
+
+        # 标点密度：每百字的标点数
+        metrics["punctuation_density"] = (
+            round(100.0 * float(np.count_nonzero(classes >= PUNCT)) / total_words, 2)
+            if total_words
+            else 0.0
+        )
+
+        metrics["lexical_diversity"] = round(self._diversity(codepoints[word]), 3)
+
+        missing = [name for name in self.characters if name not in joined]
+        if self.characters:
+            metrics["character_coverage"] = round(
+                1 - len(missing) / len(self.characters), 3
+            )
+        missing_scenes = [scene for scene in self.key_scenes if not self._covers(joined, scene)]
+        if self.key_scenes:
+            metrics["scene_coverage"] = round(
+                1 - len(missing_scenes) / len(self.key_scenes), 3
+            )
+        missing += missing_scenes
+
+        issues = []
+        if total_words < self.min_chars:
+            issues.append(f"正文过短（{total_words}字，至少需要{self.min_chars}字）")
+        elif not sentence_lengths.size:
+            issues.append("正文没有句末标点，不是连贯的叙述")
+        elif metrics["lexical_diversity"] < self.min_diversity:
+            issues.append(
+                f"词汇多样性过低（{metrics['lexical_diversity']}），内容可能大量重复"
+            )
+        if self.characters and len(missing) >= len(self.characters) and not any(
+            name in joined for name in self.characters
+        ):
+            issues.append("正文中没有出现任何设定中的人物")
+        return QualityReport(
+            metrics=metrics, missing=missing, issues=issues, passed=not issues
+        )
+
+    @staticmethod
+    def _diversity(codepoints: np.ndarray) -> float:
+        """字符二元组的窗口平均类型/词例比（不足一个窗口时按实际长度计算）"""
+        if codepoints.size < 2:
+            return 0.0
+        bigrams = (codepoints[:-1].astype(np.uint64) << np.uint64(21)) | codepoints[1:]
+        window = min(DIVERSITY_WINDOW, bigrams.size)
+        count = bigrams.size // window
+        rows = bigrams[: count * window].reshape(count, window)
+        if count > DIVERSITY_SAMPLES:
+            rows = rows[np.linspace(0, count - 1, DIVERSITY_SAMPLES).astype(np.int64)]
+        rows = np.sort(rows, axis=1)
+        distinct = 1 + np.count_nonzero(np.diff(rows, axis=1), axis=1)
+        return float(distinct.mean()) / window
+
+    @staticmethod
+    def _covers(text: str, scene: str) -> bool:
+        """关键场景按两字一组切分，一半以上的词组出现在正文中即视为覆盖"""
+        if scene in text:
+            return True
+        parts = [scene[i : i + 2] for i in range(0, len(scene), 2)]
+        return sum(part in text for part in parts) * 2 >= len(parts)
+
+    @staticmethod
+    def summary(report: QualityReport) -> str:
+        """格式化指标，供评估prompt参考"""
+        metrics = report["metrics"]
+        lines = [
+            f"段落数：{int(metrics['paragraphs'])}，正文字数：{int(metrics['chars'])}",
+        ]
+        if "paragraph_mean" in metrics:
+            lines.append(
+                f"段落长度：平均{metrics['paragraph_mean']}字，"
+                f"中位数{metrics['paragraph_median']:.0f}字，变异系数{metrics['paragraph_cv']}"
+            )
+        lines.append(f"对白占比：{metrics['dialogue_ratio']:.0%}")
+        if "sentence_mean" in metrics:
+            lines.append(
+                f"句长：平均{metrics['sentence_mean']}字，变异系数{metrics['sentence_cv']}"
+            )
+        lines.append(f"标点密度：每百字{metrics['punctuation_density']}个")
+        lines.append(f"词汇多样性：{metrics['lexical_diversity']}")
+        if report["missing"]:
+            lines.append(f"未出现的人物或关键场景：{'、'.join(report['missing'])}")
+        return "\n".join(lines)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_BASE = np.uint64(0x110000)  # 码点个数，k-gram按此进制组合（在uint64上自然溢出）
+_SHIFT = np.uint64(32)
+# 计算相似度前去掉空白和标点，只差标点或空格的段落视为相同
+_NOISE = re.compile(r"[\W_]+")
+
+
+def normalize(paragraph: str) -> str:
+    return _NOISE.sub("", paragraph)
+
+
+class MinHasher:
+    """按字符k-gram计算MinHash签名，签名中相同位置的比例近似Jaccard相似度"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        """
+        初始化
+
+        Args:
+            num_perm: 签名长度（哈希函数个数）
+            shingle_size: 字符k-gram的长度
+            seed: 生成哈希函数系数的随机种子
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # 乘法移位哈希：(a*x + b) mod 2^64 取高32位，a为奇数
+        self._a = (rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, text: str) -> np.ndarray:
+        # 在码点数组上整体计算所有k-gram的哈希，不在Python层逐个切片；
+        # 重复的k-gram不影响最小值，因此无需去重
+        codepoints = np.frombuffer(
+            text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+        ).astype(np.uint64)
+        k = min(self.shingle_size, len(codepoints))
+        hashes = np.zeros(max(1, len(codepoints) - k + 1), dtype=np.uint64)
+        for offset in range(k):
+            hashes = hashes * _BASE + codepoints[offset : offset + len(hashes)]
+        return ((self._a * hashes + self._b) >> _SHIFT).min(axis=1)
+
+
+class RepetitionDetector:
+    """
+    段落级近似重复检测（MinHash + LSH）
+
+    段落的MinHash签名按band分桶，只有落在同一个桶里的段落才比较签名，
+    每个新段落的检测耗时与已有段落数基本无关。
+    既可以一次检查整段文本，也可以在流式输出时逐片段喂入，
+    重复段落占比超过上限时判定为复读，调用方据此提前中止生成。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        max_ratio: float = 0.3,
+        min_repeats: int = 3,
+        min_chars: int = 10,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+    ):
+        """
+        初始化检测器
+
+        Args:
+            threshold: 判定为重复的相似度
+            max_ratio: 重复字数占比上限，超过时判定为复读
+            min_repeats: 判定为复读至少需要的重复段落数
+            min_chars: 参与检测的最短段落（去掉标点后的字数），更短的段落（如简短对白）不检测
+            num_perm: MinHash签名长度
+            bands: LSH的band数，须整除num_perm
+            shingle_size: 字符k-gram的长度
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须是bands的整数倍")
+        self.threshold = threshold
+        self.max_ratio = max_ratio
+        self.min_repeats = min_repeats
+        self.min_chars = min_chars
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self._signatures = np.zeros((64, num_perm), dtype=np.uint64)
+        self._size = 0
+        self._exact: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.paragraphs = 0  # 参与检测的段落数
+        self.repeats = 0  # 重复段落数
+        self.chars = 0  # 参与检测的字数
+        self.repeated_chars = 0  # 重复段落的字数
+        # 流式输入
+        self._pending = ""
+        self._kept: List[str] = []
+
+    @property
+    def ratio(self) -> float:
+        """重复字数占比"""
+        return self.repeated_chars / self.chars if self.chars else 0.0
+
+    @property
+    def degenerate(self) -> bool:
+        """是否已陷入复读"""
+        return self.repeats >= self.min_repeats and self.ratio >= self.max_ratio
+
+    def add(self, paragraph: str) -> Optional[int]:
+        """
+        加入一个段落
+
+        Returns:
+            Optional[int]: 与之近似重复的已有段落序号；不重复或段落过短时返回None
+        """
+        key = normalize(paragraph)
+        if len(key) < self.min_chars:
+            return None
+        self.paragraphs += 1
+        self.chars += len(key)
+
+        match = self._exact.get(key)
+        signature = None
+        if match is None:
+            signature = self.hasher.signature(key)
+            bands = signature.reshape(self.bands, -1)
+            candidates: Set[int] = set()
+            for band, rows in enumerate(bands):
+                candidates.update(self._buckets.get((band, rows.tobytes()), ()))
+            if candidates:
+                # 一次比较所有候选段落的签名
+                indexes = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                similarity = (self._signatures[indexes] == signature).mean(axis=1)
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    match = int(indexes[best])
+
+        if match is not None:
+            self.repeats += 1
+            self.repeated_chars += len(key)
+            return match
+
+        index = self._size
+        if index == len(self._signatures):
+            self._signatures = np.concatenate(
+                [self._signatures, np.zeros_like(self._signatures)]
+            )
+        self._signatures[index] = signature
+        self._size += 1
+        self._exact[key] = index
+        for band, rows in enumerate(signature.reshape(self.bands, -1)):
+            self._buckets.setdefault((band, rows.tobytes()), []).append(index)
+        return None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        流式喂入输出片段，每凑齐一行检测一次
+
+        Returns:
+            bool: 是否已陷入复读
+        """
+        self._pending += chunk
+        if "\n" in self._pending:
+            *lines, self._pending = self._pending.split("\n")
+            for line in lines:
+                if self.add(line) is None:
+                    self._kept.append(line)
+        return self.degenerate
+
+    def streamed_text(self) -> str:
+        """已完整输出的行去掉重复段落后的文本（不含未写完的最后一行）"""
+        return "\n".join(self._kept).strip("\n")
+
+    def trim(self, text: str) -> Tuple[str, int]:
+        """
+        删除文本中的近似重复段落，保留首次出现的段落和所有空行、短段落
+
+        Returns:
+            Tuple[str, int]: 处理后的文本和删除的段落数
+        """
+        kept = []
+        removed = 0
+        for line in text.split("\n"):
+            if self.add(line) is None:
+                kept.append(line)
+            else:
+                removed += 1
+        if not removed:
+            return text, 0
+        # 删除段落后留下的连续空行合并为一个
+        trimmed = re.sub(r"\n{3,}", "\n\n", "\n".join(kept))
+        if not text.endswith("\n"):
+            trimmed = trimmed.rstrip("\n")
+        return trimmed, removed
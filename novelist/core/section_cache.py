@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def section_key(outline: str, section: str) -> str:
+    """计算章节评分的缓存键（大纲与正文共同决定评分）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(outline.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(section.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SectionScoreCache:
+    """按章节哈希缓存评分结果，只有改动过的章节需要重新评估"""
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大缓存条目数，超出时淘汰最久未使用的条目
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        """读取缓存的评分和评估意见"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, score: float, feedback: str) -> None:
+        """写入章节评分"""
+        self._entries[key] = (score, feedback)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import List
+
+# 章节标题：整行只有第X章/节/回/幕或Chapter N（可带Markdown标题符号）及标题名。
+# 标题名之前需有空白或冒号等分隔，且不含句末标点，“第二节课我不去了。”这样的正文不算标题；
+# 不点明章节的Markdown标题（如“## 人物设定”）也不算
+CHAPTER_HEADING = re.compile(
+    r"^[ \t\u3000]*(?:#{1,3}[ \t]+)?"
+    r"(?:第[0-9０-９一二三四五六七八九十百千零两]+[章节回幕]|Chapter[ \t]+\d+)"
+    r"(?:[ \t\u3000:：、.．][^\n。！？!?]*)?[ \t]*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def split_sections(text: str) -> List[str]:
+    """
+    按章节标题将文本切分为多个章节
+
+    Args:
+        text: 大纲或正文
+
+    Returns:
+        List[str]: 章节列表；没有章节标题时返回仅含全文的列表
+    """
+    if not text:
+        return []
+
+    starts = [m.start() for m in CHAPTER_HEADING.finditer(text)]
+    if not starts:
+        return [text]
+
+    # 第一个标题之前的内容（如书名、引言）并入第一章
+    starts[0] = 0
+    starts.append(len(text))
+    return [
+        text[begin:end].strip("\n")
+        for begin, end in zip(starts, starts[1:])
+        if text[begin:end].strip()
+    ]
+
+
+def join_sections(sections: List[str]) -> str:
+    """将章节列表合并为完整文本"""
+    return "\n\n".join(section.strip("\n") for section in sections)
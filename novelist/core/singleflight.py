@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import json
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+Emit = Callable[[str], None]
+
+
+def request_key(
+    agent_type: str, prompt: str, llm_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    计算请求的归一化键
+
+    Agent类型、LLM配置（包括temperature、seed等采样参数）和空白归一化后的prompt
+    都相同的请求视为同一请求。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(agent_type.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(
+        json.dumps(llm_config or {}, sort_keys=True, default=str).encode("utf-8")
+    )
+    digest.update(b"\0")
+    digest.update(" ".join(prompt.split()).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def coalescable(llm_config: Optional[Dict[str, Any]]) -> bool:
+    """
+    请求是否可以合并
+
+    temperature大于0（或未设置）且没有固定seed的请求每次采样的结果都不同，
+    合并会让多个调用者拿到同一份采样结果，这类请求不合并。
+    """
+    config = llm_config or {}
+    if config.get("seed") is not None:
+        return True
+    temperature = config.get("temperature")
+    return temperature is not None and float(temperature) <= 0
+
+
+class _Flight:
+    """一个进行中的上游请求，以及已经收到的流式片段"""
+
+    __slots__ = ("task", "chunks", "listeners", "waiters")
+
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Future] = None
+        self.chunks: List[str] = []
+        self.listeners: List[Emit] = []
+        self.waiters = 0
+
+    def emit(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        for listener in list(self.listeners):
+            listener(chunk)
+
+
+class SingleFlight:
+    """
+    请求合并：相同的请求同时进行时只发出一次上游调用
+
+    后加入的调用者共享同一个结果，并先回放已收到的流式片段再接收后续片段。
+    与缓存不同，请求完成后立即移除，不保存任何结果。
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, _Flight] = {}
+        self.leaders = 0  # 实际发出的上游请求数
+        self.coalesced = 0  # 被合并到进行中请求的调用数
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[Emit], Awaitable[T]],
+        on_chunk: Optional[Emit] = None,
+    ) -> Tuple[T, bool]:
+        """
+        执行请求，已有相同请求进行中时等待其结果
+
+        上游请求在独立的任务中运行，单个调用者被取消不会影响其他调用者；
+        所有调用者都取消后才取消上游请求。
+
+        Args:
+            key: 请求键，见request_key
+            fn: 发起上游请求的协程函数，接收用于推送流式片段的回调
+            on_chunk: 接收流式片段的回调
+
+        Returns:
+            Tuple[T, bool]: 请求结果，以及本次调用是否实际发出了上游请求
+        """
+        flight = self._inflight.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(fn(flight.emit))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._inflight[key] = flight
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        if on_chunk is not None:
+            for chunk in flight.chunks:
+                on_chunk(chunk)
+            flight.listeners.append(on_chunk)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), leader
+        finally:
+            flight.waiters -= 1
+            if on_chunk is not None:
+                flight.listeners.remove(on_chunk)
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """上游请求数、合并调用数和进行中的请求数"""
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+# 进程内共享的实例，同一进程中的多个工作流通过它合并请求
+shared_singleflight = SingleFlight()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import operator
+import os
+import re
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set, Tuple
+import yaml
+
+from .deadline import current_deadline, run_with_timeout
+
+# 特殊目标：结束整个运行
+END = "end"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+Condition = Callable[[Dict[str, Any]], bool]
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_CLAUSE = re.compile(r"^\s*([A-Za-z_]\w*)\s*(==|!=|>=|<=|>|<)\s*([\w.+-]+)\s*$")
+
+
+def compile_condition(text: Optional[str]) -> Condition:
+    """
+    编译转移条件
+
+    条件由“变量 运算符 值”子句用and连接，如“score >= threshold and editing_left > 0”。
+    值可以是数字或状态中的变量名；变量缺失时子句不成立。
+    不使用eval，配置中无法执行任意代码。
+    """
+    if not text:
+        return lambda state: True
+
+    clauses: List[Tuple[str, Callable[[Any, Any], bool], str]] = []
+    for clause in re.split(r"\s+and\s+", text.strip()):
+        match = _CLAUSE.match(clause)
+        if not match:
+            raise ValueError(f"无法解析的转移条件: {clause}")
+        name, op, value = match.groups()
+        clauses.append((name, _OPERATORS[op], value))
+
+    def resolve(token: str, state: Dict[str, Any]) -> Any:
+        try:
+            return float(token)
+        except ValueError:
+            return state.get(token)
+
+    def condition(state: Dict[str, Any]) -> bool:
+        for name, compare, value in clauses:
+            left, right = state.get(name), resolve(value, state)
+            if left is None or right is None:
+                return False
+            try:
+                if not compare(left, right):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    return condition
+
+
+class StageSpec:
+    """阶段定义：处理函数、前置阶段、转移、并发分组和超时"""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Optional[str] = None,
+        after: Optional[List[str]] = None,
+        transitions: Optional[List[Dict[str, Any]]] = None,
+        group: Optional[str] = None,
+        max_visits: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.handler = handler or name
+        self.after = list(after or [])
+        self.transitions: List[Tuple[Condition, List[str], str]] = []
+        for transition in transitions or []:
+            targets = transition.get("to") or []
+            if isinstance(targets, str):
+                targets = [targets]
+            when = transition.get("when")
+            self.transitions.append((compile_condition(when), list(targets), when or ""))
+        self.group = group
+        self.max_visits = max_visits
+        self.timeout = timeout
+
+    def stage_timeout(self) -> Optional[float]:
+        """本次执行的超时：阶段超时与当前截止时间剩余时间中较小的一个"""
+        deadline = current_deadline()
+        return deadline.timeout(self.timeout) if deadline is not None else self.timeout
+
+    def next_stages(self, state: Dict[str, Any]) -> Optional[List[str]]:
+        """第一个成立的转移的目标；没有声明转移时返回None"""
+        if not self.transitions:
+            return None
+        for condition, targets, _ in self.transitions:
+            if condition(state):
+                return targets
+        return []
+
+
+class StageGraph:
+    """
+    声明式阶段图执行引擎
+
+    阶段完成后按转移条件选择后续阶段（可以同时选择多个，形成并行分支），
+    声明了after的阶段会等所有前置阶段完成后才执行（汇合）。
+    所有就绪的阶段并行执行，受全局和分组并发上限约束。
+    阶段在自身超时和当前截止时间内执行，超时时被取消并抛出DeadlineExceeded。
+    """
+
+    def __init__(
+        self,
+        stages: Dict[str, StageSpec],
+        start: List[str],
+        max_parallel: int = 4,
+        concurrency: Optional[Dict[str, int]] = None,
+        max_steps: int = 100,
+    ):
+        """
+        初始化阶段图
+
+        Args:
+            stages: 阶段名 -> 阶段定义
+            start: 起始阶段
+            max_parallel: 同时执行的阶段数上限
+            concurrency: 分组 -> 该组同时执行的阶段数上限
+            max_steps: 单次运行最多执行的阶段次数，防止转移配置成死循环；
+                达到上限后取消仍在执行的阶段并结束
+        """
+        self.stages = stages
+        self.start = list(start)
+        self.max_parallel = max(1, max_parallel)
+        self.concurrency = dict(concurrency or {})
+        self.max_steps = max_steps
+        self.logger = logging.getLogger("novelist.stage_graph")
+        self._check_targets()
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "StageGraph":
+        stages = {
+            name: StageSpec(
+                name,
+                handler=spec.get("handler"),
+                after=spec.get("after"),
+                transitions=spec.get("transitions"),
+                group=spec.get("group"),
+                max_visits=spec.get("max_visits"),
+                timeout=spec.get("timeout"),
+            )
+            for name, spec in (config.get("stages") or {}).items()
+        }
+        return cls(
+            stages,
+            start=config.get("start") or [],
+            max_parallel=config.get("max_parallel", 4),
+            concurrency=config.get("concurrency"),
+            max_steps=config.get("max_steps", 100),
+        )
+
+    @classmethod
+    def from_config(cls, config_path: Optional[str] = None) -> "StageGraph":
+        """
+        从配置文件创建阶段图
+
+        Args:
+            config_path: 配置路径，默认使用configs/workflow_graph.yaml
+        """
+        if config_path is None:
+            config_path = os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "configs",
+                "workflow_graph.yaml",
+            )
+        with open(config_path, "r", encoding="utf-8") as f:
+            return cls.from_dict(yaml.safe_load(f) or {})
+
+    def _check_targets(self) -> None:
+        if not self.start:
+            raise ValueError("阶段图缺少起始阶段")
+        known = set(self.stages) | {END}
+        for name in self.start:
+            if name not in self.stages:
+                raise ValueError(f"未知的起始阶段: {name}")
+        for spec in self.stages.values():
+            for dependency in spec.after:
+                if dependency not in self.stages:
+                    raise ValueError(f"阶段 '{spec.name}' 依赖未知阶段: {dependency}")
+            for _, targets, _ in spec.transitions:
+                for target in targets:
+                    if target not in known:
+                        raise ValueError(f"阶段 '{spec.name}' 转移到未知阶段: {target}")
+
+    def validate(self, handlers: Dict[str, Handler]) -> None:
+        """检查每个阶段的处理函数都已提供"""
+        missing = sorted(
+            {spec.handler for spec in self.stages.values()} - set(handlers)
+        )
+        if missing:
+            raise ValueError(f"缺少阶段处理函数: {', '.join(missing)}")
+
+    async def run(
+        self, handlers: Dict[str, Handler], state: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        执行阶段图
+
+        Args:
+            handlers: 处理函数名 -> 协程函数，接收共享状态，返回需要合并进状态的更新
+            state: 初始状态
+
+        Returns:
+            Dict[str, Any]: 最终状态，trace为阶段完成顺序，end_reason为结束原因，
+                interrupted表示是否因执行次数或步数上限提前结束（不会抛出异常）
+        """
+        self.validate(handlers)
+        state = dict(state or {})
+        trace: List[str] = []
+        visits: Dict[str, int] = {name: 0 for name in self.stages}
+        pending: List[str] = []  # 就绪但尚未启动的阶段（按就绪顺序）
+        joins: Dict[str, Set[str]] = {name: set() for name in self.stages}
+        running: Dict[asyncio.Task, StageSpec] = {}
+        end_reason = "completed"
+        interrupted = False  # 因执行次数或步数上限提前结束
+        out_of_steps = False
+        steps = 0
+
+        def trigger(target: str, source: Optional[str]) -> None:
+            spec = self.stages[target]
+            if source is not None and source in spec.after:
+                joins[target].add(source)
+                if not joins[target].issuperset(spec.after):
+                    return
+                joins[target].clear()
+            if target not in pending:
+                pending.append(target)
+
+        def group_load(group: str) -> int:
+            return sum(1 for spec in running.values() if spec.group == group)
+
+        def launchable(spec: StageSpec) -> bool:
+            if any(running_spec.name == spec.name for running_spec in running.values()):
+                return False
+            if spec.group is not None and spec.group in self.concurrency:
+                return group_load(spec.group) < self.concurrency[spec.group]
+            return True
+
+        for name in self.start:
+            trigger(name, None)
+
+        try:
+            while pending or running:
+                for name in list(pending):
+                    if len(running) >= self.max_parallel:
+                        break
+                    spec = self.stages[name]
+                    if not launchable(spec):
+                        continue
+                    if spec.max_visits is not None and visits[name] >= spec.max_visits:
+                        pending.remove(name)
+                        end_reason = f"阶段 '{name}' 超过最大执行次数"
+                        interrupted = True
+                        self.logger.warning(end_reason)
+                        continue
+                    if steps >= self.max_steps:
+                        end_reason = f"阶段图超过最大执行步数{self.max_steps}"
+                        interrupted = out_of_steps = True
+                        self.logger.warning(end_reason)
+                        break
+                    pending.remove(name)
+                    visits[name] += 1
+                    steps += 1
+                    task = asyncio.create_task(
+                        run_with_timeout(
+                            handlers[spec.handler](state),
+                            spec.stage_timeout(),
+                            f"阶段 '{name}'",
+                        )
+                    )
+                    running[task] = spec
+
+                if out_of_steps or not running:
+                    break
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                finished = False
+                for task in done:
+                    spec = running.pop(task)
+                    updates = task.result()
+                    if updates:
+                        state.update(updates)
+                    trace.append(spec.name)
+
+                    targets = spec.next_stages(state)
+                    if targets is None:
+                        targets = [
+                            name
+                            for name, other in self.stages.items()
+                            if spec.name in other.after
+                        ]
+                    if END in targets:
+                        finished = True
+                        interrupted = False
+                        end_reason = f"阶段 '{spec.name}' 转移到结束"
+                    for target in targets:
+                        if target != END:
+                            trigger(target, spec.name)
+                if finished:
+                    break
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        state["trace"] = trace
+        state["visits"] = visits
+        state["end_reason"] = end_reason
+        state["interrupted"] = interrupted
+        return state
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from .sections import CHAPTER_HEADING
+
+# 句子结尾：中文和英文的句末标点（含紧随其后的引号）
+_SENTENCE = re.compile(r"[^。！？!?]*[。！？!?]+[”’」』\"]?")
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: max(0, limit - 1)] + "…"
+
+
+class StoryBible:
+    """
+    故事圣经：人物、既定事实和各章摘要
+
+    章节通过后增量记录摘要和结尾片段。生成和评估的prompt使用
+    故事圣经加上前一章的结尾，代替完整的大纲和正文，
+    单次调用的上下文长度因此基本不随章节数增长。
+    """
+
+    def __init__(
+        self,
+        story_seed: Optional[Dict[str, Any]] = None,
+        recent_chapters: int = 5,
+        summary_chars: int = 200,
+        window_chars: int = 300,
+        max_titles: int = 30,
+    ):
+        """
+        初始化故事圣经
+
+        Args:
+            story_seed: 故事种子，从中读取人物和场景设定
+            recent_chapters: 保留完整摘要的最近章节数，更早的章节只保留标题
+            summary_chars: 每章摘要的最大字数
+            window_chars: 记录的每章结尾片段字数（作为下一章的衔接窗口）
+            max_titles: 最多列出的早期章节标题数
+        """
+        story_seed = story_seed or {}
+        self.recent_chapters = max(1, recent_chapters)
+        self.summary_chars = summary_chars
+        self.window_chars = window_chars
+        self.max_titles = max_titles
+        self.characters: List[Dict[str, Any]] = [
+            dict(character)
+            for character in story_seed.get("characters") or []
+            if isinstance(character, dict) and character.get("name")
+        ]
+        self.facts: List[str] = []
+        settings = story_seed.get("settings") or {}
+        for key, label in (("time", "时代背景"), ("location", "地点"), ("season", "季节")):
+            if settings.get(key):
+                self.facts.append(f"{label}：{settings[key]}")
+        # 章节下标 -> 标题、摘要和结尾片段
+        self.chapters: Dict[int, Dict[str, Any]] = {}
+
+    @staticmethod
+    def summarize(text: str, limit: int = 200) -> Tuple[str, str]:
+        """
+        本地抽取式摘要：章节标题、开头一句和结尾一句
+
+        Returns:
+            Tuple[str, str]: 标题（没有则为空）和摘要
+        """
+        lines = [line.strip() for line in text.strip().split("\n") if line.strip()]
+        title = ""
+        if lines and CHAPTER_HEADING.match(lines[0]):
+            title = lines.pop(0)
+        body = "".join(lines)
+        sentences = [s.strip() for s in _SENTENCE.findall(body) if s.strip()]
+        if not sentences:
+            return title, _clip(body, limit)
+        if len(sentences) == 1:
+            return title, _clip(sentences[0], limit)
+        first, last = sentences[0], sentences[-1]
+        half = max(1, (limit - 1) // 2)
+        return title, f"{_clip(first, half)}…{_clip(last, half)}"
+
+    def record_chapter(self, index: int, text: str) -> None:
+        """记录已通过的章节（重复记录同一章时覆盖）"""
+        title, summary = self.summarize(text, self.summary_chars)
+        tail = text.strip()[-self.window_chars :] if self.window_chars > 0 else ""
+        self.chapters[index] = {
+            "title": title or f"第{index + 1}章",
+            "summary": summary,
+            "tail": tail,
+            "digest": hash(text.strip()),
+        }
+
+    def unchanged(self, index: int, text: str) -> bool:
+        """第index章是否已记录且文本没有改动（已通过的章节可以只用摘要代替）"""
+        chapter = self.chapters.get(index)
+        return chapter is not None and chapter["digest"] == hash(text.strip())
+
+    def add_fact(self, fact: str) -> None:
+        """记录一条既定事实"""
+        fact = fact.strip()
+        if fact and fact not in self.facts:
+            self.facts.append(fact)
+
+    def window(self, index: int) -> Optional[str]:
+        """第index章的衔接窗口：前一章的结尾片段"""
+        previous = self.chapters.get(index - 1)
+        return previous["tail"] if previous and previous["tail"] else None
+
+    def _format_character(self, character: Dict[str, Any]) -> str:
+        details = [
+            str(character[key])
+            for key in ("role", "occupation")
+            if character.get(key)
+        ]
+        if character.get("age") is not None:
+            details.insert(1 if character.get("role") else 0, f"{character['age']}岁")
+        line = character["name"]
+        if details:
+            line += f"（{'，'.join(details)}）"
+        traits = character.get("traits") or []
+        extras = []
+        if traits:
+            extras.append("、".join(str(trait) for trait in traits))
+        if character.get("background"):
+            extras.append(str(character["background"]))
+        if extras:
+            line += "：" + "；".join(extras)
+        return f"- {line}"
+
+    def render(self, before: Optional[int] = None) -> str:
+        """
+        渲染故事圣经
+
+        Args:
+            before: 只包含该章之前的章节摘要，None表示全部已记录章节
+
+        Returns:
+            str: 人物、既定事实、早期章节标题和最近章节摘要
+        """
+        parts = []
+        if self.characters:
+            parts.append(
+                "人物：\n" + "\n".join(self._format_character(c) for c in self.characters)
+            )
+        if self.facts:
+            parts.append("既定事实：\n" + "\n".join(f"- {fact}" for fact in self.facts))
+
+        indexes = sorted(
+            index for index in self.chapters if before is None or index < before
+        )
+        recent = indexes[-self.recent_chapters :]
+        earlier = indexes[: -self.recent_chapters] if len(indexes) > len(recent) else []
+        if earlier:
+            shown = earlier[-self.max_titles :]
+            lines = [f"- {self.chapters[index]['title']}" for index in shown]
+            if len(earlier) > len(shown):
+                lines.insert(0, f"- ……（此前还有{len(earlier) - len(shown)}章）")
+            parts.append("前情章节：\n" + "\n".join(lines))
+        if recent:
+            parts.append(
+                "最近章节摘要：\n"
+                + "\n".join(
+                    f"- {self.chapters[index]['title']}：{self.chapters[index]['summary']}"
+                    for index in recent
+                )
+            )
+        return "\n\n".join(parts)
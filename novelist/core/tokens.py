@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 长度模型的特征：按码点类别统计的字符数、英文单词数和每段文本的固定开销
+FEATURES = (
+    "cjk",  # 汉字
+    "cjk_punct",  # 中文标点和全角字符
+    "words",  # 英文单词/数字串的个数
+    "word_chars",  # 英文单词/数字串的字符数
+    "punct",  # ASCII标点符号
+    "space",  # 空白和换行
+    "other",  # 其他字符（假名、韩文、表情等）
+    "base",  # 每段文本的固定开销（对话模板等）
+)
+
+# 未校准时的默认权重（每个特征对应的token数），接近DeepSeek/GPT系分词器在中文小说上的表现
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "cjk": 0.6,
+    "cjk_punct": 1.0,
+    "words": 1.0,
+    "word_chars": 0.1,
+    "punct": 1.0,
+    "space": 0.25,
+    "other": 1.5,
+    "base": 0.0,
+}
+
+_CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0x20000, 0x2FA1F))
+_CJK_PUNCT_RANGES = ((0x2010, 0x2027), (0x3000, 0x303F), (0xFF00, 0xFFEF))
+
+
+def _in_ranges(codepoints: np.ndarray, ranges: Sequence[Tuple[int, int]]) -> np.ndarray:
+    mask = np.zeros(codepoints.shape, dtype=bool)
+    for low, high in ranges:
+        mask |= (codepoints >= low) & (codepoints <= high)
+    return mask
+
+
+def text_features(texts: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    批量统计文本特征
+
+    所有文本拼接为一个码点数组后一次性分类，再用前缀和按文本求和，
+    数千段文本的统计只需要几次向量运算。
+
+    Returns:
+        np.ndarray: 形状为(len(texts), len(FEATURES))的特征矩阵
+    """
+    texts = [text or "" for text in texts]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    codepoints = np.frombuffer(
+        "".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+    )
+
+    cjk = _in_ranges(codepoints, _CJK_RANGES)
+    cjk_punct = _in_ranges(codepoints, _CJK_PUNCT_RANGES)
+    word_chars = (
+        ((codepoints >= 0x30) & (codepoints <= 0x39))
+        | ((codepoints >= 0x41) & (codepoints <= 0x5A))
+        | ((codepoints >= 0x61) & (codepoints <= 0x7A))
+    )
+    space = (codepoints == 0x20) | ((codepoints >= 0x09) & (codepoints <= 0x0D))
+    punct = (codepoints < 0x80) & ~word_chars & ~space
+    other = ~(cjk | cjk_punct | word_chars | space | punct)
+    # 单词起点：前一个字符不是单词字符，或者位于每段文本的开头
+    previous = np.zeros(codepoints.shape, dtype=bool)
+    previous[1:] = word_chars[:-1]
+    previous[starts[lengths > 0]] = False
+    words = word_chars & ~previous
+
+    masks = np.stack([cjk, cjk_punct, words, word_chars, punct, space, other])
+    sums = np.zeros((masks.shape[0], codepoints.size + 1), dtype=np.int64)
+    np.cumsum(masks, axis=1, out=sums[:, 1:])
+    counts = (sums[:, ends] - sums[:, starts]).T.astype(np.float64)
+    return np.hstack([counts, np.ones((len(texts), 1))])
+
+
+class TokenEstimator:
+    """
+    本地token数估算器
+
+    以按码点类别统计的特征做线性模型，权重来自校准表；
+    记录真实用量后可以用带先验的最小二乘重新拟合权重。
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        refit_interval: int = 0,
+        max_samples: int = 2000,
+        min_samples: int = 20,
+    ):
+        """
+        初始化估算器
+
+        Args:
+            weights: 特征权重，缺失的特征使用默认权重
+            refit_interval: 每记录多少条真实用量自动重新拟合一次，0表示不自动拟合
+            max_samples: 保留的真实用量样本数
+            min_samples: 重新拟合所需的最少样本数
+        """
+        merged = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.prior = np.array([float(merged[name]) for name in FEATURES])
+        self.weights = self.prior.copy()
+        self.refit_interval = refit_interval
+        self.min_samples = min_samples
+        self._samples: Deque[Tuple[np.ndarray, float]] = deque(maxlen=max_samples)
+        self._since_refit = 0
+
+    def estimate_batch(self, texts: Sequence[Optional[str]]) -> np.ndarray:
+        """批量估算token数"""
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        estimates = np.ceil(text_features(texts) @ self.weights)
+        estimates[[not text for text in texts]] = 0
+        return np.maximum(estimates, 0).astype(np.int64)
+
+    def estimate(self, text: Optional[str]) -> int:
+        """估算单段文本的token数"""
+        if not text:
+            return 0
+        return int(self.estimate_batch([text])[0])
+
+    def observe(self, text: Optional[str], tokens: int) -> None:
+        """记录一条真实用量，达到间隔时自动重新拟合"""
+        if not text or tokens <= 0:
+            return
+        self._samples.append((text_features([text])[0], float(tokens)))
+        self._since_refit += 1
+        if self.refit_interval and self._since_refit >= self.refit_interval:
+            self.refit()
+
+    def refit(self) -> bool:
+        """
+        用记录的真实用量重新拟合权重
+
+        最小化误差平方和加上偏离校准表先验的惩罚，样本中没有出现的特征保持先验权重。
+
+        Returns:
+            bool: 样本足够并完成了拟合
+        """
+        if len(self._samples) < self.min_samples:
+            return False
+        features = np.array([sample[0] for sample in self._samples])
+        tokens = np.array([sample[1] for sample in self._samples])
+        gram = features.T @ features
+        # 惩罚按特征的量级缩放，字符数和固定开销这样量级不同的特征受到同等约束
+        ridge = np.diag(1e-3 * np.diag(gram) + 1e-6)
+        weights = np.linalg.solve(gram + ridge, features.T @ tokens + ridge @ self.prior)
+        self.weights = np.maximum(weights, 0.0)
+        self._since_refit = 0
+        return True
+
+    def calibration(self) -> Dict[str, float]:
+        """当前权重，可以写回llm_config.yaml的token_calibration"""
+        return {name: round(float(w), 4) for name, w in zip(FEATURES, self.weights)}
+
+    def error(self) -> Optional[float]:
+        """当前权重在已记录样本上的平均相对误差"""
+        if not self._samples:
+            return None
+        features = np.array([sample[0] for sample in self._samples])
+        tokens = np.array([sample[1] for sample in self._samples])
+        return float(np.mean(np.abs(features @ self.weights - tokens) / tokens))
+
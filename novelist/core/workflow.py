@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Dict, Any, List, Optional, Sequence, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 from abc import ABC, abstractmethod
 import logging
 import asyncio
 import os
+import math
+import re
+import sys
 from datetime import datetime
 
 try:
@@ -16,7 +19,78 @@ try:
 except ImportError:
     raise ImportError("请先安装autogen-core==0.4.8.2")
 
+from .best_of import Candidate, CandidateRanker
+from .budget import RunBudget, BudgetExhausted, BUDGET_POLICIES
+from .cascade import ModelCascade
+from .convergence import ConvergenceDetector
+from .draft import Draft
+from .deadline import (
+    DEADLINE_POLICIES,
+    Deadline,
+    DeadlineExceeded,
+    RequestTimeout,
+    current_deadline,
+    run_with_timeout,
+)
+from .events import EventBus
+from .fact_index import FactIndex, FactViolation
 from .llm_factory import LLMFactory
+from .pipeline import ChapterPipeline
+from .prompt_builder import PromptBuilder, cached_prompt_tokens
+from .quality_metrics import QualityMetrics, QualityReport
+from .repetition import RepetitionDetector
+from .proofreader import ChineseProofreader
+from .section_cache import SectionScoreCache, section_key
+from .sections import CHAPTER_HEADING, split_sections, join_sections
+from .stage_graph import StageGraph
+from .story_bible import StoryBible
+from .singleflight import coalescable, request_key, shared_singleflight
+
+
+# 融合编辑模式中正文与自我评估之间的分隔行
+FUSED_ASSESSMENT_MARKER = "【自我评估】"
+
+# 复读检测覆盖的角色（输出为大纲或正文）：流式输出陷入复读时中止调用
+REPETITION_GUARDED_AGENTS = ("creator", "writer", "editor")
+# 删除近似重复段落只用于正文：大纲中结构相似的章节条目是正常的
+REPETITION_TRIMMED_AGENTS = ("writer", "editor")
+# 可以并发生成多个候选的阶段：大纲（创作者）和首稿（写作者）
+BEST_OF_STAGES = ("outline", "draft")
+# 可以单独设置超时的阶段（STAGE_TIMEOUTS），章节流水线中按单章计时
+TIMED_STAGES = ("outline", "draft", "edit", "evaluate", "revise")
+
+T = TypeVar("T")
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _stitch_results(head: Dict[str, Any], tail: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    拼接续写结果：正文首尾相连，用量相加，结束原因取续写的结果
+
+    续写开头如果重复了已输出内容的末尾（至少10个字），去掉重复部分。
+    """
+    text, addition = head.get("content") or "", tail.get("content") or ""
+    for size in range(min(len(text), len(addition), 200), 9, -1):
+        if text.endswith(addition[:size]):
+            addition = addition[size:]
+            break
+    usage = dict(head.get("usage") or {})
+    for key, value in (tail.get("usage") or {}).items():
+        if isinstance(value, (int, float)) and isinstance(usage.get(key, 0), (int, float)):
+            usage[key] = usage.get(key, 0) + value
+    return {
+        **head,
+        **tail,
+        "content": text + addition,
+        "usage": usage,
+    }
 
 
 class NovelAgent(AgentBase, ABC):
@@ -110,7 +184,13 @@ class SimpleGroupChatManager:
 class WorkflowManager:
     """工作流管理器"""
 
-    def __init__(self):
+    def __init__(self, batch_budget: Optional[RunBudget] = None):
+        """
+        初始化工作流管理器
+
+        Args:
+            batch_budget: 批量运行时多个工作流共享的预算
+        """
         self.agents: Dict[str, NovelAgent] = {}
         self.context: Dict[str, Any] = {}
         self.logger = logging.getLogger("novelist.workflow")
@@ -124,9 +204,240 @@ class WorkflowManager:
         self.max_editing_cycles = int(os.getenv("MAX_EDITING_CYCLES", 2))
         self.revision_threshold = float(os.getenv("REVISION_SCORE_THRESHOLD", 80))
 
+        # 推测执行：评分的同时提前启动下一轮编辑/修改
+        self.speculative_execution = _env_flag("SPECULATIVE_EXECUTION")
+        # 推测的写作者修改所依据的评分与评分后的结果相差不超过该值、偏离章节相同时仍然采用
+        self.speculation_score_tolerance = float(
+            os.getenv("SPECULATION_SCORE_TOLERANCE", 5)
+        )
+        self.speculation_stats: Dict[str, int] = {
+            "launched": 0,
+            "hits": 0,
+            "misses": 0,
+            "wasted_tokens": 0,
+        }
+
+        # 章节流水线：写作、编辑、审核按章节并行推进
+        self.pipeline_chapters = _env_flag("PIPELINE_CHAPTERS")
+        self.pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", 2))
+        self.max_chapter_rewrites = int(os.getenv("MAX_CHAPTER_REWRITES", 1))
+
+        # 增量评估：按章节缓存评分，只重新评估改动过的章节
+        self.incremental_evaluation = _env_flag("INCREMENTAL_EVALUATION")
+        self.section_score_cache = SectionScoreCache()
+
+        # 融合编辑：一次调用同时完成润色和自评，仅在接近阈值或每K轮时请审核者复核
+        self.fused_editing = _env_flag("FUSED_EDITING")
+        self.fused_verify_interval = max(1, int(os.getenv("FUSED_VERIFY_INTERVAL", 2)))
+        self.fused_verify_margin = float(os.getenv("FUSED_VERIFY_MARGIN", 5))
+        self.fused_stats: Dict[str, int] = {"self_assessed": 0}
+
+        # 本地校对：每轮编辑前修正确定性错误，文本已干净时可跳过LLM编辑
+        self.local_proofread = _env_flag("LOCAL_PROOFREAD")
+        self.skip_editor_when_clean = _env_flag("SKIP_EDITOR_WHEN_CLEAN")
+        self.proofreader = ChineseProofreader.from_config() if self.local_proofread else None
+        self.proofread_stats: Dict[str, int] = {"fixed": 0, "skipped_editor": 0}
+
+        # 收敛检测：编辑不再产生实质改动或评分停滞时提前结束编辑循环
+        self.convergence = (
+            ConvergenceDetector(
+                edit_ratio_threshold=float(os.getenv("CONVERGENCE_EDIT_RATIO", 0.01)),
+                max_changed_paragraphs=int(
+                    os.getenv("CONVERGENCE_MAX_CHANGED_PARAGRAPHS", 1)
+                ),
+                plateau_window=int(os.getenv("PLATEAU_WINDOW", 2)),
+                plateau_epsilon=float(os.getenv("PLATEAU_EPSILON", 2)),
+            )
+            if _env_flag("CONVERGENCE_DETECTION", True)
+            else None
+        )
+        self.convergence_stats: Dict[str, int] = {"converged": 0, "plateaued": 0}
+
+        # 运行预算：token、费用和耗时上限，超过软上限后按策略降级
+        self.budget = RunBudget.from_env("RUN", parent=batch_budget)
+        self.budget_policy = os.getenv("BUDGET_POLICY", "finalize")
+        if self.budget_policy not in BUDGET_POLICIES:
+            raise ValueError(f"未知的预算策略: {self.budget_policy}")
+        self._agent_llm_configs: Dict[str, Dict[str, Any]] = {}
+
+        # 截止时间：整次运行的截止时间逐级传递给阶段和单次请求，超时的调用会被取消
+        run_deadline = os.getenv("RUN_DEADLINE_SECONDS")
+        self.run_deadline_seconds = float(run_deadline) if run_deadline else None
+        self.deadline_policy = os.getenv("DEADLINE_POLICY", "best_draft")
+        if self.deadline_policy not in DEADLINE_POLICIES:
+            raise ValueError(f"未知的截止时间策略: {self.deadline_policy}")
+        self.deadline: Optional[Deadline] = None
+        # 阶段超时：如“draft=600,edit=300”，不晚于整次运行的截止时间
+        self.stage_timeouts: Dict[str, float] = {}
+        for item in os.getenv("STAGE_TIMEOUTS", "").split(","):
+            if not item.strip():
+                continue
+            stage, _, seconds = item.partition("=")
+            if stage.strip() not in TIMED_STAGES:
+                raise ValueError(f"未知的超时阶段: {stage.strip()}")
+            self.stage_timeouts[stage.strip()] = float(seconds)
+        # 单次请求超过LLM配置的timeout（而非运行或阶段的截止时间）时的重试次数
+        self.request_timeout_retries = int(os.getenv("REQUEST_TIMEOUT_RETRIES", 1))
+
+        # 输出长度：按预计输出设置max_tokens，输出被截断时自动续写
+        self.adaptive_max_tokens = _env_flag("ADAPTIVE_MAX_TOKENS")
+        self.output_headroom = float(os.getenv("OUTPUT_TOKEN_HEADROOM", 1.3))
+        self.min_output_tokens = int(os.getenv("MIN_OUTPUT_TOKENS", 256))
+        self.evaluation_output_tokens = int(os.getenv("EVALUATION_OUTPUT_TOKENS", 512))
+        self.max_continuations = int(os.getenv("MAX_CONTINUATIONS", 2))
+        self.continuation_context_chars = int(
+            os.getenv("CONTINUATION_CONTEXT_CHARS", 1500)
+        )
+        self.output_stats: Dict[str, int] = {
+            "sized_calls": 0,
+            "reserved_saved": 0,
+            "continuations": 0,
+            "truncated": 0,
+        }
+
+        # 模型级联：先用便宜的模型，评分持续不达标或停滞时升级
+        self.cascade = (
+            ModelCascade.from_config(("creator", "writer", "supervisor", "editor"))
+            if _env_flag("MODEL_CASCADE")
+            else None
+        )
+        self._speculative_tasks: List[asyncio.Task] = []
+
+        # 执行引擎：legacy为内置循环，graph按configs/workflow_graph.yaml的阶段图执行
+        self.workflow_engine = os.getenv("WORKFLOW_ENGINE", "legacy")
+        if self.workflow_engine not in ("legacy", "graph"):
+            raise ValueError(f"未知的工作流引擎: {self.workflow_engine}")
+        self.workflow_graph_config = os.getenv("WORKFLOW_GRAPH_CONFIG") or None
+
+        # 请求合并：同一进程中相同的进行中请求只发出一次上游调用
+        self.singleflight = (
+            shared_singleflight if _env_flag("REQUEST_COALESCING") else None
+        )
+        self.coalesce_stats: Dict[str, int] = {"coalesced": 0}
+
+        # 前缀稳定的prompt：故事设定和大纲在前，评审意见和草稿在后，便于服务端复用前缀缓存
+        self.prompt_builder = PromptBuilder()
+        self.prompt_cache_stats: Dict[str, int] = {
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+        }
+
+        # 故事圣经：人物、既定事实和章节摘要，章节prompt用它代替完整大纲和正文
+        self.use_story_bible = _env_flag("STORY_BIBLE")
+        self.story_bible_recent_chapters = int(
+            os.getenv("STORY_BIBLE_RECENT_CHAPTERS", 5)
+        )
+        self.story_bible_summary_chars = int(os.getenv("STORY_BIBLE_SUMMARY_CHARS", 200))
+        self.story_bible_window_chars = int(os.getenv("STORY_BIBLE_WINDOW_CHARS", 300))
+        self.story_bible: Optional[StoryBible] = None
+
+        # 复读检测：写作、编辑和大纲输出中的近似重复段落在流式输出时中止、事后删除
+        self.repetition_guard = _env_flag("REPETITION_GUARD")
+        self.repetition_similarity = float(os.getenv("REPETITION_SIMILARITY", 0.8))
+        self.repetition_max_ratio = float(os.getenv("REPETITION_MAX_RATIO", 0.3))
+        self.repetition_stats: Dict[str, int] = {
+            "chars": 0,
+            "repeated_chars": 0,
+            "trimmed_paragraphs": 0,
+            "aborted": 0,
+        }
+
+        # 设定一致性预检：评估前在本地检查人名、年龄、职业、季节和时代的明显冲突
+        self.fact_check = _env_flag("FACT_CHECK")
+        self.fact_index: Optional[FactIndex] = None
+        self.fact_stats: Dict[str, int] = {
+            "flagged": 0,
+            "targeted_fixes": 0,
+            "skipped_evaluations": 0,
+        }
+        self._waived_facts: set = set()
+
+        # 本地质量指标：评估前拦截过短、重复的草稿，并把指标作为评估的参考信息
+        self.use_quality_metrics = _env_flag("QUALITY_METRICS")
+        self.quality_min_chars = int(os.getenv("QUALITY_MIN_CHARS", 200))
+        self.quality_min_diversity = float(os.getenv("QUALITY_MIN_DIVERSITY", 0.25))
+        self.quality_metrics: Optional[QualityMetrics] = None
+        self.quality_stats: Dict[str, int] = {"measured": 0, "rejected": 0}
+
+        # 多候选生成：指定阶段并发生成N个候选，用本地信号排序（可选一次评审确认），只保留最优者
+        self.best_of_n = max(1, int(os.getenv("BEST_OF_N", 1)))
+        self.best_of_stages = {
+            stage.strip()
+            for stage in os.getenv("BEST_OF_STAGES", ",".join(BEST_OF_STAGES)).split(",")
+            if stage.strip()
+        }
+        unknown_stages = self.best_of_stages - set(BEST_OF_STAGES)
+        if unknown_stages:
+            raise ValueError(f"未知的多候选阶段: {', '.join(sorted(unknown_stages))}")
+        self.best_of_judge = _env_flag("BEST_OF_JUDGE")
+        self.best_of_judge_top = max(2, int(os.getenv("BEST_OF_JUDGE_TOP", 3)))
+        self.candidate_ranker: Optional[CandidateRanker] = None
+        self.best_of_stats: Dict[str, int] = {
+            "rounds": 0,
+            "candidates": 0,
+            "failed": 0,
+            "judged": 0,
+            "judge_overrides": 0,
+        }
+
+        # 事件总线：界面、指标和持久化等订阅方通过它接收运行进度，不阻塞创作流程
+        self.events = EventBus(int(os.getenv("EVENT_BUFFER_SIZE", 256)))
+
         # 创作过程数据
         self.original_outline: Optional[str] = None  # 原始故事大纲
-        self.current_draft: Optional[str] = None  # 当前草稿内容
+        self.draft: Optional[Draft] = None  # 当前草稿（章节块，各版本共享未改动的章节）
+        self._published_draft: Optional[Draft] = None  # 最近一次发布draft事件时的草稿
+        self.draft_version = 0  # 草稿版本号，随draft事件递增
+        self.last_evaluation: Optional[str] = None  # 最近一次评估意见
+        self.last_score: Optional[float] = None  # 最近一次评分
+        self.last_failing_sections: List[int] = []  # 最近一次评估指出的偏离章节
+        # 最近一次评估是否被本地预检拦截（拦截时为未通过的预检项），这类草稿交给写作者修改而不是重新创作
+        self.last_quality_rejection: Optional[List[str]] = None
+        self._best_draft: Optional[Draft] = None  # 评分最高的版本
+        self._accepted_chapters: Dict[int, str] = {}  # 章节流水线中已通过的章节
+        self.best_score: float = -1.0
+
+    @property
+    def current_draft(self) -> Optional[str]:
+        """当前草稿的文本"""
+        return self.draft.text if self.draft is not None else None
+
+    @current_draft.setter
+    def current_draft(self, text: Union[str, Draft, None]) -> None:
+        if isinstance(text, Draft) or text is None:
+            self.draft = text
+        else:
+            self.draft = Draft.from_text(text)
+        self._publish_draft()
+
+    def _publish_draft(self) -> None:
+        """
+        发布草稿增量（draft事件）
+
+        chapters是相对base版本的增量（见Draft.delta_from），base为None时是完整草稿。
+        没有订阅者时不发布，下一次发布完整草稿，订阅方中途丢了事件可以据版本号发现。
+        """
+        draft = self.draft
+        if draft is None or draft == self._published_draft:
+            return
+        if not self.events.has_subscribers:
+            self._published_draft = None
+            return
+        base = self._published_draft
+        self.draft_version += 1
+        self.events.publish(
+            "draft",
+            version=self.draft_version,
+            base=self.draft_version - 1 if base is not None else None,
+            chapters=draft.delta_from(base),
+            chars=len(draft),
+        )
+        self._published_draft = draft
+
+    @property
+    def best_draft(self) -> Optional[str]:
+        """评分最高的版本的文本"""
+        return self._best_draft.text if self._best_draft is not None else None
 
     def register_agent(self, name: str, agent: NovelAgent) -> None:
         """注册Agent"""
@@ -165,11 +476,9 @@ class WorkflowManager:
 4. 确保最终作品符合质量要求""",
         )
 
-    def _format_story_prompt(self, story_seed: Dict[str, Any]) -> str:
-        """格式化故事创作提示"""
-        return f"""让我们开始创作一个新故事:
-
-标题: {story_seed['title']}
+    def _format_story_setting(self, story_seed: Dict[str, Any]) -> str:
+        """格式化故事设定（标题、主题、场景和写作风格）"""
+        return f"""标题: {story_seed['title']}
 主题: {story_seed['theme']}
 
 场景设定:
@@ -180,7 +489,13 @@ class WorkflowManager:
 写作风格:
 - 基调: {story_seed['style_preferences']['tone']}
 - 节奏: {story_seed['style_preferences']['pacing']}
-- 叙事视角: {story_seed['style_preferences']['narrative']}
+- 叙事视角: {story_seed['style_preferences']['narrative']}"""
+
+    def _format_story_prompt(self, story_seed: Dict[str, Any]) -> str:
+        """格式化故事创作提示"""
+        return f"""让我们开始创作一个新故事:
+
+{self._format_story_setting(story_seed)}
 
 请按照以下流程进行创作:
 1. 创意生成者(creator)提出故事大纲
@@ -221,22 +536,1033 @@ class WorkflowManager:
         self.logger.info(f"[PROMPT]\n{prompt}")
         self.logger.info(f"[RESULT]\n{result}\n{'='*50}\n")
 
-    async def evaluate_content(
-        self, outline: Optional[str], content: Optional[str]
-    ) -> Tuple[float, str]:
-        """评估内容质量"""
-        if not outline or not content:
-            return 0.0, "内容或大纲为空，无法评估"
+    async def _call_agent(
+        self,
+        agent_type: str,
+        prompt: str,
+        log: bool = True,
+        expected_tokens: Optional[int] = None,
+        llm_overrides: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        调用指定Agent执行任务，输出因长度限制被截断时自动续写
+
+        Args:
+            agent_type: Agent类型
+            prompt: 完整prompt
+            log: 是否记录prompt和结果
+            expected_tokens: 预计的输出token数，开启自适应输出长度时据此设置max_tokens
+            llm_overrides: 覆盖到本次调用LLM配置上的参数（如多候选生成的seed）
+        """
+        self._check_budget()
+        self._check_deadline()
+        llm_config = self._budget_llm_override(agent_type)
+        if llm_config is None:
+            llm_config = self._cascade_llm_override(agent_type)
+        if self.adaptive_max_tokens and expected_tokens is not None:
+            llm_config = self._sized_llm_config(agent_type, llm_config, expected_tokens)
+        if llm_overrides:
+            llm_config = {**(llm_config or self._agent_llm_config(agent_type)), **llm_overrides}
+
+        async def execute(call_prompt: str) -> Dict[str, Any]:
+            # 单次请求超时可以重试；运行或阶段超过截止时间则直接抛出
+            retries = 0
+            while True:
+                try:
+                    return await self._execute_agent(
+                        agent_type, call_prompt, llm_config, log
+                    )
+                except RequestTimeout as e:
+                    retries += 1
+                    if retries > self.request_timeout_retries:
+                        raise
+                    self.logger.warning(f"{e}，第{retries}次重试")
+                    self.events.publish(
+                        "retry", agent=agent_type, endpoint=None, error=str(e)
+                    )
+
+        result = await execute(prompt)
+        continuations = 0
+        while result.get("finish_reason") == "length" and result.get("content"):
+            if continuations >= self.max_continuations:
+                self.output_stats["truncated"] += 1
+                self.logger.warning(f"{agent_type}输出续写{continuations}次后仍被截断")
+                break
+            continuations += 1
+            self.output_stats["continuations"] += 1
+            self.logger.info(f"{agent_type}输出因长度限制被截断，第{continuations}次续写")
+            follow = await execute(self._continuation_prompt(prompt, result["content"]))
+            result = _stitch_results(result, follow)
+        if (
+            self.repetition_guard
+            and agent_type in REPETITION_TRIMMED_AGENTS
+            and result.get("finish_reason") != "repetition"
+            and result.get("content")
+        ):
+            result = self._trim_repetition(agent_type, result)
+        return result
+
+    async def _generate_best(
+        self,
+        stage: str,
+        agent_type: str,
+        prompt: str,
+        expected_tokens: Optional[int] = None,
+        outline: Optional[str] = None,
+        sectioned: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        为指定阶段并发生成多个候选，只返回最优者；未对该阶段启用时等同于单次调用
+
+        Args:
+            stage: 阶段名（outline/draft）
+            agent_type: 生成候选的Agent
+            prompt: 完整prompt
+            expected_tokens: 预计的输出token数
+            outline: 评审确认时参照的大纲
+            sectioned: 是否要求候选按章节划分
+        """
+        if (
+            self.best_of_n <= 1
+            or stage not in self.best_of_stages
+            or self.candidate_ranker is None
+        ):
+            return await self._call_agent(agent_type, prompt, expected_tokens=expected_tokens)
+
+        # 各候选使用不同的seed，既得到不同的采样结果，也避免被合并成同一请求
+        outcomes = await asyncio.gather(
+            *(
+                self._call_agent(
+                    agent_type,
+                    prompt,
+                    log=False,
+                    expected_tokens=expected_tokens,
+                    llm_overrides={"seed": sample},
+                )
+                for sample in range(self.best_of_n)
+            ),
+            return_exceptions=True,
+        )
+        results = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        self.best_of_stats["rounds"] += 1
+        self.best_of_stats["candidates"] += len(results)
+        self.best_of_stats["failed"] += len(errors)
+        if not results:
+            raise errors[0]
+        for error in errors:
+            self.logger.warning(f"{stage}候选生成失败：{error}")
+
+        ranked = self.candidate_ranker.rank(results, sectioned=sectioned)
+        if not ranked:
+            return results[0]
+        winner = ranked[0]
+        if self.best_of_judge and len(ranked) > 1:
+            winner = await self._judge_candidates(
+                stage, ranked[: self.best_of_judge_top], outline
+            )
+        self.logger.info(
+            f"{stage}阶段{len(results)}个候选，选中第{winner['index'] + 1}个"
+            f"（本地得分{winner['score']}）"
+        )
+        self.events.publish(
+            "best_of",
+            stage=stage,
+            candidates=len(results),
+            winner=winner["index"],
+            scores=[candidate["score"] for candidate in ranked],
+        )
+        self.log_prompt(agent_type, prompt, winner["content"])
+        return winner["result"]
+
+    async def _judge_candidates(
+        self, stage: str, candidates: List[Candidate], outline: Optional[str]
+    ) -> Candidate:
+        """由审核者在本地排名靠前的候选中选出最优者，无法解析时保留本地排名第一的候选"""
+        self.best_of_stats["judged"] += 1
+        labels = "大纲" if stage == "outline" else "正文"
+        prompt = self.prompt_builder.build(
+            f"""以下是同一任务的{len(candidates)}个候选{labels}，请比较它们的质量，选出最好的一个。
 
-        supervisor = self.agents["supervisor"]
-        evaluation_prompt = f"""
-请对照故事大纲评估内容的质量，给出0-100的评分和具体的修改建议。
+请按以下格式返回：
+最佳候选：[序号]
+理由：[简要说明]""",
+            [
+                (f"候选{number}", candidate["content"])
+                for number, candidate in enumerate(candidates, 1)
+            ],
+            outline=outline,
+        )
+        response = await self._call_agent(
+            "supervisor", prompt, log=False, expected_tokens=self.evaluation_output_tokens
+        )
+        choice = CandidateRanker.parse_choice(response.get("content", ""), len(candidates))
+        if choice is None:
+            self.logger.warning("无法解析评审选出的候选，使用本地排名第一的候选")
+            return candidates[0]
+        if choice:
+            self.best_of_stats["judge_overrides"] += 1
+        return candidates[choice]
+
+    def _repetition_detector(self) -> RepetitionDetector:
+        return RepetitionDetector(
+            threshold=self.repetition_similarity, max_ratio=self.repetition_max_ratio
+        )
 
-原始大纲：
-{outline}
+    def _record_repetition(self, detector: RepetitionDetector) -> None:
+        self.repetition_stats["chars"] += detector.chars
+        self.repetition_stats["repeated_chars"] += detector.repeated_chars
+
+    def _trim_repetition(self, agent_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """删除输出中的近似重复段落"""
+        detector = self._repetition_detector()
+        content, removed = detector.trim(result["content"])
+        self._record_repetition(detector)
+        if not removed:
+            return result
+        self.repetition_stats["trimmed_paragraphs"] += removed
+        self.logger.warning(f"{agent_type}输出中有{removed}个重复段落，已删除")
+        self.events.publish("repetition", agent=agent_type, trimmed=removed)
+        return {**result, "content": content}
+
+    def get_repetition_metrics(self) -> Dict[str, Any]:
+        """获取复读检测的统计和重复字数占比"""
+        stats: Dict[str, Any] = dict(self.repetition_stats)
+        stats["repetition_ratio"] = (
+            stats["repeated_chars"] / stats["chars"] if stats["chars"] else 0.0
+        )
+        return stats
+
+    def _sized_llm_config(
+        self,
+        agent_type: str,
+        llm_config: Optional[Dict[str, Any]],
+        expected_tokens: int,
+    ) -> Optional[Dict[str, Any]]:
+        """按预计输出长度设置max_tokens，不超过配置的上限（超出部分由续写补齐）"""
+        base = llm_config or self._agent_llm_config(agent_type)
+        size = max(
+            self.min_output_tokens, math.ceil(expected_tokens * self.output_headroom)
+        )
+        cap = base.get("max_tokens")
+        if cap:
+            size = min(size, int(cap))
+            if size == int(cap):
+                return llm_config
+            self.output_stats["reserved_saved"] += int(cap) - size
+        self.output_stats["sized_calls"] += 1
+        return {**base, "max_tokens": size}
+
+    def _continuation_prompt(self, prompt: str, content: str) -> str:
+        """续写prompt：原prompt在前以复用前缀缓存，只附上已输出内容的末尾部分"""
+        tail = content[-self.continuation_context_chars :]
+        return "\n\n".join(
+            [
+                prompt,
+                f"已输出内容（末尾部分）：\n{tail}",
+                "上次输出因长度限制被截断。请紧接已输出内容的最后一个字继续输出，"
+                "不要重复已输出的内容，也不要添加任何说明。",
+            ]
+        )
 
-当前内容：
-{content}
+    async def _execute_agent(
+        self,
+        agent_type: str,
+        prompt: str,
+        llm_config: Optional[Dict[str, Any]],
+        log: bool,
+    ) -> Dict[str, Any]:
+        """执行一次Agent调用，统计预算用量并记录prompt"""
+        self._check_budget()
+        self._check_deadline()
+        context: Dict[str, Any] = {"prompt": prompt}
+        if llm_config is not None:
+            context["llm_config"] = llm_config
+
+        # 单次请求的截止时间：LLM配置的timeout，且不晚于运行和阶段的截止时间
+        request_timeout = (llm_config or self._agent_llm_config(agent_type)).get("timeout")
+        request_timeout = float(request_timeout) if request_timeout else None
+        outer_remaining = self._deadline_remaining()
+        request_deadline = Deadline(request_timeout, parent=current_deadline())
+        # 请求自身的timeout先于外层截止时间到期时，超时只影响本次请求，可以重试
+        own_timeout = request_timeout is not None and (
+            outer_remaining is None or request_timeout < outer_remaining
+        )
+
+        # 只有存在订阅者或需要复读检测时才让Agent回报流式片段
+        on_token = None
+        if self.events.has_subscribers:
+
+            def on_token(chunk: str) -> None:
+                self.events.publish("token", agent=agent_type, text=chunk)
+
+            def on_retry(endpoint: str, error: str) -> None:
+                self.events.publish(
+                    "retry", agent=agent_type, endpoint=endpoint, error=error
+                )
+
+            context["on_retry"] = on_retry
+
+        # 复读检测：流式输出陷入复读时取消调用，保留此前不重复的内容
+        # （Agent以流式请求LLM时on_token逐段回报，取消调用会断开HTTP流；不回报片段的输出只在返回后删除重复段落）
+        guard = None
+        call: Optional[asyncio.Future] = None
+        if self.repetition_guard and agent_type in REPETITION_GUARDED_AGENTS:
+            guard = self._repetition_detector()
+            publish = on_token
+
+            def on_token(chunk: str) -> None:
+                if publish is not None:
+                    publish(chunk)
+                if guard.feed(chunk) and call is not None and not call.done():
+                    call.cancel()
+
+        self.events.publish("stage_start", agent=agent_type)
+
+        # 激活请求的截止时间，Agent内部的HTTP请求据此限制超时；超时时取消进行中的调用
+        deadline_token = request_deadline.activate()
+        try:
+            effective_config = llm_config or self._agent_llm_config(agent_type)
+            leader = True
+            if self.singleflight is None or not coalescable(effective_config):
+                if on_token is not None:
+                    context["on_token"] = on_token
+                execution = self.agents[agent_type].execute(context)
+            else:
+                agent = self.agents[agent_type]
+                leader = False
+
+                def upstream(emit: Callable[[str], None]) -> Awaitable[Dict[str, Any]]:
+                    nonlocal leader
+                    leader = True
+                    return agent.execute({**context, "on_token": emit})
+
+                # 合并的调用各自检测复读：取消的是本调用的等待，所有调用者都取消后上游请求才被取消
+                execution = self._coalesced_execution(
+                    request_key(agent_type, prompt, effective_config), upstream, on_token
+                )
+            if guard is not None:
+                call = asyncio.ensure_future(execution)
+            try:
+                result = await run_with_timeout(
+                    call or execution,
+                    request_deadline.timeout(),
+                    f"{agent_type}调用",
+                )
+            except asyncio.CancelledError:
+                if guard is None or not guard.degenerate:
+                    raise
+                result = {
+                    "content": guard.streamed_text(),
+                    "finish_reason": "repetition",
+                }
+                self.repetition_stats["aborted"] += 1
+                self._record_repetition(guard)
+                self.logger.warning(
+                    f"{agent_type}输出陷入复读（重复占比{guard.ratio:.0%}），已提前中止"
+                )
+                self.events.publish("repetition", agent=agent_type, aborted=True)
+        except DeadlineExceeded as e:
+            if call is not None:
+                call.cancel()
+            self.logger.warning(str(e))
+            self.events.publish("stage_end", agent=agent_type, chars=0, error=str(e))
+            if own_timeout:
+                raise RequestTimeout(
+                    f"{agent_type}请求超时（{request_timeout:.1f}秒）"
+                ) from e
+            raise
+        finally:
+            Deadline.restore(deadline_token)
+        if not leader:
+            self.coalesce_stats["coalesced"] += 1
+            self.logger.debug(f"{agent_type}请求已合并到进行中的相同请求")
+            self.events.publish("cache_hit", source="coalescing", agent=agent_type)
+
+        # 合并的调用没有产生上游用量，只由发出请求的工作流计费
+        if leader:
+            self._record_usage(agent_type, prompt, result, llm_config)
+        if log:
+            self.log_prompt(agent_type, prompt, result.get("content", ""))
+        self.events.publish(
+            "stage_end", agent=agent_type, chars=len(result.get("content") or "")
+        )
+        return result
+
+    async def _coalesced_execution(
+        self,
+        key: str,
+        upstream: Callable[[Callable[[str], None]], Awaitable[Dict[str, Any]]],
+        on_token: Optional[Callable[[str], None]],
+    ) -> Dict[str, Any]:
+        """通过请求合并执行，返回结果的副本（共享结果不能被调用方修改）"""
+        shared, _ = await self.singleflight.do(key, upstream, on_token)
+        return dict(shared)
+
+    def _agent_llm_config(self, agent_type: str) -> Dict[str, Any]:
+        """获取并缓存Agent的LLM配置，未配置的Agent返回空字典"""
+        if agent_type not in self._agent_llm_configs:
+            try:
+                config = LLMFactory.get_agent_config(agent_type)["llm_config"]
+            except ValueError:
+                config = {}
+            self._agent_llm_configs[agent_type] = dict(config)
+        return self._agent_llm_configs[agent_type]
+
+    def _estimate_tokens(self, agent_type: str, text: Optional[str]) -> int:
+        """用Agent所用模型的估算器估算文本的token数"""
+        model = self._agent_llm_config(agent_type).get("model")
+        return LLMFactory.get_token_estimator(model).estimate(text)
+
+    def _record_usage(
+        self,
+        agent_type: str,
+        prompt: str,
+        result: Dict[str, Any],
+        llm_config: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        将一次调用的用量计入预算
+
+        Agent未返回usage时用本地估算器估算；返回了usage时记录为估算器的校准样本。
+        """
+        usage = result.get("usage") or {}
+        model = (llm_config or self._agent_llm_config(agent_type)).get("model")
+        estimator = LLMFactory.get_token_estimator(model)
+        content = result.get("content")
+        if "prompt_tokens" in usage:
+            prompt_tokens = usage["prompt_tokens"]
+            estimator.observe(prompt, prompt_tokens)
+        else:
+            prompt_tokens = estimator.estimate(prompt)
+        if "completion_tokens" in usage:
+            completion_tokens = usage["completion_tokens"]
+            estimator.observe(content, completion_tokens)
+        else:
+            completion_tokens = estimator.estimate(content)
+        cached_tokens = cached_prompt_tokens(usage)
+        if cached_tokens is not None:
+            self.prompt_cache_stats["prompt_tokens"] += prompt_tokens
+            self.prompt_cache_stats["cached_tokens"] += cached_tokens
+            if cached_tokens:
+                self.events.publish(
+                    "cache_hit",
+                    source="prompt_prefix",
+                    agent=agent_type,
+                    tokens=cached_tokens,
+                )
+        pricing = LLMFactory.get_model_pricing(model) if model else {}
+        self.budget.record(agent_type, prompt_tokens, completion_tokens, pricing)
+
+    def _check_budget(self) -> None:
+        """预算耗尽（或finalize策略下超过软上限）时中止后续调用
+
+        finalize策略有意在软上限处结束：进行中的并发调用仍会继续计费，
+        提前收尾才能保证整体用量不超过硬上限。
+        """
+        if not self.budget.limited:
+            return
+        status = self.budget.status()
+        if status == "exhausted" or (
+            status == "soft" and self.budget_policy == "finalize"
+        ):
+            raise BudgetExhausted(
+                f"预算已用{self.budget.fraction_used():.0%}，停止继续调用"
+            )
+
+    @staticmethod
+    def _deadline_remaining() -> Optional[float]:
+        """当前截止时间的剩余秒数，不限制时返回None"""
+        deadline = current_deadline()
+        return deadline.remaining() if deadline is not None else None
+
+    async def _run_stage(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """
+        在阶段超时（STAGE_TIMEOUTS）和当前截止时间内执行一个阶段
+
+        阶段内的请求继承阶段的截止时间，超时时取消进行中的调用并抛出DeadlineExceeded。
+        """
+        timeout = self.stage_timeouts.get(stage)
+        if timeout is None:
+            return await awaitable
+        deadline = Deadline(timeout, parent=current_deadline())
+        token = deadline.activate()
+        try:
+            return await run_with_timeout(awaitable, deadline.timeout(), f"阶段 '{stage}'")
+        finally:
+            Deadline.restore(token)
+
+    def _check_deadline(self) -> None:
+        """当前截止时间已过时中止后续调用"""
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded("运行已超过截止时间，停止继续调用")
+
+    def _budget_soft(self, policy: str) -> bool:
+        """判断是否需要执行指定的软上限策略"""
+        return (
+            self.budget.limited
+            and self.budget_policy == policy
+            and self.budget.status() == "soft"
+        )
+
+    def _budget_llm_override(self, agent_type: str) -> Optional[Dict[str, Any]]:
+        """downgrade策略下超过软上限时，改用配置的降级模型"""
+        if not self._budget_soft("downgrade"):
+            return None
+        llm_config = self._agent_llm_config(agent_type)
+        fallback = llm_config.get("fallback_model")
+        if not fallback:
+            return None
+        self.logger.info(f"预算紧张，{agent_type}降级使用模型 {fallback}")
+        return {**llm_config, "model": fallback}
+
+    def _cascade_llm_override(self, agent_type: str) -> Optional[Dict[str, Any]]:
+        """模型级联开启时，使用角色当前档位的模型"""
+        if self.cascade is None:
+            return None
+        model = self.cascade.model_for(agent_type)
+        if model is None:
+            return None
+        return {**self._agent_llm_config(agent_type), "model": model}
+
+    def _track_best_draft(self, score: float) -> None:
+        """记录评分最高的版本，预算耗尽时作为最终稿"""
+        self.events.publish("score", score=score, revision=self.revision_count)
+        self.last_score = score
+        if self.current_draft and score > self.best_score:
+            self.best_score = score
+            self._best_draft = self.draft
+
+    def _accept_chapter(self, index: int, text: str) -> None:
+        """
+        记录章节流水线中已通过的章节
+
+        当前草稿随之更新为已通过章节按顺序拼接的结果，
+        运行因预算或截止时间中断时，已通过的章节不会丢失。
+        """
+        self._accepted_chapters[index] = text
+        self.current_draft = join_sections(
+            [self._accepted_chapters[i] for i in sorted(self._accepted_chapters)]
+        )
+
+    def _finalize_best_draft(self, reason: str) -> Dict[str, Any]:
+        """以目前评分最高的版本（没有则用当前版本）结束工作流"""
+        final_draft = self.best_draft or self.current_draft
+        self.logger.info(f"{reason}，以当前最佳版本作为最终稿")
+        if self._accepted_chapters:
+            self.logger.info(
+                f"章节流水线已通过{len(self._accepted_chapters)}章："
+                f"{', '.join(str(i + 1) for i in sorted(self._accepted_chapters))}"
+            )
+        self.context["final_draft"] = final_draft
+        if isinstance(final_draft, str) and final_draft.strip():
+            self._save_draft(final_draft)
+        else:
+            self.logger.error("最终稿为空，无法保存")
+        return self.context
+
+    def _build_editor_prompt(self, draft: Optional[str]) -> str:
+        """构建编辑润色的prompt"""
+        return self.prompt_builder.build(
+            """请对待润色内容进行详细的错别字检查和文字润色。
+
+审查要点：
+1. 检查所有可能的错别字
+2. 检查病句和不通顺的表达
+3. 检查标点符号使用是否规范
+4. 保持作者的写作风格，仅修正错误
+5. 改进不通顺的表达，但保持原意
+
+请返回修改后的内容，并列出所有发现的问题。""",
+            [("待润色内容", self._windowed_content(draft))],
+        )
+
+    def _build_revision_prompt(self, evaluation: str, draft: Optional[str]) -> str:
+        """构建写作者根据评审意见修改的prompt"""
+        return self.prompt_builder.build(
+            """请根据评审意见对当前版本进行全面改进。
+
+要求：
+1. 确保严格遵循原始大纲设定
+2. 认真分析评审意见指出的问题
+3. 保留原文的优点，重点改进不足之处
+4. 确保故事情节的连贯性和完整性
+5. 提升文字表达的质量""",
+            *self._windowed_blocks(
+                self.original_outline, draft, "当前内容", [("评审意见", evaluation)]
+            ),
+        )
+
+    def _proofread_draft(self) -> bool:
+        """
+        在LLM编辑之前对当前草稿做本地校对
+
+        Returns:
+            bool: 校对后文本是否已没有需要LLM处理的问题
+        """
+        if self.proofreader is None or not self.current_draft:
+            return False
+        result = self.proofreader.proofread(self.current_draft)
+        self.current_draft = result["text"]
+        self.proofread_stats["fixed"] += result["fixed"]
+        if result["fixed"] or result["unresolved"]:
+            self.logger.info(
+                f"本地校对：修正{result['fixed']}处，待编辑处理{result['unresolved']}处"
+            )
+        return result["unresolved"] == 0
+
+    def _editing_prompt(self, draft: Optional[str]) -> str:
+        """获取本轮编辑使用的prompt（融合模式下同时要求自评）"""
+        if not self.fused_editing:
+            return self._build_editor_prompt(draft)
+        return self.prompt_builder.build(
+            f"""请对待润色内容进行错别字检查和文字润色，并对照故事大纲给出自我评估。
+
+要求：
+1. 修正错别字、病句和不规范的标点，保持作者的写作风格和原意
+2. 先输出润色后的完整正文
+3. 正文之后单独一行输出“{FUSED_ASSESSMENT_MARKER}”，再按以下格式给出评估：
+分数：[评分]（0-100，0分表示完全偏离大纲）
+建议：[具体修改建议]""",
+            *self._windowed_blocks(self.original_outline, draft, "待润色内容"),
+        )
+
+    def _parse_fused_result(
+        self, content: str
+    ) -> Tuple[str, Optional[Tuple[float, str]]]:
+        """
+        拆分融合模式的编辑结果
+
+        Returns:
+            Tuple: 润色后的正文，以及(自评分数, 自评意见)；缺少自评时为None
+        """
+        if FUSED_ASSESSMENT_MARKER not in content:
+            return content.strip(), None
+        text, assessment = content.rsplit(FUSED_ASSESSMENT_MARKER, 1)
+        assessment = assessment.strip()
+        if "分数：" not in assessment:
+            return text.strip(), None
+        return text.strip(), (self._parse_score(assessment), assessment)
+
+    def _needs_supervisor_check(
+        self, self_assessment: Optional[Tuple[float, str]]
+    ) -> bool:
+        """判断融合模式下是否需要审核者单独评分"""
+        if self_assessment is None:
+            return True
+        self_score = self_assessment[0]
+        if self_score == 0:
+            return True
+        if abs(self_score - self.revision_threshold) <= self.fused_verify_margin:
+            return True
+        return (self.editing_count + 1) % self.fused_verify_interval == 0
+
+    async def _edit_draft(
+        self, editor_result: Optional[Dict[str, Any]] = None
+    ) -> Optional[Tuple[float, str]]:
+        """
+        执行一轮编辑：先本地校对，文本已干净或预算紧张时跳过LLM编辑
+
+        Args:
+            editor_result: 已完成的编辑结果（推测执行命中时传入）
+
+        Returns:
+            Optional[Tuple[float, str]]: 融合模式下编辑给出的自评
+        """
+        if editor_result is not None:
+            pass
+        elif self._proofread_draft() and self.skip_editor_when_clean:
+            self.logger.info("本地校对未发现问题，跳过LLM编辑")
+            self.proofread_stats["skipped_editor"] += 1
+            editor_result = {"content": self.current_draft}
+        elif self._budget_soft("skip_optional"):
+            self.logger.info("预算紧张，跳过LLM编辑")
+            editor_result = {"content": self.current_draft}
+        else:
+            editor_result = await self._call_agent(
+                "editor",
+                self._editing_prompt(self.current_draft),
+                expected_tokens=self._estimate_tokens("editor", self.current_draft),
+            )
+
+        self_assessment = None
+        content = editor_result.get("content", "")
+        if self.fused_editing:
+            content, self_assessment = self._parse_fused_result(content)
+        merged = self._merge_window(content)
+        if merged is None:
+            self.logger.error("编辑结果无法对应到待处理章节，保持使用当前版本")
+        else:
+            self.current_draft = merged
+        return self_assessment
+
+    async def _assess_draft(
+        self, self_assessment: Optional[Tuple[float, str]] = None
+    ) -> Tuple[float, str]:
+        """评估当前草稿（融合模式下自评可信时直接采用），并记录最佳版本"""
+        if await self._fix_fact_violations():
+            # 自评针对的是修正前的版本
+            self_assessment = None
+        if self._needs_supervisor_check(self_assessment):
+            score, evaluation = await self.evaluate_content(
+                self.original_outline, self.current_draft
+            )
+        else:
+            score, evaluation = self_assessment
+            self.last_failing_sections = []
+            self.last_quality_rejection = None
+            self.fused_stats["self_assessed"] += 1
+        self.last_evaluation = evaluation
+        self._track_best_draft(score)
+        self.logger.info(f"\n当前评分：{score}\n评估意见：\n{evaluation}")
+        return score, evaluation
+
+    def _check_facts(self, text: Optional[str]) -> List[FactViolation]:
+        """本地检查与设定明显冲突之处，已尝试修正过的冲突不再报告"""
+        if self.fact_index is None or not text:
+            return []
+        return [
+            violation
+            for violation in self.fact_index.check(text)
+            if (violation["type"], violation["text"]) not in self._waived_facts
+        ]
+
+    async def _fix_fact_violations(self) -> bool:
+        """
+        评估前修正当前草稿中与设定冲突之处
+
+        只把有冲突的章节交给编辑定向修正，不必等一轮完整评分指出问题；
+        疑似错写的人名也由编辑判断，不在本地全文替换。
+        修正后仍然存在的冲突可能是有意为之（如回忆），之后不再处理。
+
+        Returns:
+            bool: 草稿是否被修改
+        """
+        draft = self.draft
+        violations = self._check_facts(draft.text if draft is not None else None)
+        if not violations:
+            return False
+        self.fact_stats["flagged"] += len(violations)
+        self.events.publish("fact_check", violations=len(violations))
+        self.logger.info(f"设定一致性预检发现冲突：\n{FactIndex.report(violations)}")
+
+        sections = draft.sections()
+        by_section: Dict[int, List[FactViolation]] = {}
+        for violation in violations:
+            if violation["section"] < len(sections):
+                by_section.setdefault(violation["section"], []).append(violation)
+
+        async def fix(index: int) -> None:
+            prompt = self.prompt_builder.build(
+                """以下内容与故事设定存在明显冲突，请只修正列出的问题，其余内容保持不变。
+疑似错写的人名请结合上下文判断，确属错写才改为设定中的写法。
+只输出修正后的正文，保留章节标题。""",
+                [
+                    ("设定冲突", FactIndex.report(by_section[index])),
+                    ("待修正内容", sections[index]),
+                ],
+            )
+            result = await self._call_agent(
+                "editor",
+                prompt,
+                expected_tokens=self._estimate_tokens("editor", sections[index]),
+            )
+            if result.get("content"):
+                corrected[index] = result["content"]
+
+        corrected: Dict[int, str] = {}
+        await asyncio.gather(*(fix(index) for index in by_section))
+        self.fact_stats["targeted_fixes"] += len(by_section)
+        self._waived_facts.update(
+            (violation["type"], violation["text"]) for violation in violations
+        )
+        if not corrected:
+            return False
+        if len(sections) > 1:
+            self.current_draft = draft.replace_sections(corrected)
+        else:
+            self.current_draft = corrected[0]
+        return True
+
+    def _speculate(
+        self,
+        agent_type: str,
+        prompt: str,
+        basis: Optional[Tuple[Optional[float], Tuple[int, ...]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        在评分期间提前启动一次Agent调用
+
+        Args:
+            agent_type: Agent类型
+            prompt: 完整prompt
+            basis: prompt所依据的评审结论（写作者修改时）：评分和偏离章节，
+                评分后的结论与之明显不同则作废
+        """
+        self.speculation_stats["launched"] += 1
+        self._speculative_tasks = [t for t in self._speculative_tasks if not t.done()]
+        self.logger.info(f"推测执行：提前启动{agent_type}")
+        task = asyncio.create_task(
+            self._call_agent(
+                agent_type,
+                prompt,
+                expected_tokens=self._estimate_tokens(agent_type, self.current_draft),
+            )
+        )
+        self._speculative_tasks.append(task)
+        return {
+            "agent_type": agent_type,
+            "prompt": prompt,
+            "task": task,
+            "draft": self.current_draft,
+            "basis": basis,
+        }
+
+    def _speculative_editing_prompt(self, draft: Optional[str]) -> Optional[str]:
+        """
+        推测编辑使用的prompt：本地校对只作用于副本，评分期间不修改当前草稿
+
+        Returns:
+            Optional[str]: 校对后已无需LLM编辑时返回None
+        """
+        if self.proofreader is not None and draft:
+            proofread = self.proofreader.proofread(draft)
+            if proofread["unresolved"] == 0 and self.skip_editor_when_clean:
+                return None
+            draft = proofread["text"]
+        return self._editing_prompt(draft)
+
+    def _speculation_stale(self, speculation: Dict[str, Any], score: float) -> bool:
+        """
+        推测调用的依据是否已失效
+
+        评分期间草稿被修改（如设定冲突修正）时一律作废；写作者修改还要求评审结论没有实质变化：
+        评分相差不超过容差且偏离章节相同（意见的措辞不同不影响）。
+        """
+        if self.current_draft != speculation["draft"]:
+            return True
+        if speculation["agent_type"] != "writer":
+            return False
+        basis_score, basis_failing = speculation["basis"]
+        if basis_score is None or tuple(self.last_failing_sections) != basis_failing:
+            return True
+        return abs(score - basis_score) > self.speculation_score_tolerance
+
+    async def _cancel_speculations(self) -> None:
+        """取消所有仍在进行的推测调用（工作流结束或异常中止时）"""
+        tasks, self._speculative_tasks = self._speculative_tasks, []
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _discard_speculation(self, speculation: Optional[Dict[str, Any]]) -> None:
+        """取消未被采用的推测调用并统计浪费的token"""
+        if speculation is None:
+            return
+        task = speculation["task"]
+        self.speculation_stats["misses"] += 1
+        agent_type = speculation["agent_type"]
+        wasted = self._estimate_tokens(agent_type, speculation["prompt"])
+        if task.done() and not task.cancelled() and task.exception() is None:
+            result = task.result()
+            usage = result.get("usage") or {}
+            wasted = usage.get("total_tokens") or wasted + self._estimate_tokens(
+                agent_type, result.get("content")
+            )
+        else:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                self.logger.debug(f"推测调用异常: {str(e)}")
+        self.speculation_stats["wasted_tokens"] += wasted
+        self.logger.info(f"推测执行未命中，取消{speculation['agent_type']}调用")
+
+    def get_speculation_metrics(self) -> Dict[str, Any]:
+        """获取推测执行的命中率和浪费token统计"""
+        stats = dict(self.speculation_stats)
+        resolved = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / resolved if resolved else 0.0
+        return stats
+
+    def get_prompt_cache_metrics(self) -> Dict[str, Any]:
+        """获取服务端前缀缓存命中的输入token占比（只统计返回了缓存信息的调用）"""
+        stats: Dict[str, Any] = dict(self.prompt_cache_stats)
+        prompt_tokens = stats["prompt_tokens"]
+        stats["cached_ratio"] = (
+            stats["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0
+        )
+        return stats
+
+    def get_coalescing_metrics(self) -> Dict[str, Any]:
+        """获取本工作流被合并的调用数，以及进程内请求合并的整体统计"""
+        stats: Dict[str, Any] = dict(self.coalesce_stats)
+        if self.singleflight is not None:
+            stats["process"] = self.singleflight.stats()
+        return stats
+
+    def _story_bible_blocks(
+        self, index: Optional[int] = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        故事圣经的prompt内容块
+
+        Args:
+            index: 当前章节下标，给出时只包含之前的章节并附上前一章结尾；
+                None表示包含全部已记录章节
+
+        Returns:
+            List[Tuple[str, Optional[str]]]: 未启用故事圣经时为空
+        """
+        if self.story_bible is None:
+            return []
+        blocks = [("故事圣经", self.story_bible.render(before=index) or None)]
+        if index is not None:
+            blocks.append(("前文结尾", self.story_bible.window(index)))
+        return blocks
+
+    def _bible_window(self, text: Optional[str]) -> Optional[Tuple[List[str], List[int]]]:
+        """
+        完整草稿的内容窗口：已记入故事圣经且未改动的章节只用摘要代替
+
+        Returns:
+            Optional[Tuple]: 草稿的章节和需要处理的章节下标；
+                未启用故事圣经、不足两章、没有可代替或没有需要处理的章节时为None
+        """
+        if self.story_bible is None or not text:
+            return None
+        sections = split_sections(text)
+        if len(sections) < 2:
+            return None
+        pending = [
+            i for i, section in enumerate(sections)
+            if not self.story_bible.unchanged(i, section)
+        ]
+        if not pending or len(pending) == len(sections):
+            return None
+        return sections, pending
+
+    def _windowed_content(self, text: Optional[str]) -> Optional[str]:
+        """草稿在内容窗口下的文本：已通过的章节只保留标题和说明，章节序号不变"""
+        window = self._bible_window(text)
+        if window is None:
+            return text
+        sections, pending = window
+        parts = []
+        for index, section in enumerate(sections):
+            if index in pending:
+                parts.append(section)
+                continue
+            heading = CHAPTER_HEADING.search(section)
+            title = heading.group(0).strip() if heading else f"第{index + 1}章"
+            parts.append(f"{title}\n（本章已通过，内容见故事圣经，请原样保留本段）")
+        return join_sections(parts)
+
+    def _windowed_blocks(
+        self,
+        outline: Optional[str],
+        text: Optional[str],
+        label: str,
+        extra: Sequence[Tuple[str, Optional[str]]] = (),
+    ) -> Tuple[List[Tuple[str, Optional[str]]], Optional[str]]:
+        """
+        处理完整草稿的prompt内容块和前缀大纲
+
+        有已通过的章节时，用故事圣经、待处理章节的大纲和内容窗口代替完整的大纲和正文
+        （大纲与正文章节数不一致时仍在前缀中使用完整大纲）；否则与不启用故事圣经时相同。
+
+        Args:
+            outline: 完整大纲
+            text: 完整草稿
+            label: 草稿内容块的标题
+            extra: 放在草稿之前的其他内容块
+
+        Returns:
+            Tuple: (内容块, 前缀中的大纲)
+        """
+        window = self._bible_window(text)
+        if window is None:
+            return list(extra) + [(label, text)], outline
+        sections, pending = window
+        blocks: List[Tuple[str, Optional[str]]] = [
+            ("故事圣经", self.story_bible.render() or None)
+        ]
+        outline_sections = split_sections(outline or "")
+        if len(outline_sections) == len(sections):
+            blocks.append(
+                ("待处理章节的大纲", join_sections([outline_sections[i] for i in pending]))
+            )
+            outline = None
+        return blocks + list(extra) + [(label, self._windowed_content(text))], outline
+
+    def _merge_window(self, content: Optional[str]) -> Union[str, Draft, None]:
+        """
+        把按内容窗口处理的Agent输出合并回当前草稿，已通过的章节保持不变
+
+        Returns:
+            合并后的草稿；未使用内容窗口时原样返回content，无法对应到待处理章节时返回None
+        """
+        window = self._bible_window(self.current_draft)
+        if window is None or not content:
+            return content
+        sections, pending = window
+        returned = split_sections(content)
+        if len(returned) == len(sections):
+            replacements = {i: returned[i] for i in pending}
+        elif len(returned) == len(pending):
+            replacements = dict(zip(pending, returned))
+        elif len(pending) == 1:
+            replacements = {pending[0]: content}
+        else:
+            self.logger.warning(
+                f"输出的{len(returned)}个章节无法对应到待处理的{len(pending)}个章节"
+            )
+            return None
+        return self.draft.replace_sections(replacements)
+
+    def _apply_revision(self, writer_result: Dict[str, Any]) -> None:
+        """采用写作者修改后的草稿，没有有效内容时保持当前版本"""
+        merged = self._merge_window(writer_result.get("content"))
+        if merged:
+            self.current_draft = merged
+        else:
+            self.logger.error("写作者未返回有效内容，保持使用当前版本")
+
+    def _record_accepted_chapter(self, index: int, text: str) -> None:
+        """记录已通过的章节：写入设定索引和故事圣经，正文中确立的设定同时记为既定事实"""
+        if self.fact_index is not None:
+            self.fact_index.record_chapter(index, text)
+        if self.story_bible is not None:
+            self.story_bible.record_chapter(index, text)
+            if self.fact_index is not None:
+                for fact in self.fact_index.established:
+                    self.story_bible.add_fact(fact)
+
+    def _measure_quality(self, content: str) -> Optional[QualityReport]:
+        """统计本地质量指标，未启用时返回None"""
+        if self.quality_metrics is None:
+            return None
+        self.quality_stats["measured"] += 1
+        return self.quality_metrics.measure(content)
+
+    def _build_evaluation_prompt(
+        self, outline: str, content: str, quality: Optional[QualityReport] = None
+    ) -> str:
+        """
+        构建评估prompt（quality为本地质量指标，附在内容之前供参考）
+
+        完整草稿中已通过且未改动的章节由故事圣经代替；
+        单个章节的评估只带本章大纲，附上故事圣经作为前后文参考。
+        """
+        extra = [("本地指标", QualityMetrics.summary(quality) if quality else None)]
+        if len(split_sections(content)) < 2:
+            extra = self._story_bible_blocks() + extra
+        return self.prompt_builder.build(
+            """请对照故事大纲评估当前内容的质量，给出0-100的评分和具体的修改建议。
 
 评估要点：
 1. 内容是否忠实遵循原始大纲的设定
@@ -247,23 +1573,394 @@ class WorkflowManager:
 请按以下格式返回：
 分数：[评分]（0分表示完全偏离大纲需要重写，100分表示完全符合要求）
 合理性：[分析内容与大纲的契合度]
-建议：[具体修改建议]
-"""
-        response = await supervisor.execute({"prompt": evaluation_prompt})
+偏离章节：[严重偏离大纲的章节序号，从1开始，用逗号分隔；没有则填“无”]
+建议：[具体修改建议]""",
+            *self._windowed_blocks(outline, content, "当前内容", extra),
+        )
 
-        # 解析评分和建议
-        response_text = response.get("content", "")
+    def _parse_score(self, response_text: str) -> float:
+        """从评估意见中解析评分，无法解析时视为0分"""
         try:
             score_line = [
                 line for line in response_text.split("\n") if "分数：" in line
             ][0]
-            score = float(score_line.split("：")[1].strip())
-            return score, response_text
+            return float(score_line.split("：")[1].strip())
         except (IndexError, ValueError):
-            return 0.0, response_text
+            return 0.0
+
+    async def evaluate_content(
+        self, outline: Optional[str], content: Optional[str]
+    ) -> Tuple[float, str]:
+        """评估内容质量"""
+        self.last_failing_sections = []
+        self.last_quality_rejection = None
+        if not outline or not content:
+            return 0.0, "内容或大纲为空，无法评估"
+
+        # 本地预检不通过的草稿直接判0分，不调用审核者
+        report = self._measure_quality(content)
+        if report is not None and not report["passed"]:
+            self.quality_stats["rejected"] += 1
+            self.last_quality_rejection = list(report["issues"])
+            self.logger.info(f"本地预检未通过：{'；'.join(report['issues'])}")
+            issues = "\n".join(f"- {issue}" for issue in report["issues"])
+            return 0.0, f"分数：0\n本地预检未通过：\n{issues}\n建议：按以上问题修改正文"
+
+        if self.incremental_evaluation:
+            sections = split_sections(content)
+            if len(sections) > 1:
+                return await self._evaluate_sections(outline, sections)
+
+        evaluation_prompt = self._build_evaluation_prompt(outline, content, report)
+        response = await self._call_agent(
+            "supervisor",
+            evaluation_prompt,
+            log=False,
+            expected_tokens=self.evaluation_output_tokens,
+        )
+
+        # 解析评分和建议
+        response_text = response.get("content", "")
+        self.last_failing_sections = self._parse_failing_sections(response_text)
+        return self._parse_score(response_text), response_text
+
+    async def _evaluate_sections(
+        self, outline: str, sections: List[str]
+    ) -> Tuple[float, str]:
+        """
+        按章节增量评估：只评估缓存中没有的章节，总分按章节长度加权汇总
+
+        Returns:
+            Tuple[float, str]: 总分和汇总后的评估意见
+        """
+        outline_sections = split_sections(outline)
+        aligned = len(outline_sections) == len(sections)
+        section_outlines = outline_sections if aligned else [outline] * len(sections)
+        keys = [
+            section_key(section_outline, section)
+            for section_outline, section in zip(section_outlines, sections)
+        ]
+
+        results: List[Optional[Tuple[float, str]]] = [
+            self.section_score_cache.get(key) for key in keys
+        ]
+        stale = [i for i, result in enumerate(results) if result is None]
+        if len(stale) < len(sections):
+            self.events.publish(
+                "cache_hit", source="section_score", sections=len(sections) - len(stale)
+            )
+        self.logger.info(f"增量评估：{len(sections)}个章节中{len(stale)}个需要重新评分")
+
+        async def score_section(index: int) -> None:
+            response = await self._call_agent(
+                "supervisor",
+                self._build_evaluation_prompt(
+                    section_outlines[index],
+                    sections[index],
+                    self._measure_quality(sections[index]),
+                ),
+                log=False,
+                expected_tokens=self.evaluation_output_tokens,
+            )
+            feedback = response.get("content", "")
+            score = self._parse_score(feedback)
+            self.section_score_cache.put(keys[index], score, feedback)
+            results[index] = (score, feedback)
+
+        await asyncio.gather(*(score_section(i) for i in stale))
+
+        self.last_failing_sections = [
+            i for i, (score, _) in enumerate(results) if score == 0
+        ]
+        if self.last_failing_sections:
+            total = 0.0
+        else:
+            weights = [max(1, len(section)) for section in sections]
+            total = sum(
+                weight * score for weight, (score, _) in zip(weights, results)
+            ) / sum(weights)
+            total = round(total, 1)
+
+        failing = ", ".join(str(i + 1) for i in self.last_failing_sections) or "无"
+        details = "\n\n".join(
+            f"第{i + 1}章（{score}分）：\n{feedback}"
+            for i, (score, feedback) in enumerate(results)
+        )
+        return total, f"分数：{total}\n偏离章节：{failing}\n\n{details}"
+
+    def _parse_failing_sections(self, evaluation: str) -> List[int]:
+        """从评估意见中解析偏离大纲的章节（返回从0开始的序号）"""
+        for line in evaluation.split("\n"):
+            if "偏离章节：" in line:
+                numbers = re.findall(r"\d+", line.split("偏离章节：", 1)[1])
+                return sorted({int(n) - 1 for n in numbers if int(n) > 0})
+        return []
+
+    async def _revise_rejected_draft(self, evaluation: str) -> None:
+        """本地预检未通过的草稿：把预检结果作为评审意见交给写作者修改，保留大纲"""
+        self.logger.info("本地预检未通过，交给写作者按预检结果修改")
+        writer_result = await self._call_agent(
+            "writer",
+            self._build_revision_prompt(evaluation, self.current_draft),
+            expected_tokens=self._estimate_tokens("writer", self.current_draft),
+        )
+        self._apply_revision(writer_result)
+
+    async def _rewrite_failing_sections(self, evaluation: str) -> bool:
+        """
+        只重写评估指出偏离大纲的章节，保留其余已通过的内容
+
+        Returns:
+            bool: 是否完成了定向重写；无法定位章节时返回False
+        """
+        draft = self.draft
+        sections = draft.sections() if draft is not None else []
+        failing = [i for i in self.last_failing_sections if i < len(sections)]
+        if len(sections) < 2 or not failing or len(failing) == len(sections):
+            return False
+
+        outline_sections = split_sections(self.original_outline or "")
+        aligned = len(outline_sections) == len(sections)
+
+        bible = self.story_bible
+        # 未偏离的章节视为已通过，记入故事圣经和设定索引
+        for index, section in enumerate(sections):
+            if index not in failing:
+                self._record_accepted_chapter(index, section)
+
+        async def rewrite(index: int) -> None:
+            section_outline = (
+                outline_sections[index] if aligned else self.original_outline
+            )
+            # 故事圣经和前一章结尾代替前缀中的完整大纲
+            context_blocks = self._story_bible_blocks(index)
+            section_prompt = self.prompt_builder.build(
+                """以下章节严重偏离了故事大纲，请只重写这一章。
+
+要求：
+1. 严格遵循大纲设定，修正评审意见指出的偏离
+2. 与前后章节保持衔接，保留章节标题
+3. 只输出重写后的本章正文""",
+                context_blocks
+                + [
+                    ("本章对应的大纲", section_outline),
+                    ("评审意见", evaluation),
+                    (f"需要重写的章节（第{index + 1}章）", sections[index]),
+                ],
+                outline=self.original_outline if bible is None else None,
+            )
+            result = await self._call_agent(
+                "writer",
+                section_prompt,
+                expected_tokens=self._estimate_tokens("writer", sections[index]),
+            )
+            if result.get("content"):
+                rewritten[index] = result["content"]
+
+        rewritten: Dict[int, str] = {}
+        self.logger.info(
+            f"定向重写偏离大纲的章节：{', '.join(str(i + 1) for i in failing)}"
+        )
+        await asyncio.gather(*(rewrite(i) for i in failing))
+        # 只替换重写的章节块，其余章节原样保留
+        self.current_draft = draft.replace_sections(rewritten)
+        return True
+
+    async def _run_pipelined_workflow(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """
+        按章节流水线执行创作
+
+        Returns:
+            Optional[Dict[str, Any]]: 上下文；大纲无法按章节切分时返回None，
+            此时original_outline保留已生成的大纲，整体创作流程直接沿用
+        """
+        creator_prompt = prompt + "\n请生成详细的故事大纲，并按“第X章”划分章节。"
+        creator_result = await self._generate_best(
+            "outline", "creator", creator_prompt, sectioned=True
+        )
+        self.original_outline = creator_result.get("content", "")
+
+        outline_sections = split_sections(self.original_outline)
+        if len(outline_sections) < 2:
+            self.logger.info("大纲未划分章节，改用整体创作流程")
+            return None
+
+        self.logger.info(f"启用章节流水线，共{len(outline_sections)}章")
+        pipeline = ChapterPipeline(
+            self,
+            queue_size=self.pipeline_queue_size,
+            max_chapter_rewrites=self.max_chapter_rewrites,
+        )
+        chapters = await pipeline.run(outline_sections)
+
+        self.current_draft = join_sections([chapter["text"] for chapter in chapters])
+        self.context["chapter_scores"] = [chapter["score"] for chapter in chapters]
+        self.context["pipeline_stats"] = dict(pipeline.stats)
+        self.context["final_draft"] = self.current_draft
+        self._save_draft(self.current_draft)
+        return self.context
+
+    async def _run_graph_workflow(
+        self, prompt: str, outline_content: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按声明式阶段图执行创作
+
+        Args:
+            prompt: 故事提示
+            outline_content: 已生成的大纲（如章节流水线无法切分的大纲），首次执行大纲阶段时直接沿用
+        """
+        graph = StageGraph.from_config(self.workflow_graph_config)
+        self_assessment: Optional[Tuple[float, str]] = None
+        # 编辑阶段结束时的草稿，供与评分并行的预取使用
+        edited: Optional[str] = None
+        prefetched: Optional[Dict[str, Any]] = None
+
+        async def discard_prefetch() -> None:
+            nonlocal prefetched
+            speculation, prefetched = prefetched, None
+            await self._discard_speculation(speculation)
+
+        async def outline(state: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal outline_content
+            await discard_prefetch()
+            if "score" in state:
+                # 评分为0退回重新创作，计为一轮修订
+                self.revision_count += 1
+            if outline_content:
+                self.original_outline, outline_content = outline_content, None
+            else:
+                creator_result = await self._generate_best(
+                    "outline", "creator", prompt + "\n请生成详细的故事大纲。"
+                )
+                self.original_outline = creator_result.get("content", "")
+            self.current_draft = None
+            return {}
+
+        async def draft(state: Dict[str, Any]) -> Dict[str, Any]:
+            writer_result = await self._generate_best(
+                "draft",
+                "writer",
+                self.prompt_builder.build(
+                    "请根据原始大纲进行创作。", outline=self.original_outline
+                ),
+                outline=self.original_outline,
+            )
+            self.current_draft = writer_result.get("content", "")
+            self.editing_count = 0
+            if self.convergence is not None:
+                self.convergence.reset()
+            return {}
+
+        async def edit(state: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal self_assessment, edited, prefetched
+            editor_result = None
+            speculation, prefetched = prefetched, None
+            if speculation is not None:
+                if speculation["draft"] == self.current_draft:
+                    self.speculation_stats["hits"] += 1
+                    editor_result = await speculation["task"]
+                else:
+                    await self._discard_speculation(speculation)
+            self_assessment = await self._edit_draft(editor_result)
+            edited = self.current_draft
+            prefetch = (
+                self.speculative_execution
+                and self.editing_count + 1 < self.max_editing_cycles
+                and not self._budget_soft("skip_optional")
+            )
+            return {"prefetch": 1 if prefetch else 0}
+
+        async def prefetch_edit(state: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal prefetched
+            prompt = self._speculative_editing_prompt(edited)
+            if prompt is None:
+                return {}
+            speculation = self._speculate("editor", prompt)
+            speculation["draft"] = edited
+            prefetched = speculation
+            await asyncio.wait([speculation["task"]])
+            return {}
+
+        async def evaluate(state: Dict[str, Any]) -> Dict[str, Any]:
+            score, _ = await self._assess_draft(self_assessment)
+            plateau = (
+                self.convergence.record_score(score)
+                if self.convergence is not None and 0 < score < self.revision_threshold
+                else None
+            )
+            if plateau:
+                self.logger.info(f"{plateau}，提前结束编辑循环")
+                self.convergence_stats["plateaued"] += 1
+            self.editing_count += 1
+            return {
+                "score": score,
+                "threshold": self.revision_threshold,
+                "editing_left": self.max_editing_cycles - self.editing_count,
+                "revisions_left": self.max_revision_cycles - self.revision_count - 1,
+                "plateaued": 1 if plateau else 0,
+                "failing": len(self.last_failing_sections),
+                "rejected": 1 if self.last_quality_rejection else 0,
+            }
+
+        async def rewrite_sections(state: Dict[str, Any]) -> Dict[str, Any]:
+            await discard_prefetch()
+            rewritten = await self._rewrite_failing_sections(self.last_evaluation or "")
+            if not rewritten:
+                self.logger.info("评分为0（内容严重偏离大纲），退回给创作者重新创作")
+                if self.cascade is not None:
+                    self.cascade.escalate(["creator", "writer"], "内容偏离大纲")
+            return {"rewritten": 1 if rewritten else 0}
+
+        async def revise(state: Dict[str, Any]) -> Dict[str, Any]:
+            await discard_prefetch()
+            self.revision_count += 1
+            self.editing_count = 0
+            if self.convergence is not None:
+                self.convergence.reset()
+            if self.cascade is not None:
+                self.cascade.escalate(["writer", "editor"], "本轮修订未达标")
+            writer_result = await self._call_agent(
+                "writer",
+                self._build_revision_prompt(
+                    self.last_evaluation or "", self.current_draft
+                ),
+                expected_tokens=self._estimate_tokens("writer", self.current_draft),
+            )
+            self._apply_revision(writer_result)
+            return {}
+
+        handlers = {
+            "outline": outline,
+            "draft": draft,
+            "edit": edit,
+            "prefetch_edit": prefetch_edit,
+            "evaluate": evaluate,
+            "rewrite_sections": rewrite_sections,
+            "revise": revise,
+        }
+        state = await graph.run(handlers)
+        self.logger.info(f"阶段图执行结束：{state['end_reason']}")
+        self.context["graph"] = {
+            "trace": state["trace"],
+            "end_reason": state["end_reason"],
+        }
+        if state["interrupted"]:
+            return self._finalize_best_draft(f"阶段图提前结束（{state['end_reason']}）")
+
+        self.context["final_draft"] = self.current_draft
+        if isinstance(self.current_draft, str) and self.current_draft.strip():
+            self._save_draft(self.current_draft)
+        else:
+            self.logger.error("最终稿为空，无法保存")
+        return self.context
 
     async def run_workflow(self) -> Dict[str, Any]:
         """执行完整工作流"""
+        story_title = (self.context.get("story_seed") or {}).get("title")
+        self.events.publish("run_start", title=story_title)
+        self.deadline = Deadline(self.run_deadline_seconds, parent=current_deadline())
+        deadline_token = self.deadline.activate()
         try:
             self.logger.info(f"\n{'#'*80}\n开始执行工作流\n{'#'*80}")
 
@@ -282,75 +1979,164 @@ class WorkflowManager:
 
             # 创建初始提示
             prompt = self._format_story_prompt(story_seed)
+            self.prompt_builder.story_setting = self._format_story_setting(story_seed)
+            if self.fact_check:
+                self.fact_index = FactIndex(story_seed)
+            if self.use_quality_metrics:
+                self.quality_metrics = QualityMetrics.from_seed(
+                    story_seed,
+                    min_chars=self.quality_min_chars,
+                    min_diversity=self.quality_min_diversity,
+                )
+            if self.best_of_n > 1:
+                self.candidate_ranker = CandidateRanker(
+                    self.quality_metrics
+                    or QualityMetrics.from_seed(
+                        story_seed,
+                        min_chars=self.quality_min_chars,
+                        min_diversity=self.quality_min_diversity,
+                    ),
+                    self.fact_index or FactIndex(story_seed),
+                    self._repetition_detector,
+                )
+            if self.use_story_bible:
+                self.story_bible = StoryBible(
+                    story_seed,
+                    recent_chapters=self.story_bible_recent_chapters,
+                    summary_chars=self.story_bible_summary_chars,
+                    window_chars=self.story_bible_window_chars,
+                )
+            self.budget.start()
+
+            # 章节流水线无法切分的大纲已经生成过，整体创作流程直接沿用
+            pending_outline: Optional[str] = None
+            if self.pipeline_chapters:
+                result = await self._run_pipelined_workflow(prompt)
+                if result is not None:
+                    return result
+                pending_outline = self.original_outline
+
+            if self.workflow_engine == "graph":
+                return await self._run_graph_workflow(prompt, pending_outline)
 
             while self.revision_count < self.max_revision_cycles:
                 self.logger.info(f"\n---开始第{self.revision_count + 1}轮创作修订---")
 
                 # 如果是首轮或需要重写
                 if self.current_draft is None:
-                    # 创作者生成大纲
-                    creator_prompt = prompt + "\n请生成详细的故事大纲。"
-                    creator_result = await self.agents["creator"].execute(
-                        {"prompt": creator_prompt}
-                    )
-                    outline_content = creator_result.get("content", "")
+                    if pending_outline:
+                        outline_content, pending_outline = pending_outline, None
+                    else:
+                        # 创作者生成大纲
+                        creator_prompt = prompt + "\n请生成详细的故事大纲。"
+                        creator_result = await self._run_stage(
+                            "outline",
+                            self._generate_best("outline", "creator", creator_prompt),
+                        )
+                        outline_content = creator_result.get("content", "")
                     self.original_outline = outline_content  # 保存原始大纲
-                    self.log_prompt("creator", creator_prompt, outline_content)
 
                     # 写作者根据大纲创作
-                    writer_prompt = f"请根据以下大纲进行创作：\n{outline_content}"
-                    writer_result = await self.agents["writer"].execute(
-                        {"prompt": writer_prompt}
+                    writer_prompt = self.prompt_builder.build(
+                        "请根据原始大纲进行创作。", outline=outline_content
                     )
-                    self.log_prompt(
-                        "writer", writer_prompt, writer_result.get("content", "")
+                    writer_result = await self._run_stage(
+                        "draft",
+                        self._generate_best(
+                            "draft", "writer", writer_prompt, outline=outline_content
+                        ),
                     )
                     self.current_draft = writer_result.get("content", "")
 
                 # 编辑循环
                 self.editing_count = 0
+                pending_edit: Optional[asyncio.Task] = None
+                pending_revision: Optional[asyncio.Task] = None
+                evaluated_draft: Optional[Draft] = None  # 本轮最近一次评估的版本
+                if self.convergence is not None:
+                    self.convergence.reset()
                 while self.editing_count < self.max_editing_cycles:
                     self.logger.info(
                         f"\n---开始第{self.editing_count + 1}轮编辑润色---"
                     )
 
-                    # 编辑检查错别字和润色
-                    editor_prompt = f"""请对以下内容进行详细的错别字检查和文字润色：
-
-{self.current_draft}
-
-审查要点：
-1. 检查所有可能的错别字
-2. 检查病句和不通顺的表达
-3. 检查标点符号使用是否规范
-4. 保持作者的写作风格，仅修正错误
-5. 改进不通顺的表达，但保持原意
-
-请返回修改后的内容，并列出所有发现的问题。"""
-
-                    editor_result = await self.agents["editor"].execute(
-                        {"prompt": editor_prompt}
-                    )
-                    self.log_prompt(
-                        "editor", editor_prompt, editor_result.get("content", "")
+                    # 编辑检查错别字和润色（推测命中时直接使用已启动的调用）
+                    editor_result = None
+                    if pending_edit is not None:
+                        editor_result = await self._run_stage("edit", pending_edit)
+                        pending_edit = None
+                    self_assessment = await self._run_stage(
+                        "edit", self._edit_draft(editor_result)
                     )
-                    self.current_draft = editor_result.get("content", "")
 
-                    # 评估内容质量和合理性
-                    score, evaluation = await self.evaluate_content(
-                        self.original_outline, self.current_draft
+                    # 与上次评估的版本相比几乎没有改动时，再评估也不会有新结果
+                    if self.convergence is not None and evaluated_draft is not None:
+                        reason = self.convergence.check_edit(
+                            evaluated_draft, self.draft
+                        )
+                        if reason:
+                            self.logger.info(f"{reason}，提前结束编辑循环")
+                            self.convergence_stats["converged"] += 1
+                            break
+
+                    # 推测执行：评分的同时启动下一轮编辑，或在编辑轮次将用完时启动写作者修改
+                    speculation = None
+                    if self.speculative_execution and not self._budget_soft(
+                        "skip_optional"
+                    ):
+                        if self.editing_count + 1 < self.max_editing_cycles:
+                            prompt = self._speculative_editing_prompt(self.current_draft)
+                            if prompt is not None:
+                                speculation = self._speculate("editor", prompt)
+                        elif (
+                            self.revision_count + 1 < self.max_revision_cycles
+                            and self.last_evaluation
+                        ):
+                            # 评分后的结论（分数和偏离章节）与之没有实质变化时才采用，否则作废
+                            speculation = self._speculate(
+                                "writer",
+                                self._build_revision_prompt(
+                                    self.last_evaluation, self.current_draft
+                                ),
+                                basis=(self.last_score, tuple(self.last_failing_sections)),
+                            )
+
+                    # 评估内容质量和合理性（融合模式下仅在必要时请审核者复核自评）
+                    score, evaluation = await self._run_stage(
+                        "evaluate", self._assess_draft(self_assessment)
                     )
-                    self.logger.info(f"\n当前评分：{score}\n评估意见：\n{evaluation}")
-
-                    # 如果评分为0，需要退回给创作者重新创作
+                    evaluated_draft = self.draft
+                    if speculation is not None and self._speculation_stale(
+                        speculation, score
+                    ):
+                        await self._discard_speculation(speculation)
+                        speculation = None
+
+                    # 如果评分为0，优先定向重写偏离的章节，否则退回给创作者重新创作
                     if score == 0:
+                        await self._discard_speculation(speculation)
+                        if self.last_quality_rejection:
+                            # 本地预检未通过（如缺少人物、内容重复）不代表偏离大纲，带着预检结果修改即可
+                            await self._run_stage(
+                                "revise", self._revise_rejected_draft(evaluation)
+                            )
+                            self.editing_count += 1
+                            continue
+                        if await self._run_stage(
+                            "revise", self._rewrite_failing_sections(evaluation)
+                        ):
+                            self.editing_count += 1
+                            continue
                         self.logger.info(
                             "评分为0（内容严重偏离大纲），退回给创作者重新创作"
                         )
+                        if self.cascade is not None:
+                            self.cascade.escalate(["creator", "writer"], "内容偏离大纲")
                         self.current_draft = None
                         break
 
                     if score >= self.revision_threshold:
+                        await self._discard_speculation(speculation)
                         self.logger.info("内容质量达标，完成创作")
                         self.context["final_draft"] = self.current_draft
                         # 保存最终稿件
@@ -360,6 +2146,28 @@ class WorkflowManager:
                         )
                         return self.context
 
+                    plateau = (
+                        self.convergence.record_score(score)
+                        if self.convergence is not None
+                        else None
+                    )
+                    if plateau and speculation is not None:
+                        if speculation["agent_type"] == "editor":
+                            await self._discard_speculation(speculation)
+                            speculation = None
+
+                    if speculation is not None:
+                        self.speculation_stats["hits"] += 1
+                        if speculation["agent_type"] == "editor":
+                            pending_edit = speculation["task"]
+                        else:
+                            pending_revision = speculation["task"]
+
+                    if plateau:
+                        self.logger.info(f"{plateau}，提前结束编辑循环")
+                        self.convergence_stats["plateaued"] += 1
+                        break
+
                     self.editing_count += 1
 
                 # 如果current_draft为None，说明需要重新创作
@@ -370,43 +2178,51 @@ class WorkflowManager:
                 self.revision_count += 1
                 if self.revision_count < self.max_revision_cycles:
                     self.logger.info("开始新一轮修改")
-
-                    # 重新进行一次评估以获取最新意见
-                    score, latest_evaluation = await self.evaluate_content(
-                        self.original_outline, self.current_draft
-                    )
-                    self.logger.info(
-                        f"\n新一轮评分：{score}\n评估意见：\n{latest_evaluation}"
-                    )
-
-                    writer_prompt = f"""请根据评审意见对当前版本进行全面改进。
-
-评审意见：
-{latest_evaluation}
-
-原始大纲：
-{self.original_outline}
-
-要求：
-1. 确保严格遵循原始大纲设定
-2. 认真分析评审意见指出的问题
-3. 保留原文的优点，重点改进不足之处
-4. 确保故事情节的连贯性和完整性
-5. 提升文字表达的质量
-
-当前内容：
-{self.current_draft}"""
-
-                    writer_result = await self.agents["writer"].execute(
-                        {"prompt": writer_prompt}
-                    )
-                    self.log_prompt(
-                        "writer", writer_prompt, writer_result.get("content", "")
-                    )
-                    if writer_result.get("content"):
-                        self.current_draft = writer_result.get("content")
+                    if self.cascade is not None:
+                        self.cascade.escalate(["writer", "editor"], "本轮修订未达标")
+
+                    if pending_revision is not None:
+                        # 推测命中：写作者修改已与最后一次评分并行完成
+                        writer_result = await self._run_stage("revise", pending_revision)
+                    elif self.last_evaluation and self._budget_soft("skip_optional"):
+                        # 预算紧张时不再复评，直接使用最近一次评审意见
+                        writer_result = await self._run_stage(
+                            "revise",
+                            self._call_agent(
+                                "writer",
+                                self._build_revision_prompt(
+                                    self.last_evaluation, self.current_draft
+                                ),
+                                expected_tokens=self._estimate_tokens(
+                                    "writer", self.current_draft
+                                ),
+                            ),
+                        )
                     else:
-                        self.logger.error("写作者未返回有效内容，保持使用当前版本")
+                        # 重新进行一次评估以获取最新意见
+                        score, latest_evaluation = await self._run_stage(
+                            "evaluate",
+                            self.evaluate_content(self.original_outline, self.current_draft),
+                        )
+                        self.last_evaluation = latest_evaluation
+                        self._track_best_draft(score)
+                        self.logger.info(
+                            f"\n新一轮评分：{score}\n评估意见：\n{latest_evaluation}"
+                        )
+
+                        writer_result = await self._run_stage(
+                            "revise",
+                            self._call_agent(
+                                "writer",
+                                self._build_revision_prompt(
+                                    latest_evaluation, self.current_draft
+                                ),
+                                expected_tokens=self._estimate_tokens(
+                                    "writer", self.current_draft
+                                ),
+                            ),
+                        )
+                    self._apply_revision(writer_result)
 
             self.logger.info("达到最大修订次数，使用最新版本作为最终稿")
             self.context["final_draft"] = self.current_draft
@@ -417,9 +2233,41 @@ class WorkflowManager:
                 self.logger.error("最终稿为空，无法保存")
             return self.context
 
+        except BudgetExhausted as e:
+            return self._finalize_best_draft(str(e))
+        except DeadlineExceeded as e:
+            if self.deadline_policy == "fail":
+                self.logger.error(f"工作流执行失败: {str(e)}")
+                raise
+            return self._finalize_best_draft(str(e))
         except Exception as e:
             self.logger.error(f"工作流执行失败: {str(e)}")
             raise
+        finally:
+            await self._cancel_speculations()
+            Deadline.restore(deadline_token)
+            self.context["budget"] = self.budget.report()
+            self.context["prompt_cache"] = self.get_prompt_cache_metrics()
+            if self.cascade is not None:
+                self.context["cascade"] = self.cascade.report()
+            if self.singleflight is not None:
+                self.context["coalescing"] = self.get_coalescing_metrics()
+            if self.adaptive_max_tokens or self.output_stats["continuations"]:
+                self.context["output_tokens"] = dict(self.output_stats)
+            if self.fact_index is not None:
+                self.context["fact_check"] = dict(self.fact_stats)
+            if self.repetition_guard:
+                self.context["repetition"] = self.get_repetition_metrics()
+            if self.quality_metrics is not None:
+                self.context["quality"] = dict(self.quality_stats)
+            if self.candidate_ranker is not None:
+                self.context["best_of"] = dict(self.best_of_stats)
+            self.events.publish(
+                "run_end",
+                status="failed" if sys.exc_info()[0] is not None else "succeeded",
+                best_score=self.best_score,
+                budget=self.context["budget"],
+            )
 
     def _extract_final_draft(self, chat_result: str) -> str:
         """从群聊结果中提取最终作品"""
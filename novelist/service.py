@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, Callable, Deque, List, Optional
+
+import jsonschema
+from aiohttp import web
+
+from .core.budget import RunBudget
+from .core.events import Subscription
+from .core.llm_factory import LLMFactory
+from .core.workflow import WorkflowManager, NovelAgent
+
+# 故事种子中创作流程必需的字段
+STORY_SEED_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["title", "theme", "settings", "style_preferences"],
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "theme": {"type": "string"},
+        "settings": {
+            "type": "object",
+            "required": ["time", "location", "season"],
+        },
+        "style_preferences": {
+            "type": "object",
+            "required": ["tone", "pacing", "narrative"],
+        },
+    },
+}
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+AgentFactory = Callable[[], Dict[str, NovelAgent]]
+
+
+def default_agents() -> Dict[str, NovelAgent]:
+    """创建参与创作的全部Agent"""
+    from .agents.creator_agent import CreatorAgent
+    from .agents.editor_agent import EditorAgent
+    from .agents.supervisor_agent import SupervisorAgent
+    from .agents.writer_agent import WriterAgent
+
+    return {
+        "creator": CreatorAgent(),
+        "writer": WriterAgent(),
+        "supervisor": SupervisorAgent(),
+        "editor": EditorAgent(),
+    }
+
+
+class Job:
+    """一次创作任务，保存状态、事件历史和产出"""
+
+    def __init__(self, story_seed: Dict[str, Any], history_size: int = 1000):
+        self.id = uuid.uuid4().hex
+        self.story_seed = story_seed
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.artifacts: Dict[str, str] = {}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._seq = 0
+        self._updated = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """记录事件并唤醒等待中的SSE连接"""
+        self._seq += 1
+        self.events.append({"id": self._seq, "event": event, "data": data})
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def set_status(self, status: str, **data: Any) -> None:
+        self.status = status
+        self.publish("status", {"status": status, **data})
+
+    async def wait_for_events(self, after: int) -> List[Dict[str, Any]]:
+        """等待序号大于after的事件；任务结束且没有新事件时返回空列表"""
+        while True:
+            waiter = self._updated
+            events = [event for event in self.events if event["id"] > after]
+            if events or self.done:
+                return events
+            await waiter.wait()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "title": self.story_seed.get("title"),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "artifacts": sorted(self.artifacts),
+        }
+
+
+class NovelService:
+    """
+    创作服务：有界任务队列 + 固定数量的工作协程
+
+    队列已满时拒绝新任务（429），关闭时停止接收任务（503），
+    并在排空超时内等待已接收的任务完成。
+    """
+
+    def __init__(
+        self,
+        agent_factory: AgentFactory = default_agents,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        drain_timeout: Optional[float] = None,
+        batch_budget: Optional[RunBudget] = None,
+    ):
+        """
+        初始化服务
+
+        Args:
+            agent_factory: 为每个任务创建Agent的函数
+            queue_size: 排队任务上限
+            workers: 同时执行的任务数
+            drain_timeout: 关闭时等待任务完成的最长时间（秒）
+            batch_budget: 所有任务共享的批量预算，默认根据BATCH_前缀的环境变量创建
+        """
+        self.agent_factory = agent_factory
+        self.queue_size = queue_size or int(os.getenv("SERVICE_QUEUE_SIZE", 16))
+        self.workers = workers or int(os.getenv("SERVICE_WORKERS", 2))
+        self.drain_timeout = (
+            drain_timeout
+            if drain_timeout is not None
+            else float(os.getenv("SERVICE_DRAIN_TIMEOUT", 300))
+        )
+        self.history_size = int(os.getenv("SERVICE_EVENT_HISTORY", 1000))
+        # 已结束任务的保留时间和数量上限，超出后连同事件历史和产出一起清理
+        self.job_ttl = float(os.getenv("SERVICE_JOB_TTL", 3600))
+        self.max_finished_jobs = int(os.getenv("SERVICE_MAX_FINISHED_JOBS", 200))
+        # 每个任务的运行预算都以它为父预算，用量同时计入，耗尽后不再接收新任务
+        self.batch_budget = batch_budget or RunBudget.from_env("BATCH")
+        # 批量预算的统计窗口（秒），窗口结束后清空用量重新计算，0表示不重置
+        self.batch_window = float(os.getenv("SERVICE_BATCH_WINDOW", 86400))
+        self._batch_window_start = time.monotonic()
+        self.jobs: Dict[str, Job] = {}
+        self.draining = False
+        self.logger = logging.getLogger("novelist.service")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        """启动工作协程"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        self.logger.info(f"创作服务已启动，工作协程{self.workers}个")
+
+    async def shutdown(self, app: Optional[web.Application] = None) -> None:
+        """停止接收任务，等待已接收的任务完成后退出"""
+        self.draining = True
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning("排空超时，取消未完成的任务")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            if not job.done:
+                job.set_status("cancelled")
+
+    def submit(self, story_seed: Dict[str, Any]) -> Job:
+        """
+        提交创作任务
+
+        Raises:
+            jsonschema.ValidationError: 故事种子不完整
+            asyncio.QueueFull: 队列已满
+            RuntimeError: 服务正在关闭或批量预算已耗尽
+        """
+        if self.draining or self._queue is None:
+            raise RuntimeError("服务正在关闭，不再接收新任务")
+        self._renew_batch_budget()
+        if self.batch_budget.status() == "exhausted":
+            raise RuntimeError("批量预算已耗尽，不再接收新任务")
+        jsonschema.validate(story_seed, STORY_SEED_SCHEMA)
+        self._prune_jobs()
+        job = Job(story_seed, self.history_size)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.set_status("queued", position=self._queue.qsize())
+        return job
+
+    def _renew_batch_budget(self) -> None:
+        """统计窗口结束后清空批量预算的用量，避免耗时上限按服务运行时长累计"""
+        if self.batch_window <= 0:
+            return
+        now = time.monotonic()
+        if now - self._batch_window_start < self.batch_window:
+            return
+        self.logger.info(f"批量预算窗口结束，本窗口用量：{self.batch_budget.report()}")
+        self.batch_budget.reset()
+        self._batch_window_start = now
+
+    def _prune_jobs(self) -> None:
+        """清理超过保留时间或超出数量上限的已结束任务，排队和执行中的任务不受影响"""
+        expires = time.time() - self.job_ttl
+        finished = sorted(
+            (job for job in self.jobs.values() if job.done),
+            key=lambda job: job.finished_at or job.created_at,
+        )
+        excess = len(finished) - self.max_finished_jobs
+        for index, job in enumerate(finished):
+            if index < excess or (job.finished_at or job.created_at) < expires:
+                del self.jobs[job.id]
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: Job) -> None:
+        job.started_at = time.time()
+        job.set_status("running")
+        forwarder: Optional[asyncio.Task] = None
+        try:
+            workflow = WorkflowManager(batch_budget=self.batch_budget)
+            subscription = workflow.events.subscribe(self.history_size)
+            forwarder = asyncio.create_task(self._forward_events(subscription, job))
+            agents = self.agent_factory()
+            for name, agent in agents.items():
+                workflow.register_agent(name, agent)
+            workflow.update_context({"story_seed": job.story_seed})
+            try:
+                result = await workflow.run_workflow()
+            finally:
+                # 先转发完剩余的进度事件，再发布任务的最终状态
+                subscription.close()
+                await forwarder
+                await self._close_agents(agents)
+        except asyncio.CancelledError:
+            if forwarder is not None:
+                forwarder.cancel()
+            job.finished_at = time.time()
+            job.set_status("cancelled")
+            raise
+        except Exception as e:
+            self.logger.error(f"任务{job.id}执行失败: {str(e)}")
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.set_status("failed", error=job.error)
+            return
+
+        if result.get("final_draft"):
+            job.artifacts["final_draft.txt"] = result["final_draft"]
+        if workflow.original_outline:
+            job.artifacts["outline.txt"] = workflow.original_outline
+        report = {
+            key: result[key]
+            for key in (
+                "budget",
+                "prompt_cache",
+                "cascade",
+                "coalescing",
+                "output_tokens",
+                "fact_check",
+                "repetition",
+                "quality",
+                "best_of",
+            )
+            if key in result
+        }
+        job.artifacts["report.json"] = json.dumps(report, ensure_ascii=False, indent=2)
+        job.finished_at = time.time()
+        job.set_status("succeeded")
+
+    @staticmethod
+    async def _close_agents(agents: Dict[str, Any]) -> None:
+        """关闭任务的Agent持有的LLM客户端"""
+        for agent in agents.values():
+            close = getattr(agent, "close", None)
+            if close is not None:
+                await close()
+
+    @staticmethod
+    async def _forward_events(subscription: Subscription, job: Job) -> None:
+        """将工作流事件总线上的事件转存到任务的事件历史"""
+        async for event in subscription:
+            job.publish(event["type"], event["data"])
+
+    # HTTP接口
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return _error(503, "服务正在关闭，不再接收新任务")
+        try:
+            story_seed = await request.json()
+        except json.JSONDecodeError:
+            return _error(400, "请求体不是有效的JSON")
+        try:
+            job = self.submit(story_seed)
+        except jsonschema.ValidationError as e:
+            return _error(400, f"故事种子不完整: {e.message}")
+        except asyncio.QueueFull:
+            return _error(429, "任务队列已满，请稍后重试", {"Retry-After": "30"})
+        except RuntimeError as e:
+            return _error(503, str(e))
+        return web.json_response(job.summary(), status=202)
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self._get_job(request).summary())
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        """以SSE推送任务事件，支持Last-Event-ID断点续传"""
+        job = self._get_job(request)
+        try:
+            last_id = int(request.headers.get("Last-Event-ID", 0) or 0)
+        except ValueError:
+            return _error(400, "Last-Event-ID不是有效的事件序号")
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+            }
+        )
+        await response.prepare(request)
+        while True:
+            events = await job.wait_for_events(last_id)
+            if not events:
+                break
+            for event in events:
+                payload = json.dumps(event["data"], ensure_ascii=False)
+                message = f"id: {event['id']}\nevent: {event['event']}\ndata: {payload}\n\n"
+                await response.write(message.encode("utf-8"))
+                last_id = event["id"]
+        await response.write_eof()
+        return response
+
+    async def handle_artifacts(self, request: web.Request) -> web.Response:
+        return web.json_response({"artifacts": sorted(self._get_job(request).artifacts)})
+
+    async def handle_artifact(self, request: web.Request) -> web.Response:
+        job = self._get_job(request)
+        name = request.match_info["name"]
+        if name not in job.artifacts:
+            raise web.HTTPNotFound(text="产出不存在")
+        content_type = "application/json" if name.endswith(".json") else "text/plain"
+        return web.Response(
+            text=job.artifacts[name], content_type=content_type, charset="utf-8"
+        )
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return web.json_response(
+            {
+                "status": "draining" if self.draining else "ok",
+                "queued": queued,
+                "queue_size": self.queue_size,
+                "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+                "budget": self.batch_budget.report(),
+                "budget_window": self.batch_window,
+            }
+        )
+
+    def _get_job(self, request: web.Request) -> Job:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="任务不存在")
+        return job
+
+
+def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None):
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def create_app(service: Optional[NovelService] = None) -> web.Application:
+    """创建aiohttp应用"""
+    service = service or NovelService()
+    app = web.Application()
+    app.on_startup.append(service.start)
+    app.on_shutdown.append(service.shutdown)
+    app.router.add_post("/jobs", service.handle_submit)
+    app.router.add_get("/jobs/{job_id}", service.handle_status)
+    app.router.add_get("/jobs/{job_id}/events", service.handle_events)
+    app.router.add_get("/jobs/{job_id}/artifacts", service.handle_artifacts)
+    app.router.add_get("/jobs/{job_id}/artifacts/{name}", service.handle_artifact)
+    app.router.add_get("/health", service.handle_health)
+    return app
+
+
+def run():
+    """以服务模式启动"""
+    from .app import setup_logging
+
+    setup_logging()
+    LLMFactory.validate_config()
+    web.run_app(
+        create_app(),
+        host=os.getenv("SERVICE_HOST", "127.0.0.1"),
+        port=int(os.getenv("SERVICE_PORT", 8080)),
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -68,8 +68,9 @@ def test_context():
 
 # 测试输出目录准备
 @pytest.fixture(autouse=True)
-def setup_output_dirs(tmp_path):
-    """准备测试用的输出目录"""
+def setup_output_dirs(tmp_path, monkeypatch):
+    """准备测试用的输出目录，并在临时目录中运行，保存的稿件不会写进包目录"""
+    monkeypatch.chdir(tmp_path)
     outlines_dir = tmp_path / "novelist" / "outputs" / "outlines"
     drafts_dir = tmp_path / "novelist" / "outputs" / "drafts"
     logs_dir = tmp_path / "novelist" / "outputs" / "logs"
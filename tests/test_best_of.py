@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.best_of import CandidateRanker
+from novelist.core.fact_index import FactIndex
+from novelist.core.quality_metrics import QualityMetrics
+from novelist.core.repetition import RepetitionDetector
+
+SEED = {
+    "characters": [{"name": "林晓月", "age": 24}, {"name": "陈志远"}],
+    "plot_elements": {"key_scenes": ["海边初遇"]},
+    "settings": {"time": "现代", "season": "夏天"},
+}
+GOOD = (
+    "林晓月在海边初遇陈志远，那是一个炎热的夏天。\n\n"
+    "“你也喜欢看海吗？”陈志远问。林晓月笑着点了点头，海风吹乱了她的头发。"
+)
+LOOPING = "\n\n".join(["林晓月走在海边，风吹起她的长发，她想起了很多年前的事。"] * 8)
+CONFLICT = GOOD.replace("林晓月笑着", "三十岁的林晓月笑着")
+
+
+def _ranker(min_chars=40):
+    return CandidateRanker(
+        QualityMetrics.from_seed(SEED, min_chars=min_chars), FactIndex(SEED)
+    )
+
+
+def test_rank_prefers_clean_candidate():
+    """测试排序：复读、有设定冲突、被截断和空的候选排在后面"""
+    ranked = _ranker().rank(
+        [
+            {"content": LOOPING},
+            {"content": CONFLICT},
+            {"content": ""},
+            {"content": GOOD, "finish_reason": "length"},
+            {"content": GOOD},
+        ]
+    )
+    assert [candidate["index"] for candidate in ranked] == [4, 1, 3, 0]
+    assert ranked[0]["signals"]["coverage"] == 1.0
+    assert ranked[1]["signals"]["conflicts"] == 1.0
+    assert ranked[2]["signals"]["truncated"] == 1.0
+    assert ranked[3]["signals"]["repetition"] > 0.5
+
+
+def test_repetition_uses_injected_detector():
+    """测试复读信号使用注入的检测器配置"""
+    # 只有一字之差的近似重复段落，相似度低于严格阈值
+    content = "\n\n".join(
+        f"林晓月走在{place}，风吹起她的长发，她想起了很多年前的事。"
+        for place in ("海边", "河边", "湖边", "山边", "林边", "城边")
+    )
+    default = _ranker(min_chars=0).signals(content)
+    strict = CandidateRanker(
+        QualityMetrics.from_seed(SEED, min_chars=0),
+        detector_factory=lambda: RepetitionDetector(threshold=0.95),
+    ).signals(content)
+    assert default["repetition"] > 0
+    assert strict["repetition"] == 0
+
+
+def test_failed_prefilter_ranks_last():
+    """测试未通过质量预检的候选总是排在通过的候选之后"""
+    ranked = _ranker(min_chars=30).rank([{"content": "林晓月和陈志远。"}, {"content": GOOD}])
+    assert [candidate["index"] for candidate in ranked] == [1, 0]
+    assert ranked[1]["signals"]["passed"] == 0.0
+
+
+def test_sectioned_outline_preferred():
+    """测试要求按章节划分时，划分了章节的大纲排在前面"""
+    flat = "林晓月在海边初遇陈志远。两人相识相知。"
+    sectioned = "第一章 初遇\n林晓月在海边初遇陈志远。\n\n第二章 相知\n两人相识相知。"
+    ranker = _ranker(min_chars=0)
+    assert ranker.rank([{"content": flat}, {"content": sectioned}], sectioned=True)[0]["index"] == 1
+    assert "sections" not in ranker.rank([{"content": flat}])[0]["signals"]
+
+
+def test_parse_choice():
+    """测试解析评审选出的候选"""
+    assert CandidateRanker.parse_choice("最佳候选：2\n理由：更生动", 3) == 1
+    assert CandidateRanker.parse_choice("最佳候选: 候选3", 3) == 2
+    assert CandidateRanker.parse_choice("最佳候选：5", 3) is None
+    assert CandidateRanker.parse_choice("都不错", 3) is None
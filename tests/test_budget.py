@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from novelist.core.budget import RunBudget
+
+
+def test_record_usage_and_cost():
+    """测试用量和费用统计"""
+    budget = RunBudget(max_tokens=1000)
+    cost = budget.record("writer", 300, 200, {"input": 0.004, "output": 0.016})
+    assert cost == pytest.approx(0.0044)
+    assert budget.tokens == 500
+    assert budget.by_agent["writer"]["calls"] == 1
+    assert budget.fraction_used() == 0.5
+    assert budget.status() == "ok"
+
+
+def test_budget_status_levels():
+    """测试软上限和耗尽状态"""
+    budget = RunBudget(max_cost=1.0, soft_limit=0.8)
+    budget.record("editor", 100000, 0, {"input": 0.009})
+    assert budget.status() == "soft"
+    budget.record("editor", 100000, 0, {"input": 0.009})
+    assert budget.status() == "exhausted"
+
+
+def test_unlimited_budget():
+    """测试未设置上限时始终充足"""
+    budget = RunBudget()
+    budget.record("writer", 10**9, 10**9)
+    assert not budget.limited
+    assert budget.status() == "ok"
+
+
+def test_parent_budget_shared_across_runs():
+    """测试批量预算在多个运行之间共享"""
+    batch = RunBudget(max_tokens=1000)
+    first = RunBudget(parent=batch)
+    second = RunBudget(parent=batch)
+    first.record("writer", 400, 0)
+    second.record("writer", 400, 0)
+    assert batch.tokens == 800
+    assert first.limited and second.limited
+    assert second.status() == "soft"
+
+
+def test_budget_from_env(monkeypatch):
+    """测试从环境变量读取预算"""
+    monkeypatch.setenv("RUN_TOKEN_BUDGET", "5000")
+    monkeypatch.setenv("RUN_TIME_BUDGET", "60")
+    budget = RunBudget.from_env("RUN")
+    assert budget.max_tokens == 5000
+    assert budget.max_seconds == 60
+    assert budget.max_cost is None
+    budget.start()
+    assert budget.report()["status"] == "ok"
+
+
+def test_reset_clears_usage_and_timer():
+    """测试重置后用量和计时清零，上限保持不变"""
+    budget = RunBudget(max_tokens=1000, max_seconds=60)
+    budget.start()
+    budget.record("writer", 1000, 0)
+    assert budget.status() == "exhausted"
+    budget.reset()
+    assert budget.tokens == 0 and budget.calls == 0 and budget.by_agent == {}
+    assert budget.elapsed == 0.0
+    assert budget.max_tokens == 1000
+    assert budget.status() == "ok"
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.cascade import ModelCascade
+
+
+def test_cascade_starts_on_cheapest_tier():
+    """测试级联从最便宜的模型开始"""
+    cascade = ModelCascade({"writer": ["small", "large"]})
+    assert cascade.model_for("writer") == "small"
+    assert cascade.model_for("supervisor") is None
+
+
+def test_escalation_stops_at_top_tier():
+    """测试升级到最高档后不再升级"""
+    cascade = ModelCascade({"writer": ["small", "large"], "editor": ["tiny"]})
+    assert cascade.escalate(reason="未达标") == ["writer"]
+    assert cascade.model_for("writer") == "large"
+    assert cascade.escalate(["writer"]) == []
+    report = cascade.report()
+    assert report["writer"]["escalations"] == 1
+    assert report["writer"]["calls"] == {"large": 1}
+    assert report["editor"]["escalations"] == 0
+
+
+def test_cascade_from_config():
+    """测试从llm_config.yaml读取级联配置"""
+    cascade = ModelCascade.from_config(["creator", "writer", "supervisor", "unknown"])
+    assert cascade.model_for("writer") == "deepseek-chat-33b"
+    assert "supervisor" not in cascade.tiers
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.convergence import ConvergenceDetector, split_paragraphs
+
+
+def test_split_paragraphs():
+    """测试段落切分忽略空行"""
+    assert split_paragraphs("第一段\n\n  第二段  \n") == ["第一段", "第二段"]
+    assert split_paragraphs(None) == []
+
+
+def test_identical_drafts_converge():
+    """测试内容未变时判定收敛"""
+    detector = ConvergenceDetector()
+    text = "\n".join(f"第{i}段内容，海风吹过沙滩。" for i in range(50))
+    diff = detector.compare(text, text)
+    assert diff["edit_ratio"] == 0
+    assert diff["changed_paragraphs"] == 0
+    assert detector.check_edit(text, text) is not None
+
+
+def test_small_edit_in_long_draft_converges():
+    """测试长文中只改动一个字时判定收敛"""
+    detector = ConvergenceDetector()
+    paragraphs = [f"第{i}段内容，海风吹过沙滩，她望着远方的灯塔。" for i in range(200)]
+    edited = list(paragraphs)
+    edited[10] = edited[10].replace("望着", "看着")
+    diff = detector.compare("\n".join(paragraphs), "\n".join(edited))
+    assert diff["changed_paragraphs"] == 1
+    assert 0 < diff["edit_ratio"] < 0.01
+    assert detector.check_edit("\n".join(paragraphs), "\n".join(edited))
+
+
+def test_substantial_edit_not_converged():
+    """测试大幅改动时不判定收敛"""
+    detector = ConvergenceDetector()
+    assert detector.check_edit("第一段\n第二段\n第三段", "全新的第一段\n第二段\n新增段落") is None
+
+
+def test_score_plateau():
+    """测试评分停滞检测"""
+    detector = ConvergenceDetector(plateau_window=2, plateau_epsilon=2)
+    assert detector.record_score(60) is None
+    assert detector.record_score(70) is None
+    assert detector.record_score(71) is None
+    assert detector.record_score(71.5) is not None
+    detector.reset()
+    assert detector.record_score(50) is None
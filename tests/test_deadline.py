@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import pytest
+
+from novelist.core.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    effective_timeout,
+    run_with_timeout,
+)
+from novelist.core.stage_graph import StageGraph
+
+
+def test_child_deadline_never_later_than_parent():
+    """测试子截止时间不晚于父截止时间"""
+    parent = Deadline(1)
+    child = Deadline(100, parent=parent)
+    assert child.expires_at == parent.expires_at
+    shorter = Deadline(0.5, parent=parent)
+    assert shorter.expires_at < parent.expires_at
+    unlimited = Deadline(None, parent=parent)
+    assert unlimited.expires_at == parent.expires_at
+
+
+def test_unlimited_deadline():
+    """测试不限制的截止时间"""
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired
+    assert deadline.timeout(120) == 120
+    assert deadline.timeout() is None
+
+
+def test_timeout_takes_smaller_value():
+    """测试超时取默认超时与剩余时间中较小的一个"""
+    deadline = Deadline(10)
+    assert deadline.timeout(120) <= 10
+    assert deadline.timeout(1) == 1
+    assert Deadline(-1).timeout(120) == 0.0
+    assert Deadline(-1).expired
+
+
+def test_activate_and_restore():
+    """测试激活和恢复当前截止时间"""
+    assert current_deadline() is None
+    assert effective_timeout(120) == 120
+    deadline = Deadline(5)
+    token = deadline.activate()
+    try:
+        assert current_deadline() is deadline
+        assert effective_timeout(120) <= 5
+    finally:
+        Deadline.restore(token)
+    assert current_deadline() is None
+
+
+@pytest.mark.asyncio
+async def test_run_with_timeout_cancels_operation():
+    """测试超时时取消操作并抛出DeadlineExceeded"""
+    cancelled = asyncio.Event()
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(DeadlineExceeded, match="测试调用超时"):
+        await run_with_timeout(hang(), 0.05, "测试调用")
+    assert cancelled.is_set()
+
+    assert await run_with_timeout(asyncio.sleep(0, "完成"), None, "测试调用") == "完成"
+    with pytest.raises(DeadlineExceeded, match="已超过截止时间"):
+        await run_with_timeout(hang(), 0, "测试调用")
+
+
+@pytest.mark.asyncio
+async def test_deadline_inherited_by_tasks():
+    """测试子任务继承创建时的截止时间"""
+    deadline = Deadline(5)
+    token = deadline.activate()
+    try:
+        seen = await asyncio.create_task(asyncio.sleep(0, current_deadline()))
+    finally:
+        Deadline.restore(token)
+    assert seen is deadline
+
+
+@pytest.mark.asyncio
+async def test_stage_timeout_in_graph():
+    """测试阶段图中的阶段超时"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["slow"],
+            "stages": {"slow": {"timeout": 0.05}},
+        }
+    )
+
+    async def slow(state):
+        await asyncio.sleep(10)
+
+    with pytest.raises(DeadlineExceeded, match="阶段 'slow'"):
+        await graph.run({"slow": slow})
+
+
+@pytest.mark.asyncio
+async def test_graph_stage_bounded_by_current_deadline():
+    """测试阶段超时不超过当前截止时间"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["slow"],
+            "stages": {"slow": {"timeout": 60}},
+        }
+    )
+
+    async def slow(state):
+        await asyncio.sleep(10)
+
+    token = Deadline(0.05).activate()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            await asyncio.wait_for(graph.run({"slow": slow}), 5)
+    finally:
+        Deadline.restore(token)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import tracemalloc
+
+import pytest
+
+from novelist.core.convergence import split_paragraphs
+from novelist.core.draft import Chapter, Draft
+from novelist.core.sections import split_sections
+
+NOVEL = "书名\n\n第一章 相遇\n  清晨的街道。\n他们相遇了。\n\n第二章 离别\n夜色渐深。\n"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [NOVEL, "", "没有章节标题的短文", "\n\n第一章\n\n", "第1章\n内容\n第2章"],
+)
+def test_round_trip_and_views(text):
+    """测试草稿逐字符还原原文，章节和段落视图与旧的切分函数一致"""
+    draft = Draft.from_text(text)
+    assert draft.text == text
+    assert len(draft) == len(text)
+    assert draft.sections() == split_sections(text)
+    assert draft.paragraph_texts() == split_paragraphs(text)
+
+
+def test_revisions_share_unchanged_blocks():
+    """测试修订版本共享未改动的章节"""
+    first = Draft.from_text(NOVEL)
+    second = Draft.from_text(NOVEL.replace("夜色渐深。", "夜色已深。"))
+
+    assert first.chapters[0] is second.chapters[0]
+    assert first.chapters[-1] is not second.chapters[-1]
+    shared = second.shared_with(first)
+    assert shared["chapters"] == 1
+    assert shared["chars"] == len(first.chapters[0])
+    assert Draft.from_text(NOVEL) == first
+    assert second != first
+
+
+def test_chapter_interning():
+    """测试相同文本的章节只有一个实例"""
+    text = "".join(["第一章 独一无二的", "章节内容"])
+    assert Chapter.of(text, True) is Chapter.of("第一章 独一无二的章节内容", True)
+    with pytest.raises(AttributeError):
+        Chapter.of(text, True).extra = 1
+
+
+def test_from_text_memory_close_to_plain_text():
+    """测试草稿只保存章节块，不同时保存完整文本：持有的内存与文本本身相当"""
+
+    def novel():
+        return "\n\n".join(
+            f"第{c}章 标题{c}\n"
+            + "\n".join(f"第{c}章第{i}段，{'夜色渐深，街灯一盏盏亮起。' * 3}" for i in range(40))
+            for c in range(1, 51)
+        )
+
+    expected = novel()
+    size = sys.getsizeof(expected)
+
+    tracemalloc.start()
+    try:
+        text = novel()
+        draft = Draft.from_text(text)
+        del text
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert draft.text == expected
+    assert held < 1.3 * size
+    # 峰值只包括原文本和切分出的章节
+    assert peak < 2.3 * size
+
+
+def test_replace_sections_keeps_other_chapters():
+    """测试替换章节时其余章节和章节之间的空行保持不变"""
+    draft = Draft.from_text(NOVEL)
+    assert [NOVEL[a:b] for a, b in draft.section_spans()] == draft.sections()
+
+    replaced = draft.replace_sections({1: "第二章 离别\n夜色已深。\n"})
+    assert replaced.text == NOVEL.replace("夜色渐深。", "夜色已深。")
+    assert replaced.chapters[0] is draft.chapters[0]
+    assert replaced == Draft.from_text(replaced.text)
+
+
+@pytest.mark.parametrize(
+    "replacement",
+    ["夜色已深。", "补充说明\n第二章 离别\n夜色已深。", "第二章 离别\n夜色已深。\n\n第三章 重逢\n又见面了。"],
+)
+def test_replace_sections_matches_full_reparse(replacement):
+    """测试替换后（包括丢了标题、拆成两章的情况）的块结构与重新切分完整文本一致"""
+    draft = Draft.from_text(NOVEL)
+    replaced = draft.replace_sections({1: replacement})
+    start, end = draft.section_spans()[1]
+    expected = NOVEL[:start] + replacement + NOVEL[end:]
+    assert replaced.text == expected
+    assert replaced == Draft.from_text(expected)
+
+
+def _apply_delta(base_chapters, delta):
+    return [base_chapters[item] if isinstance(item, int) else item for item in delta]
+
+
+def test_delta_from_carries_only_changed_chapters():
+    """测试草稿增量只携带改动的章节，接收方可以据上一版还原完整文本"""
+    first = Draft.from_text(NOVEL)
+    full = first.delta_from(None)
+    assert "\n".join(full) == NOVEL
+
+    second = first.replace_sections({1: "第二章 离别\n夜色已深。\n\n第三章 重逢\n又见面了。"})
+    delta = second.delta_from(first)
+    assert delta[0] == 0
+    assert all(isinstance(item, str) for item in delta[1:])
+    assert "\n".join(_apply_delta(full, delta)) == second.text
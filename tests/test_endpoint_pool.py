@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from typing import Optional
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from novelist.core.deadline import Deadline, DeadlineExceeded
+from novelist.core.endpoint_pool import EndpointPool, EndpointError
+from novelist.core.llm_client import ChatCompletionClient
+from novelist.core.llm_factory import LLMFactory
+from novelist.agents.writer_agent import WriterAgent
+
+
+class StubEndpoint:
+    """本地chat completions桩服务，可以模拟故障和延迟"""
+
+    def __init__(
+        self,
+        name: str,
+        status: int = 200,
+        delay: float = 0.0,
+        cut_after: Optional[int] = None,
+    ):
+        self.name = name
+        self.status = status
+        self.delay = delay
+        self.cut_after = cut_after  # 流式响应输出几个片段后断开连接
+        self.requests = 0
+        self.payloads = []
+        self.url = ""
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.payloads.append(await request.json())
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status, text="服务不可用")
+        if self.payloads[-1].get("stream"):
+            return await self.stream(request)
+        return web.json_response(
+            {
+                "choices": [
+                    {"message": {"content": self.name}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 3, "completion_tokens": 1},
+            }
+        )
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        """按SSE格式逐字输出name，最后一个片段带finish_reason和usage"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, char in enumerate(self.name):
+            if index == self.cut_after:
+                raise ConnectionResetError("连接断开")
+            chunk = {"choices": [{"delta": {"content": char}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        final = {
+            "choices": [{"delta": {}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": len(self.name)},
+        }
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1"
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+@pytest_asyncio.fixture
+async def stubs():
+    endpoints = []
+
+    async def make(*args, **kwargs) -> StubEndpoint:
+        stub = StubEndpoint(*args, **kwargs)
+        await stub.start()
+        endpoints.append(stub)
+        return stub
+
+    yield make
+    for stub in endpoints:
+        await stub.stop()
+
+
+@pytest.mark.asyncio
+async def test_failover_to_healthy_endpoint(stubs):
+    """测试端点故障时切换到健康端点"""
+    broken = await stubs("broken", status=503)
+    healthy = await stubs("healthy")
+    pool = EndpointPool([broken.url, healthy.url], failure_threshold=2)
+    client = ChatCompletionClient(pool, "test-key", timeout=5)
+    try:
+        results = [
+            await client.complete("model", [{"role": "user", "content": "你好"}])
+            for _ in range(4)
+        ]
+    finally:
+        await client.close()
+
+    assert all(result["content"] == "healthy" for result in results)
+    assert results[0]["usage"]["prompt_tokens"] == 3
+    # 故障端点连续失败后被熔断，之后的请求不再发往它
+    assert broken.requests == 2
+    assert healthy.requests == 4
+    assert pool.stats()["endpoints"][broken.url]["open"]
+
+
+@pytest.mark.asyncio
+async def test_timeout_fails_over(stubs):
+    """测试请求超时后切换端点"""
+    slow = await stubs("slow", delay=1.0)
+    fast = await stubs("fast")
+    pool = EndpointPool([slow.url, fast.url])
+    # 让连接池先选择慢端点
+    pool.endpoints[1].outstanding = 1
+    client = ChatCompletionClient(pool, None, timeout=0.2)
+    try:
+        result = await client.complete("model", [{"role": "user", "content": "你好"}])
+    finally:
+        await client.close()
+
+    assert result["content"] == "fast"
+    assert result["endpoint"] == fast.url
+    assert pool.failovers == 1
+
+
+@pytest.mark.asyncio
+async def test_request_timeout_bounded_by_deadline(stubs):
+    """测试请求超时不超过当前截止时间，截止时间已过时不再切换端点"""
+    slow = await stubs("slow", delay=1.0)
+    other = await stubs("other", delay=1.0)
+    pool = EndpointPool([slow.url, other.url])
+    client = ChatCompletionClient(pool, None, timeout=60)
+    token = Deadline(0.2).activate()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            await asyncio.wait_for(
+                client.complete("model", [{"role": "user", "content": "你好"}]), 5
+            )
+    finally:
+        Deadline.restore(token)
+        await client.close()
+
+    assert slow.requests + other.requests == 1
+    # 截止时间导致的超时不计入端点失败，也不影响延迟统计
+    for endpoint in pool.stats()["endpoints"].values():
+        assert endpoint["failures"] == 0
+        assert endpoint["ewma_latency"] is None
+        assert not endpoint["open"]
+
+
+@pytest.mark.asyncio
+async def test_retry_callback_reports_failed_endpoint(stubs):
+    """测试切换端点前通知重试回调"""
+    broken = await stubs("broken", status=502)
+    healthy = await stubs("healthy")
+    pool = EndpointPool([broken.url, healthy.url])
+    pool.endpoints[1].outstanding = 1
+    retries = []
+    client = ChatCompletionClient(pool, None, timeout=5)
+    try:
+        await client.complete(
+            "model",
+            [{"role": "user", "content": "你好"}],
+            on_retry=lambda url, error: retries.append(url),
+        )
+    finally:
+        await client.close()
+    assert retries == [broken.url]
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_retried(stubs):
+    """测试请求本身有误（4xx）时不切换端点"""
+    bad = await stubs("bad", status=400)
+    healthy = await stubs("healthy")
+    pool = EndpointPool([bad.url, healthy.url])
+    pool.endpoints[1].outstanding = 1
+    pool.failure_threshold = 1
+    client = ChatCompletionClient(pool, None, timeout=5)
+    try:
+        for _ in range(3):
+            with pytest.raises(EndpointError):
+                await client.complete("model", [{"role": "user", "content": "你好"}])
+    finally:
+        await client.close()
+    assert healthy.requests == 0
+    # 端点正常响应了请求，4xx不计入熔断
+    stats = pool.stats()["endpoints"][bad.url]
+    assert stats["failures"] == 0
+    assert not stats["open"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_forwards_tokens(stubs):
+    """测试传入on_token时以流式请求并逐段回报内容"""
+    endpoint = await stubs("流式输出")
+    pool = EndpointPool([endpoint.url])
+    tokens = []
+    client = ChatCompletionClient(pool, None, timeout=5)
+    try:
+        result = await client.complete(
+            "model", [{"role": "user", "content": "你好"}], on_token=tokens.append
+        )
+    finally:
+        await client.close()
+
+    assert endpoint.payloads[0]["stream"] is True
+    assert tokens == list("流式输出")
+    assert result["content"] == "流式输出"
+    assert result["finish_reason"] == "stop"
+    assert result["usage"]["completion_tokens"] == 4
+
+
+@pytest.mark.asyncio
+async def test_interrupted_stream_is_not_retried(stubs):
+    """测试已输出内容后流中断时不切换端点（否则内容会被重复回报），但计入端点失败"""
+    broken = await stubs("断开的流", cut_after=2)
+    healthy = await stubs("healthy")
+    pool = EndpointPool([broken.url, healthy.url])
+    pool.endpoints[1].outstanding = 1
+    tokens = []
+    client = ChatCompletionClient(pool, None, timeout=5)
+    try:
+        with pytest.raises(EndpointError, match="流式输出中断"):
+            await client.complete(
+                "model", [{"role": "user", "content": "你好"}], on_token=tokens.append
+            )
+    finally:
+        await client.close()
+
+    assert tokens == ["断", "开"]
+    assert healthy.requests == 0
+    assert pool.stats()["endpoints"][broken.url]["failures"] == 1
+
+
+def test_routes_by_latency_and_load():
+    """测试按进行中请求数和EWMA延迟选择端点"""
+    pool = EndpointPool(["http://a", "http://b"])
+    a, b = pool.endpoints
+    a.ewma_latency, b.ewma_latency = 2.0, 1.0
+    assert pool.select() is b
+    b.outstanding = 2
+    assert pool.select() is a
+
+
+@pytest.mark.asyncio
+async def test_circuit_half_open_after_cooldown():
+    """测试熔断冷却结束后放行试探请求，成功后恢复"""
+    pool = EndpointPool(["http://a"], failure_threshold=1, cooldown=0.05)
+
+    async def fail(url):
+        raise EndpointError("故障")
+
+    async def ok(url):
+        return url
+
+    with pytest.raises(EndpointError):
+        await pool.call(fail)
+    assert pool.endpoints[0].open_until
+    await asyncio.sleep(0.06)
+    assert await pool.call(ok) == "http://a"
+    assert pool.endpoints[0].open_until == 0
+    assert pool.endpoints[0].consecutive_failures == 0
+
+
+def test_factory_reads_endpoint_list(monkeypatch):
+    """测试从DEEPSEEK_API_BASES读取多个端点并共享连接池"""
+    monkeypatch.setattr(
+        LLMFactory(),
+        "_config",
+        {
+            "default_config": {"api_bases": "http://a/v1/, http://b/v1"},
+            "agents": {
+                "writer": {"llm_config": {"api_base": "http://single"}},
+                "editor": {"llm_config": {"api_base": "http://single"}},
+            },
+        },
+    )
+    monkeypatch.setattr(LLMFactory, "_pools", {})
+    assert LLMFactory.get_endpoints("writer") == ["http://a/v1", "http://b/v1"]
+    assert LLMFactory.get_endpoint_pool("writer") is LLMFactory.get_endpoint_pool(
+        "editor"
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_execute_calls_llm_through_pool(stubs, monkeypatch):
+    """测试Agent收到prompt时通过LLMFactory创建的客户端请求端点"""
+    endpoint = await stubs("正文")
+    monkeypatch.setattr(
+        LLMFactory(),
+        "_config",
+        {
+            "default_config": {"temperature": 0.7, "timeout": 5},
+            "agents": {
+                "writer": {
+                    "role_prompt": "你是小说作家。",
+                    "llm_config": {"model": "m", "api_base": endpoint.url},
+                }
+            },
+        },
+    )
+    monkeypatch.setattr(LLMFactory, "_pools", {})
+    agent = WriterAgent()
+    retries = []
+    try:
+        result = await agent.execute(
+            {
+                "prompt": "写第一章",
+                "llm_config": {"model": "override", "max_tokens": 100},
+                "on_retry": lambda url, error: retries.append(url),
+            }
+        )
+    finally:
+        await agent.close()
+
+    assert result["content"] == "正文"
+    assert result["usage"]["completion_tokens"] == 1
+    payload = endpoint.payloads[0]
+    assert payload["model"] == "override"
+    assert payload["max_tokens"] == 100
+    assert payload["messages"] == [
+        {"role": "system", "content": "你是小说作家。"},
+        {"role": "user", "content": "写第一章"},
+    ]
+    assert retries == []
+
+
+@pytest.mark.asyncio
+async def test_agent_execute_streams_tokens(stubs, monkeypatch):
+    """测试工作流传入on_token时Agent以流式请求并回报片段"""
+    endpoint = await stubs("第一章")
+    monkeypatch.setattr(
+        LLMFactory(),
+        "_config",
+        {"agents": {"writer": {"llm_config": {"model": "m", "api_base": endpoint.url}}}},
+    )
+    monkeypatch.setattr(LLMFactory, "_pools", {})
+    agent = WriterAgent()
+    tokens = []
+    try:
+        result = await agent.execute({"prompt": "写第一章", "on_token": tokens.append})
+    finally:
+        await agent.close()
+    assert tokens == ["第", "一", "章"]
+    assert result["content"] == "第一章"
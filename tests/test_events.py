@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import pytest
+
+from novelist.core.events import EventBus
+
+
+def test_publish_without_subscribers_is_noop():
+    """测试没有订阅者时发布事件不做任何事"""
+    bus = EventBus()
+    bus.publish("token", text="字")
+    assert bus.stats() == {"published": 0, "subscribers": 0, "dropped": 0}
+
+
+def test_full_buffer_drops_oldest():
+    """测试缓冲区满时丢弃最旧的事件"""
+    bus = EventBus()
+    subscription = bus.subscribe(maxsize=2)
+    for i in range(5):
+        bus.publish("token", index=i)
+
+    assert [event["data"]["index"] for event in subscription.drain()] == [3, 4]
+    assert subscription.dropped == 3
+    assert bus.stats()["dropped"] == 3
+
+
+def test_type_filter():
+    """测试只接收订阅的事件类型"""
+    bus = EventBus()
+    scores = bus.subscribe(types=["score"])
+    everything = bus.subscribe()
+    bus.publish("token", text="字")
+    bus.publish("score", score=80)
+
+    assert [event["type"] for event in scores.drain()] == ["score"]
+    assert len(everything.drain()) == 2
+
+
+def test_unknown_event_type_rejected():
+    """测试发布或订阅未知的事件类型时报错"""
+    bus = EventBus()
+    with pytest.raises(ValueError):
+        bus.publish("tokens", text="字")
+    with pytest.raises(ValueError):
+        bus.subscribe(types=["scores"])
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_never_blocks_publisher():
+    """测试消费慢的订阅者不会阻塞发布方，关闭后仍能取完已缓冲的事件"""
+    bus = EventBus()
+    subscription = bus.subscribe(maxsize=3)
+    received = []
+
+    async def consume():
+        async for event in subscription:
+            received.append(event["seq"])
+            await asyncio.sleep(0.01)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    for _ in range(10):
+        bus.publish("token", text="字")
+    subscription.close()
+    await asyncio.wait_for(consumer, 1)
+
+    assert received == [8, 9, 10]
+    assert subscription.dropped == 7
+    assert not bus.has_subscribers
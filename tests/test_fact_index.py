@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from novelist.core.fact_index import FactIndex, parse_number
+
+
+@pytest.fixture
+def index():
+    return FactIndex(
+        {
+            "settings": {"time": "现代", "location": "沿海城市", "season": "夏末秋初"},
+            "characters": [
+                {"name": "林晓月", "age": 24, "occupation": "设计师"},
+                {"name": "陈志远", "age": 26, "occupation": "创业者"},
+                {"name": "周宁"},
+            ],
+        }
+    )
+
+
+def _types(violations):
+    return [(v["type"], v["text"]) for v in violations]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [("24", 24), ("十", 10), ("十四", 14), ("二十", 20), ("二十六", 26), ("七", 7), ("一百", None)],
+)
+def test_parse_number(text, expected):
+    """测试解析年龄数字"""
+    assert parse_number(text) == expected
+
+
+def test_consistent_text_has_no_violations(index):
+    """测试与设定一致的文本"""
+    text = "第一章 初遇\n24岁的林晓月是一名设计师。初秋的海边，陈志远今年二十六岁。\n第二章 重逢\n林晓月用手机给陈志远发消息。"
+    assert index.check(text) == []
+
+
+def test_detects_wrong_name_age_occupation_and_setting(index):
+    """测试发现人名、年龄、职业、季节和时代冲突"""
+    text = (
+        "第一章 初遇\n林晓月来到海边。林晓月笑了。\n"
+        "第二章 风波\n林晓阅回头看去，三十岁的陈志远站在那里。"
+        "林晓月是一名创业者。那年冬天，皇上下了圣旨。"
+    )
+    violations = index.check(text)
+    assert _types(violations) == [
+        ("name", "林晓阅"),
+        ("occupation", "林晓月是一名创业者"),
+        ("age", "三十岁的陈志远"),
+        ("season", "冬天"),
+        ("era", "皇上"),
+        ("era", "圣旨"),
+    ]
+    assert all(v["section"] == 1 for v in violations)
+    assert "第2章：人名疑似错写：“林晓阅”（应为：林晓月）" in FactIndex.report(violations)
+
+
+def test_frequent_variant_is_treated_as_another_character(index):
+    """测试频繁出现的相似人名视为另一个人物"""
+    text = "林晓阳来了。林晓阳走了。林晓阳又来了。林晓月看着。林晓月笑了。林晓月说话。林晓月离开。"
+    assert index.check(text) == []
+
+
+def test_record_chapter_builds_timeline_and_ages(index):
+    """测试从已通过的章节建立时间线和年龄"""
+    index.record_chapter(0, "深秋的傍晚，周宁今年十九岁。林晓月路过。")
+    assert index.mentions["周宁"] == [0]
+    assert index.mentions["林晓月"] == [0]
+    assert index.characters["周宁"]["age"] == 19
+    # 时间线推进到秋天后允许进入冬天，春天仍属于冲突
+    assert index.allowed_seasons() == {"夏", "秋", "冬"}
+    assert _types(index.check("寒冬已至。周宁二十岁。春天还远。")) == [
+        ("age", "周宁二十岁"),
+        ("season", "春天"),
+    ]
+
+
+def test_location_conflicts_with_setting(index):
+    """测试指代故事所在地的说法与设定的地点特征矛盾，描述别处的说法不算冲突"""
+    text = "林晓月来自内陆城市。\n第二章 夜色\n这座内陆城市的夜晚很安静。这座沿海城市很热闹。"
+    assert _types(index.check(text)) == [("location", "这座内陆城市")]
+    assert "地点与设定不符：“这座内陆城市”（应为：沿海城市）" in FactIndex.report(index.check(text))
+
+
+def test_record_chapter_establishes_location_traits():
+    """测试设定没有给出的地点特征以已通过章节中先确立的为准"""
+    index = FactIndex({"settings": {"time": "现代", "location": "小城"}})
+    assert index.check("这座北方小城下雪了。") == []
+    index.record_chapter(0, "这座南方小城总是下雨。")
+    assert index.location_traits == {"南方"}
+    assert index.places == {0: ["这座南方小城"]}
+    assert _types(index.check("这座北方小城下雪了。")) == [("location", "这座北方小城")]
+
+
+@pytest.mark.parametrize(
+    "era, conflict",
+    [("唐朝", True), ("明代", True), ("古代", True), ("朝鲜战争时期", False), ("现代", False)],
+)
+def test_era_names(era, conflict):
+    """测试古代背景按完整的朝代名称识别，不会误匹配“朝鲜”等词"""
+    index = FactIndex({"settings": {"time": era}})
+    assert bool(index.check("他拿出手机。")) == conflict
+
+
+def test_record_chapter_collects_established_facts(index):
+    """测试已通过章节中确立的、设定没有给出的事实"""
+    index.record_chapter(0, "初秋，周宁今年十九岁。")
+    index.record_chapter(1, "深秋了。寒冬将至，这座沿海城市开始降温。")
+    assert index.established == ["周宁19岁", "第2章时间推进到冬季"]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import re
+import pytest
+from novelist.core.pipeline import ChapterPipeline
+from novelist.core.workflow import WorkflowManager
+
+
+class _StubAgent:
+    """按prompt返回内容的桩Agent"""
+
+    def __init__(self, handler, delay=0.01):
+        self.handler = handler
+        self.delay = delay
+        self.prompts = []
+
+    async def execute(self, context):
+        self.prompts.append(context["prompt"])
+        await asyncio.sleep(self.delay)
+        return {"content": self.handler(context["prompt"])}
+
+
+def _chapter_of(prompt):
+    prompt = prompt.split("本章大纲：")[-1]
+    match = re.search(r"第(\d+)章", prompt)
+    return match.group(1) if match else "?"
+
+
+@pytest.fixture
+def pipelined_workflow():
+    """创建使用桩Agent的工作流"""
+    manager = WorkflowManager()
+    manager.original_outline = "第1章 开端\n第2章 发展\n第3章 结局"
+    timeline = []
+
+    def write(prompt):
+        timeline.append(("write", _chapter_of(prompt)))
+        return f"第{_chapter_of(prompt)}章 正文"
+
+    def edit(prompt):
+        timeline.append(("edit", _chapter_of(prompt)))
+        return f"第{_chapter_of(prompt)}章 润色正文"
+
+    scores = {"2": [40, 90]}
+
+    def score(prompt):
+        chapter = _chapter_of(prompt.split("当前内容：")[1])
+        timeline.append(("score", chapter))
+        queue = scores.get(chapter)
+        value = queue.pop(0) if queue else 85
+        return f"分数：{value}\n建议：第{chapter}章意见"
+
+    manager.register_agent("writer", _StubAgent(write))
+    manager.register_agent("editor", _StubAgent(edit))
+    manager.register_agent("supervisor", _StubAgent(score))
+    manager.timeline = timeline
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_pipeline_processes_all_chapters_in_order(pipelined_workflow):
+    """测试流水线按章节顺序返回结果，并对未达标章节定向重写"""
+    pipeline = ChapterPipeline(pipelined_workflow, queue_size=1)
+    results = await pipeline.run(["第1章 开端", "第2章 发展", "第3章 结局"])
+
+    assert [r["text"] for r in results] == [
+        "第1章 润色正文",
+        "第2章 润色正文",
+        "第3章 润色正文",
+    ]
+    assert [r["score"] for r in results] == [85, 90, 85]
+    assert pipeline.stats["written"] == 3
+    assert pipeline.stats["rewritten"] == 1
+    assert pipeline.stats["scored"] == 4
+    # 只有第2章被带着审核意见重写
+    rewrites = [
+        p for p in pipelined_workflow.agents["writer"].prompts if "评审意见" in p
+    ]
+    assert len(rewrites) == 1 and "第2章意见" in rewrites[0]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_overlaps_stages(pipelined_workflow):
+    """测试不同章节的阶段交错执行"""
+    pipeline = ChapterPipeline(pipelined_workflow, queue_size=1)
+    await pipeline.run(["第1章 开端", "第2章 发展", "第3章 结局"])
+
+    timeline = pipelined_workflow.timeline
+    # 第1章审核之前，后续章节已经开始写作
+    first_score = timeline.index(("score", "1"))
+    assert ("write", "2") in timeline[:first_score]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_propagates_stage_errors(pipelined_workflow):
+    """测试阶段异常会终止流水线"""
+
+    def broken(prompt):
+        raise RuntimeError("编辑失败")
+
+    pipelined_workflow.agents["editor"] = _StubAgent(broken)
+    pipeline = ChapterPipeline(pipelined_workflow)
+    with pytest.raises(RuntimeError, match="编辑失败"):
+        await pipeline.run(["第1章 开端"])
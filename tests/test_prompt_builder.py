@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.prompt_builder import PromptBuilder, cached_prompt_tokens
+
+
+def test_prompts_share_stable_prefix():
+    """测试不同草稿和评审意见的prompt共享同一前缀"""
+    builder = PromptBuilder("标题: 测试故事")
+    first = builder.build("请修改。", [("评审意见", "意见一"), ("当前内容", "草稿一")], "大纲")
+    second = builder.build("请修改。", [("评审意见", "意见二"), ("当前内容", "草稿二")], "大纲")
+
+    prefix = builder.prefix("大纲") + "\n\n请修改。"
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert first.index("大纲") < first.index("意见一") < first.index("草稿一")
+
+
+def test_prefix_without_setting_or_outline():
+    """测试没有故事设定和大纲时只输出任务说明和内容"""
+    builder = PromptBuilder()
+    assert builder.prefix() == ""
+    assert builder.build("请润色。", [("待润色内容", "正文")]) == "请润色。\n\n待润色内容：\n正文"
+
+
+def test_cached_prompt_tokens_formats():
+    """测试读取不同服务端返回的缓存命中token数"""
+    assert cached_prompt_tokens({"prompt_cache_hit_tokens": 80}) == 80
+    assert cached_prompt_tokens({"prompt_tokens_details": {"cached_tokens": 64}}) == 64
+    assert cached_prompt_tokens({"prompt_tokens": 100}) is None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import pytest
+from novelist.core.proofreader import ChineseProofreader, format_issues
+
+
+@pytest.fixture
+def proofreader():
+    """使用默认词典创建校对引擎"""
+    return ChineseProofreader.from_config()
+
+
+def _types(result):
+    return {issue["type"] for issue in result["issues"]}
+
+
+def test_normalizes_punctuation_width(proofreader):
+    """测试中文语境中的半角标点转全角、全角字母数字转半角"""
+    result = proofreader.proofread("他说,我们到了.你好吗?(注意)等一下...编号ＡＢ１２")
+    assert result["text"] == "他说，我们到了。你好吗？（注意）等一下……编号AB12"
+    assert result["unresolved"] == 0
+
+
+def test_keeps_ascii_context(proofreader):
+    """测试不改动英文和数字中的半角标点"""
+    text = "版本3.14发布，网址是abc.com，Hello, world!"
+    assert proofreader.proofread(text)["text"] == text
+
+
+def test_reports_duplicated_chars_with_exceptions(proofreader):
+    """测试重复虚字只报告不修正，合法叠词不报告"""
+    text = "这是我的的朋友，事情不了了之，哈哈哈哈。"
+    result = proofreader.proofread(text)
+    assert result["text"] == text
+    assert "重复字" in _types(result)
+    assert [issue["text"] for issue in result["issues"]] == ["的的"]
+    assert result["unresolved"] == 1
+
+
+def test_duplicated_words_reported_not_removed(proofreader):
+    """测试重复词语只报告，交给编辑判断"""
+    text = "我们一起讨论这个计划书计划书，再研究研究。"
+    result = proofreader.proofread(text)
+    assert result["text"] == text
+    assert result["fixed"] == 0
+    assert result["unresolved"] == 2
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "要以经济建设为中心",
+        "的的确确",
+        "从从容容",
+        "一把把钥匙",
+        "对不起对不起",
+        "救命啊救命啊",
+        "一个人一个人地",
+        "把素材拼凑和整理",
+    ],
+)
+def test_valid_chinese_is_not_rewritten(proofreader, text):
+    """测试合法的重叠和包含易混淆写法的正常用词不被改写"""
+    assert proofreader.proofread(text)["text"] == text
+
+
+def test_aabb_reduplication_not_reported(proofreader):
+    """测试AABB式重叠不报告为重复字"""
+    assert proofreader.proofread("的的确确，从从容容")["issues"] == []
+
+
+def test_confusable_dictionary(proofreader):
+    """测试易混淆字词：无歧义的直接修正，有歧义的只报告"""
+    result = proofreader.proofread("他以经迫不急待地出发了。")
+    assert result["text"] == "他以经迫不及待地出发了。"
+    assert result["fixed"] == 1
+    assert result["unresolved"] == 1
+    assert "以经（建议：已经）" in format_issues(result["issues"])
+
+
+def test_exceptions_protect_confusables():
+    """测试与例外词重叠的易混淆写法不修正"""
+    proofreader = ChineseProofreader(confusables={"帐号": "账号"}, exceptions=["记帐号码"])
+    assert proofreader.proofread("记帐号码")["text"] == "记帐号码"
+
+
+def test_custom_confusables():
+    """测试自定义词典"""
+    proofreader = ChineseProofreader(confusables={"帐号": "账号"})
+    assert proofreader.proofread("请输入帐号")["text"] == "请输入账号"
+
+
+def test_unbalanced_quotes_reported(proofreader):
+    """测试引号括号不配对只报告不修正"""
+    result = proofreader.proofread("“你来了吗？他问。（这是注释")
+    assert result["unresolved"] == 2
+    assert "引号括号不配对" in format_issues(result["issues"])
+    assert proofreader.proofread("“你来了？”（注释）")["unresolved"] == 0
+
+
+def test_long_novel_performance(proofreader):
+    """测试20万字长文的校对耗时"""
+    text = "林晓月站在海边,望着远处的灯塔。她以经等了很久。“你来了？”陈志远问。\n" * 6000
+    start = time.perf_counter()
+    result = proofreader.proofread(text)
+    elapsed = time.perf_counter() - start
+    assert len(text) > 200000
+    assert result["fixed"] == 6000
+    assert result["unresolved"] == 6000
+    assert elapsed < 0.5
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+import pytest
+
+from novelist.core.quality_metrics import QualityMetrics
+
+NARRATION = "林晓月走在海边，风吹起她的长发。她想起了很多年前那个炎热的夏天！"
+DIALOGUE = "“你还记得吗？”陈志远问。她没有回答，只是看着远处的灯塔。"
+
+
+def _novel(paragraphs=5000, seed=0):
+    rng = random.Random(seed)
+    chars = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    parts = []
+    for i in range(paragraphs):
+        if i % 100 == 0:
+            parts.append(f"第{i // 100 + 1}章")
+        body = "".join(rng.choices(chars, k=rng.randint(60, 220)))
+        parts.append(f"“{body[:20]}。”{body[20:]}。")
+    return "\n\n".join(parts)
+
+
+def test_measure_basic_metrics():
+    """测试段落、句子、对白和标点统计，章节标题不计入正文"""
+    report = QualityMetrics().measure(f"第一章 海边\n\n{NARRATION}\n\n{DIALOGUE}")
+    metrics = report["metrics"]
+    assert metrics["paragraphs"] == 2
+    assert metrics["chars"] == 29 + 23
+    assert metrics["sentences"] == 5
+    # 对白只有引号内的“你还记得吗”
+    assert metrics["dialogue_ratio"] == pytest.approx(5 / 52, abs=1e-3)
+    assert metrics["punctuation_density"] == pytest.approx(100 * 9 / 52, abs=0.01)
+    assert metrics["paragraph_median"] == 26
+
+
+def test_unclosed_quote_does_not_leak_into_next_paragraph():
+    """测试未闭合的引号只影响所在段落"""
+    report = QualityMetrics().measure("“你好\n\n今天天气很好。")
+    assert report["metrics"]["dialogue_ratio"] == pytest.approx(2 / 8, abs=1e-3)
+
+
+def test_prefilter_rejects_short_and_repetitive_drafts():
+    """测试预检：过短、复读和没有设定人物的草稿不通过"""
+    metrics = QualityMetrics(characters=["林晓月", "陈志远"], min_chars=20)
+    assert not metrics.measure("林晓月笑了。")["passed"]
+
+    looping = metrics.measure("\n\n".join([NARRATION] * 200))
+    assert looping["metrics"]["lexical_diversity"] < 0.25
+    assert "词汇多样性过低" in looping["issues"][0]
+
+    assert "没有出现任何设定中的人物" in metrics.measure(
+        "海浪一遍遍拍打着礁石，远处的灯塔在暮色里亮起了第一束光。"
+    )["issues"][0]
+
+    report = metrics.measure(f"{NARRATION}\n\n{DIALOGUE}")
+    assert report["passed"]
+    assert report["missing"] == []
+
+
+def test_seed_keyword_coverage():
+    """测试从故事种子读取人物和关键场景并统计覆盖率"""
+    seed = {
+        "characters": [{"name": "林晓月"}, {"name": "苏晴"}],
+        "plot_elements": {"key_scenes": ["海边初遇", "雨夜告别"]},
+    }
+    report = QualityMetrics.from_seed(seed).measure(f"{NARRATION}在海边相遇。")
+    assert report["metrics"]["character_coverage"] == 0.5
+    assert report["metrics"]["scene_coverage"] == 0.5
+    assert report["missing"] == ["苏晴", "雨夜告别"]
+    summary = QualityMetrics.summary(report)
+    assert "未出现的人物或关键场景：苏晴、雨夜告别" in summary
+
+
+def test_empty_text():
+    """测试空文本"""
+    report = QualityMetrics().measure("")
+    assert report["metrics"]["chars"] == 0
+    assert not report["passed"]
+    assert QualityMetrics.summary(report)
+
+
+def test_full_novel_scored_quickly():
+    """测试整部小说（约70万字）的统计耗时"""
+    text = _novel()
+    metrics = QualityMetrics(characters=["林晓月"], key_scenes=["海边初遇"])
+    metrics.measure(text)
+    start = time.perf_counter()
+    report = metrics.measure(text)
+    elapsed = time.perf_counter() - start
+    assert report["metrics"]["paragraphs"] == 5000
+    assert report["metrics"]["lexical_diversity"] > 0.9
+    assert elapsed < 0.1
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+import pytest
+
+from novelist.core.repetition import MinHasher, RepetitionDetector
+
+A = "林晓月走在海边，风吹起她的长发，她想起了很多年前那个炎热的夏天。"
+B = "陈志远在远处看着她，心里盘算着公司明天就要发布的那款新产品。"
+C = "海浪一遍遍拍打着礁石，远处的灯塔在暮色里亮起了第一束光。"
+
+
+def _random_paragraphs(count, length=80, seed=0):
+    rng = random.Random(seed)
+    chars = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    return ["".join(rng.choices(chars, k=length)) for _ in range(count)]
+
+
+def test_minhash_similarity_tracks_jaccard():
+    """测试MinHash签名的相同比例近似Jaccard相似度"""
+    hasher = MinHasher(num_perm=128)
+    same = np.mean(hasher.signature(A) == hasher.signature(A))
+    close = np.mean(hasher.signature(A) == hasher.signature(A[:-6] + "秋天。"))
+    different = np.mean(hasher.signature(A) == hasher.signature(B))
+    assert same == 1.0
+    assert 0.6 < close < 1.0
+    assert different < 0.1
+
+
+def test_add_detects_near_duplicates():
+    """测试只差标点或个别字的段落视为重复"""
+    detector = RepetitionDetector()
+    assert detector.add(A) is None
+    assert detector.add(B) is None
+    assert detector.add(A.replace("，", " ")) == 0
+    assert detector.add("林晓月走在海边，风吹起她的长发，她想起了很多年前那个炎热的夏日。") == 0
+    assert detector.add(C) is None
+    assert detector.repeats == 2
+    assert detector.ratio == pytest.approx(2 / 5, abs=0.05)
+
+
+def test_short_paragraphs_are_ignored():
+    """测试简短对白不参与检测"""
+    detector = RepetitionDetector()
+    for _ in range(5):
+        assert detector.add("“好。”") is None
+    assert detector.paragraphs == 0
+    assert detector.ratio == 0.0
+
+
+def test_no_false_positives_on_distinct_paragraphs():
+    """测试大量不同段落不会被误判"""
+    detector = RepetitionDetector()
+    assert all(detector.add(p) is None for p in _random_paragraphs(2000))
+    assert detector.repeats == 0
+
+
+def test_trim_keeps_first_occurrence():
+    """测试删除重复段落，保留首次出现的段落和空行"""
+    detector = RepetitionDetector()
+    text = f"第一章 海边\n{A}\n\n{B}\n\n{A}\n\n{C}\n\n{B}"
+    trimmed, removed = detector.trim(text)
+    assert removed == 2
+    assert trimmed == f"第一章 海边\n{A}\n\n{B}\n\n{C}"
+    assert RepetitionDetector().trim(trimmed) == (trimmed, 0)
+
+
+def test_feed_detects_loop_while_streaming():
+    """测试流式输入时发现复读"""
+    detector = RepetitionDetector(max_ratio=0.3, min_repeats=3)
+    stream = "\n".join([A, B, C] + [B, C] * 5)
+    chunks = [stream[i : i + 7] for i in range(0, len(stream), 7)]
+    consumed = 0
+    for chunk in chunks:
+        consumed += len(chunk)
+        if detector.feed(chunk):
+            break
+    assert detector.degenerate
+    assert consumed < len(stream) * 0.6
+    assert detector.streamed_text() == "\n".join([A, B, C])
+
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        RepetitionDetector(num_perm=64, bands=10)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.section_cache import SectionScoreCache, section_key
+
+
+def test_section_key_depends_on_outline_and_text():
+    """测试缓存键同时取决于大纲和正文"""
+    key = section_key("大纲", "正文")
+    assert key == section_key("大纲", "正文")
+    assert key != section_key("大纲", "正文改")
+    assert key != section_key("大纲改", "正文")
+
+
+def test_cache_hit_and_miss_stats():
+    """测试命中统计"""
+    cache = SectionScoreCache()
+    assert cache.get("a") is None
+    cache.put("a", 85, "很好")
+    assert cache.get("a") == (85, "很好")
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_cache_evicts_least_recently_used():
+    """测试超出容量时淘汰最久未使用的条目"""
+    cache = SectionScoreCache(max_entries=2)
+    cache.put("a", 1, "")
+    cache.put("b", 2, "")
+    cache.get("a")
+    cache.put("c", 3, "")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert len(cache) == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from novelist.core.sections import split_sections, join_sections
+
+
+def test_split_sections_by_chapter_heading():
+    """测试按章节标题切分"""
+    text = "月光下的承诺\n第一章 海边初遇\n内容一\n第二章 合作\n内容二\n第10章 结局\n内容三"
+    sections = split_sections(text)
+    assert len(sections) == 3
+    # 标题前的内容并入第一章
+    assert sections[0].startswith("月光下的承诺")
+    assert sections[1].startswith("第二章")
+    assert sections[2].endswith("内容三")
+
+
+def test_split_sections_without_heading():
+    """测试没有章节标题时返回全文"""
+    assert split_sections("只有一段内容") == ["只有一段内容"]
+    assert split_sections("") == []
+
+
+def test_join_sections_roundtrip():
+    """测试章节合并"""
+    sections = ["第一章\n内容一", "第二章\n内容二"]
+    assert split_sections(join_sections(sections)) == sections
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "## 人物设定\n林晓月\n\n## 故事背景\n海边小城",
+        "第二节课我不去了。\n第三回合他输了。",
+        "第一章写得太长了，我们删掉一半。",
+        "第二节 他说：我不去了。",
+    ],
+)
+def test_non_heading_lines_do_not_split(text):
+    """测试普通Markdown标题和以“第X节”开头的正文不切分章节"""
+    assert split_sections(text) == [text]
+
+
+def test_heading_variants():
+    """测试带Markdown符号、冒号或没有标题名的章节标题"""
+    text = "## 第一章：初遇\n内容一\n第二章\n内容二\n　Chapter 3 The End\n内容三"
+    assert [section.split("\n")[0] for section in split_sections(text)] == [
+        "## 第一章：初遇",
+        "第二章",
+        "　Chapter 3 The End",
+    ]
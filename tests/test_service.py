@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+from novelist.core.budget import RunBudget
+from novelist.core.workflow import WorkflowManager
+from novelist.service import NovelService, create_app
+
+
+class _StubAgent:
+    """流式输出固定内容的桩Agent，可以用事件阻塞执行"""
+
+    def __init__(self, content, gate=None):
+        self.content = content
+        self.gate = gate
+
+    async def execute(self, context):
+        if self.gate is not None:
+            await self.gate.wait()
+        on_token = context.get("on_token")
+        if on_token is not None:
+            for chunk in (self.content[:2], self.content[2:]):
+                on_token(chunk)
+        return {"content": self.content}
+
+
+def _stub_agents(gate=None):
+    def factory():
+        return {
+            "creator": _StubAgent("故事大纲", gate),
+            "writer": _StubAgent("故事内容"),
+            "supervisor": _StubAgent("分数：90\n建议：很好"),
+            "editor": _StubAgent("润色后的内容"),
+        }
+
+    return factory
+
+
+@pytest.fixture
+def story_seed():
+    return {
+        "title": "测试故事",
+        "theme": "友情",
+        "settings": {"time": "现代", "location": "城市", "season": "夏天"},
+        "style_preferences": {"tone": "温暖", "pacing": "平缓", "narrative": "第三人称"},
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_draft_files(monkeypatch):
+    monkeypatch.setattr(WorkflowManager, "_save_draft", lambda self, draft: "")
+
+
+@pytest_asyncio.fixture
+async def make_client():
+    clients = []
+
+    async def make(service):
+        client = TestClient(TestServer(create_app(service)))
+        await client.start_server()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        await client.close()
+
+
+async def _wait_status(client, job_id, status):
+    for _ in range(200):
+        body = await (await client.get(f"/jobs/{job_id}")).json()
+        if body["status"] == status:
+            return body
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"任务未进入{status}状态: {body}")
+
+
+@pytest.mark.asyncio
+async def test_job_lifecycle_with_sse_and_artifacts(make_client, story_seed):
+    """测试提交任务、SSE进度推送和获取产出"""
+    client = await make_client(NovelService(_stub_agents(), workers=1))
+
+    response = await client.post("/jobs", json=story_seed)
+    assert response.status == 202
+    job_id = (await response.json())["id"]
+
+    events_response = await client.get(f"/jobs/{job_id}/events")
+    assert events_response.headers["Content-Type"] == "text/event-stream"
+    events = []
+    for block in (await events_response.text()).strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+
+    names = [name for name, _ in events]
+    assert names[0] == "status" and events[-1][1]["status"] == "succeeded"
+    assert ("token", {"agent": "writer", "text": "故事"}) in events
+    assert ("score", {"score": 90.0, "revision": 0}) in events
+    assert "run_start" in names and names.count("run_end") == 1
+    assert "stage_start" in names and "stage_end" in names
+
+    # 按draft事件的增量逐版还原草稿，最后一版就是最终作品
+    chapters = []
+    for name, data in events:
+        if name == "draft":
+            assert data["base"] == (data["version"] - 1 if chapters else None)
+            chapters = [chapters[i] if isinstance(i, int) else i for i in data["chapters"]]
+    assert "\n".join(chapters) == "润色后的内容"
+
+    body = await _wait_status(client, job_id, "succeeded")
+    assert "final_draft.txt" in body["artifacts"]
+    draft = await client.get(f"/jobs/{job_id}/artifacts/final_draft.txt")
+    assert await draft.text() == "润色后的内容"
+    report = await (await client.get(f"/jobs/{job_id}/artifacts/report.json")).json()
+    assert report["budget"]["calls"] > 0
+
+
+@pytest.mark.asyncio
+async def test_admission_control(make_client, story_seed):
+    """测试种子校验和队列满时拒绝任务"""
+    gate = asyncio.Event()
+    service = NovelService(_stub_agents(gate), queue_size=1, workers=1)
+    client = await make_client(service)
+
+    assert (await client.post("/jobs", json={"title": "缺少字段"})).status == 400
+    assert (await client.post("/jobs", data="不是JSON")).status == 400
+
+    running = await (await client.post("/jobs", json=story_seed)).json()
+    await _wait_status(client, running["id"], "running")
+    assert (await client.post("/jobs", json=story_seed)).status == 202
+    rejected = await client.post("/jobs", json=story_seed)
+    assert rejected.status == 429
+    assert rejected.headers["Retry-After"] == "30"
+
+    gate.set()
+    await _wait_status(client, running["id"], "succeeded")
+    assert (await client.get("/jobs/unknown")).status == 404
+
+
+@pytest.mark.asyncio
+async def test_graceful_drain(story_seed, monkeypatch):
+    """测试关闭时不再接收任务，并等待已接收的任务完成"""
+    gate = asyncio.Event()
+    service = NovelService(_stub_agents(gate), workers=1, drain_timeout=5)
+    await service.start()
+    job = service.submit(story_seed)
+    await asyncio.sleep(0.01)
+
+    shutdown = asyncio.create_task(service.shutdown())
+    await asyncio.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        service.submit(story_seed)
+    assert not shutdown.done()
+
+    gate.set()
+    await shutdown
+    assert job.status == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_batch_budget_shared_across_jobs(make_client, story_seed):
+    """测试所有任务的用量计入共享的批量预算，耗尽后拒绝新任务"""
+    budget = RunBudget(max_tokens=1)
+    client = await make_client(NovelService(_stub_agents(), workers=1, batch_budget=budget))
+
+    job_id = (await (await client.post("/jobs", json=story_seed)).json())["id"]
+    for _ in range(200):
+        body = await (await client.get(f"/jobs/{job_id}")).json()
+        if body["status"] in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(0.01)
+
+    assert budget.calls > 0
+    health = await (await client.get("/health")).json()
+    assert health["budget"]["status"] == "exhausted"
+    rejected = await client.post("/jobs", json=story_seed)
+    assert rejected.status == 503
+    assert "批量预算" in (await rejected.json())["error"]
+
+
+@pytest.mark.asyncio
+async def test_batch_budget_resets_after_window(make_client, story_seed, monkeypatch):
+    """测试批量预算在统计窗口结束后清空，耗时上限不会按服务运行时长一直累计"""
+    monkeypatch.setenv("SERVICE_BATCH_WINDOW", "60")
+    budget = RunBudget(max_seconds=0.01)
+    service = NovelService(_stub_agents(), workers=1, batch_budget=budget)
+    client = await make_client(service)
+
+    budget.start()
+    await asyncio.sleep(0.02)
+    assert budget.status() == "exhausted"
+    rejected = await client.post("/jobs", json=story_seed)
+    assert rejected.status == 503
+
+    service._batch_window_start -= 60
+    accepted = await client.post("/jobs", json=story_seed)
+    assert accepted.status == 202
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire(make_client, story_seed, monkeypatch):
+    """测试已结束任务超过保留时间或数量上限后被清理，错误的Last-Event-ID返回400"""
+    monkeypatch.setenv("SERVICE_MAX_FINISHED_JOBS", "1")
+    service = NovelService(_stub_agents(), workers=1)
+    client = await make_client(service)
+
+    first = (await (await client.post("/jobs", json=story_seed)).json())["id"]
+    await _wait_status(client, first, "succeeded")
+    response = await client.get(
+        f"/jobs/{first}/events", headers={"Last-Event-ID": "不是数字"}
+    )
+    assert response.status == 400
+
+    second = (await (await client.post("/jobs", json=story_seed)).json())["id"]
+    await _wait_status(client, second, "succeeded")
+    third = (await (await client.post("/jobs", json=story_seed)).json())["id"]
+    # 只保留最近结束的一个任务
+    assert (await client.get(f"/jobs/{first}")).status == 404
+    assert (await client.get(f"/jobs/{second}")).status == 200
+
+    service.job_ttl = 0
+    await _wait_status(client, third, "succeeded")
+    service._prune_jobs()
+    assert service.jobs == {}
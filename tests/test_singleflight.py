@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import pytest
+
+from novelist.core.singleflight import SingleFlight, coalescable, request_key
+
+
+def test_request_key_normalizes_whitespace():
+    """测试请求键忽略空白差异，但区分Agent类型和模型配置"""
+    key = request_key("creator", "写一个故事\n  关于龙", {"model": "a"})
+    assert key == request_key("creator", " 写一个故事 关于龙 ", {"model": "a"})
+    assert key != request_key("supervisor", "写一个故事 关于龙", {"model": "a"})
+    assert key != request_key("creator", "写一个故事 关于龙", {"model": "b"})
+    assert key != request_key("creator", "写一个故事 关于龙", {"model": "a", "temperature": 0})
+    assert request_key("creator", "写", {"seed": 1}) != request_key("creator", "写", {"seed": 2})
+
+
+def test_only_reproducible_sampling_is_coalescable():
+    """测试只有temperature为0或固定seed的请求可以合并"""
+    assert coalescable({"temperature": 0})
+    assert coalescable({"temperature": 0.7, "seed": 0})
+    assert not coalescable({"temperature": 0.7})
+    assert not coalescable({})
+    assert not coalescable(None)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_request():
+    """测试同时进行的相同请求只发出一次上游调用"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def upstream(emit):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"content": "大纲"}
+
+    results = await asyncio.gather(
+        *(flight.do("key", upstream) for _ in range(3))
+    )
+
+    assert calls == 1
+    assert [result for result, _ in results] == [{"content": "大纲"}] * 3
+    assert [leader for _, leader in results] == [True, False, False]
+    assert flight.stats() == {"leaders": 1, "coalesced": 2, "inflight": 0}
+
+    # 请求完成后不保留结果，再次调用会重新发出请求
+    await flight.do("key", upstream)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_late_joiner_replays_stream():
+    """测试后加入的调用者先回放已收到的流式片段"""
+    flight = SingleFlight()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def upstream(emit):
+        emit("第一")
+        started.set()
+        await release.wait()
+        emit("第二")
+        return "第一第二"
+
+    first_chunks, late_chunks = [], []
+    first = asyncio.ensure_future(flight.do("key", upstream, first_chunks.append))
+    await started.wait()
+    late = asyncio.ensure_future(flight.do("key", upstream, late_chunks.append))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert (await first)[0] == (await late)[0] == "第一第二"
+    assert first_chunks == late_chunks == ["第一", "第二"]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_keeps_shared_request():
+    """测试单个调用者取消不影响其他调用者，全部取消后才取消上游请求"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def upstream(emit):
+        await release.wait()
+        return "结果"
+
+    leader = asyncio.ensure_future(flight.do("key", upstream))
+    follower = asyncio.ensure_future(flight.do("key", upstream))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await follower == ("结果", False)
+
+    cancelled = []
+
+    async def slow(emit):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    only = asyncio.ensure_future(flight.do("other", slow))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert flight.stats()["inflight"] == 0
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import pytest
+
+from novelist.core.stage_graph import StageGraph, compile_condition
+
+
+def test_compile_condition():
+    """测试转移条件支持数字、状态变量和and连接"""
+    condition = compile_condition("score >= threshold and editing_left > 0")
+    assert condition({"score": 85, "threshold": 80, "editing_left": 1})
+    assert not condition({"score": 85, "threshold": 80, "editing_left": 0})
+    assert not condition({"threshold": 80, "editing_left": 1})
+    assert compile_condition(None)({})
+    with pytest.raises(ValueError, match="无法解析"):
+        compile_condition("__import__('os')")
+
+
+def test_unknown_target_rejected():
+    """测试转移到未声明的阶段时报错"""
+    with pytest.raises(ValueError, match="未知阶段"):
+        StageGraph.from_dict(
+            {"start": ["a"], "stages": {"a": {"transitions": [{"to": "b"}]}}}
+        )
+
+
+@pytest.mark.asyncio
+async def test_ready_stages_run_in_parallel_and_join():
+    """测试并行分支同时执行，汇合阶段等待全部前置阶段完成"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["plan"],
+            "stages": {
+                "plan": {"transitions": [{"to": ["left", "right"]}]},
+                "left": {},
+                "right": {},
+                "merge": {"after": ["left", "right"]},
+            },
+        }
+    )
+    active = 0
+    peak = 0
+
+    async def branch(state):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return {}
+
+    async def plan(state):
+        return {"planned": True}
+
+    async def merge(state):
+        return {"merged": True}
+
+    state = await graph.run(
+        {"plan": plan, "left": branch, "right": branch, "merge": merge}
+    )
+
+    assert peak == 2
+    assert state["trace"][0] == "plan" and state["trace"][-1] == "merge"
+    assert state["merged"] and state["end_reason"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_group_concurrency_limit():
+    """测试分组并发上限"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["a", "b", "c"],
+            "concurrency": {"llm": 1},
+            "stages": {name: {"group": "llm"} for name in ("a", "b", "c")},
+        }
+    )
+    active = 0
+    peak = 0
+
+    async def work(state):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.005)
+        active -= 1
+
+    state = await graph.run({"a": work, "b": work, "c": work})
+    assert peak == 1
+    assert state["trace"] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_retry_edge_and_max_visits():
+    """测试按评分转移的重试边，以及最大执行次数限制"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["attempt"],
+            "stages": {
+                "attempt": {
+                    "max_visits": 3,
+                    "transitions": [
+                        {"when": "score >= 80", "to": "end"},
+                        {"to": "attempt"},
+                    ],
+                }
+            },
+        }
+    )
+    scores = iter([50, 70, 90])
+
+    async def attempt(state):
+        return {"score": next(scores)}
+
+    state = await graph.run({"attempt": attempt})
+    assert state["trace"] == ["attempt"] * 3
+    assert "结束" in state["end_reason"]
+    assert not state["interrupted"]
+
+    always_low = iter([10] * 5)
+
+    async def failing(state):
+        return {"score": next(always_low)}
+
+    state = await graph.run({"attempt": failing})
+    assert state["visits"]["attempt"] == 3
+    assert "最大执行次数" in state["end_reason"]
+    assert state["interrupted"]
+
+
+@pytest.mark.asyncio
+async def test_max_steps_ends_run_without_raising():
+    """测试超过最大执行步数时结束运行并取消仍在执行的阶段，而不是抛出异常"""
+    graph = StageGraph.from_dict(
+        {
+            "start": ["loop", "slow"],
+            "max_steps": 5,
+            "stages": {
+                "loop": {"transitions": [{"to": "loop"}]},
+                "slow": {},
+            },
+        }
+    )
+    cancelled = False
+
+    async def loop(state):
+        await asyncio.sleep(0)
+        return {}
+
+    async def slow(state):
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    state = await graph.run({"loop": loop, "slow": slow})
+    assert state["interrupted"]
+    assert "最大执行步数" in state["end_reason"]
+    assert sum(state["visits"].values()) == 5
+    assert cancelled
+
+
+def test_default_config_loads():
+    """测试默认阶段图配置可以加载"""
+    graph = StageGraph.from_config()
+    assert graph.start == ["outline"]
+    assert "evaluate" in graph.stages
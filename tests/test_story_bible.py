@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from novelist.core.story_bible import StoryBible
+
+
+SEED = {
+    "settings": {"time": "现代", "location": "上海", "season": "秋季"},
+    "characters": [
+        {
+            "name": "林晓月",
+            "role": "主角",
+            "age": 24,
+            "occupation": "设计师",
+            "traits": ["独立", "追求梦想"],
+            "background": "从小城来到上海打拼",
+        },
+        {"name": "陈默", "role": "男主角"},
+    ],
+}
+
+
+def _chapter(number: int) -> str:
+    return f"第{number}章 标题{number}\n开头{number}。中间{number}。结尾{number}！"
+
+
+def test_render_characters_and_facts():
+    """测试从故事种子生成人物和既定事实"""
+    bible = StoryBible(SEED)
+    bible.add_fact("林晓月对猫过敏")
+    bible.add_fact("林晓月对猫过敏")
+    text = bible.render()
+    assert "- 林晓月（主角，24岁，设计师）：独立、追求梦想；从小城来到上海打拼" in text
+    assert "- 陈默（男主角）" in text
+    assert "- 地点：上海" in text
+    assert text.count("对猫过敏") == 1
+
+
+def test_summarize_keeps_heading_first_and_last_sentence():
+    """测试抽取式摘要"""
+    title, summary = StoryBible.summarize(_chapter(1))
+    assert title == "第1章 标题1"
+    assert summary == "开头1。…结尾1！"
+
+    _, clipped = StoryBible.summarize("很长的一句话" * 50, limit=20)
+    assert len(clipped) == 20
+
+
+def test_render_size_is_bounded():
+    """测试章节增多后故事圣经的长度保持有界"""
+    bible = StoryBible(SEED, recent_chapters=3, max_titles=5)
+    for index in range(10):
+        bible.record_chapter(index, _chapter(index + 1))
+    small = len(bible.render())
+    for index in range(10, 200):
+        bible.record_chapter(index, _chapter(index + 1))
+    text = bible.render()
+
+    assert len(text) < small * 1.5
+    assert "此前还有192章" in text
+    assert "第197章 标题197" in text
+    assert "第198章 标题198：开头198。…结尾198！" in text
+    assert "开头197。" not in text
+
+
+def test_render_before_and_window():
+    """测试只包含指定章节之前的摘要，以及前一章结尾窗口"""
+    bible = StoryBible(window_chars=4)
+    bible.record_chapter(0, _chapter(1))
+    bible.record_chapter(1, _chapter(2))
+
+    assert "标题2" not in bible.render(before=1)
+    assert "标题1" in bible.render(before=1)
+    assert bible.window(1) == "结尾1！"
+    assert bible.window(0) is None
+    assert bible.window(5) is None
+
+
+def test_record_chapter_overwrites_and_defaults_title():
+    """测试重复记录同一章时覆盖，没有标题时使用章节序号"""
+    bible = StoryBible()
+    bible.record_chapter(2, "旧内容。")
+    bible.record_chapter(2, "新内容。")
+    assert bible.chapters[2]["title"] == "第3章"
+    assert bible.chapters[2]["summary"] == "新内容。"
+
+
+def test_unchanged_tracks_recorded_text():
+    """测试已记录章节的文本改动后不再视为已通过"""
+    bible = StoryBible(SEED)
+    bible.record_chapter(0, _chapter(1) + "\n")
+    assert bible.unchanged(0, _chapter(1))
+    assert not bible.unchanged(0, _chapter(1).replace("中间", "其间"))
+    assert not bible.unchanged(1, _chapter(2))
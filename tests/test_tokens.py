@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+import pytest
+
+from novelist.core.llm_factory import LLMFactory
+from novelist.core.tokens import FEATURES, TokenEstimator, text_features
+
+
+def _column(name):
+    return FEATURES.index(name)
+
+
+def test_features_by_character_class():
+    """测试按码点类别统计特征"""
+    features = text_features(["你好，world 123!", "", "abc", None])
+    first = dict(zip(FEATURES, features[0]))
+    assert first["cjk"] == 2
+    assert first["cjk_punct"] == 1
+    assert first["words"] == 2
+    assert first["word_chars"] == 8
+    assert first["punct"] == 1
+    assert first["space"] == 1
+    assert first["base"] == 1
+    assert features[1, : _column("base")].sum() == 0
+    assert features[2, _column("words")] == 1
+
+
+def test_words_do_not_span_texts():
+    """测试相邻文本的单词不会被连成一个"""
+    features = text_features(["abc", "def", "ghi jk"])
+    assert list(features[:, _column("words")]) == [1, 1, 2]
+
+
+def test_batch_matches_single_estimates():
+    """测试批量估算与逐条估算一致"""
+    estimator = TokenEstimator()
+    texts = ["第一章 春天\n她推开窗。", "", "Hello, 世界!", "🙂" * 3]
+    batch = estimator.estimate_batch(texts)
+    assert list(batch) == [estimator.estimate(text) for text in texts]
+    assert batch[1] == 0
+    assert estimator.estimate(None) == 0
+
+
+def test_refit_recovers_true_weights():
+    """测试根据真实用量重新拟合权重"""
+    rng = random.Random(7)
+    truth = {"cjk": 0.8, "cjk_punct": 1.0, "words": 1.3, "word_chars": 0.0,
+             "punct": 1.0, "space": 0.5, "other": 2.0, "base": 6.0}
+    weights = np.array([truth[name] for name in FEATURES])
+    estimator = TokenEstimator(refit_interval=40)
+    for _ in range(40):
+        text = "".join(
+            rng.choice(["春风", "。", "model ", "GPU", "!", "\n", "夜色很深"])
+            for _ in range(rng.randint(5, 40))
+        )
+        estimator.observe(text, int(round(text_features([text])[0] @ weights)))
+
+    calibration = estimator.calibration()
+    assert calibration["cjk"] == pytest.approx(0.8, abs=0.05)
+    assert calibration["base"] == pytest.approx(6.0, abs=1.0)
+    # 样本中没有出现的特征保持先验权重
+    assert calibration["other"] == pytest.approx(1.5, abs=0.01)
+    assert estimator.error() < 0.05
+
+
+def test_refit_needs_enough_samples():
+    """测试样本不足时不重新拟合"""
+    estimator = TokenEstimator({"cjk": 0.7})
+    estimator.observe("你好", 5)
+    assert not estimator.refit()
+    assert estimator.calibration()["cjk"] == 0.7
+
+
+def test_factory_estimator_uses_calibration_table(monkeypatch):
+    """测试工厂按校准表创建并缓存估算器"""
+    monkeypatch.setattr(LLMFactory, "_estimators", {})
+    estimator = LLMFactory.get_token_estimator("deepseek-chat-33b")
+    assert estimator is LLMFactory.get_token_estimator("deepseek-chat-33b")
+    assert estimator.calibration() == {
+        name: round(float(value), 4)
+        for name, value in LLMFactory.get_token_calibration(None).items()
+    }
+    assert estimator.estimate("你好世界") == 3
@@ -1,8 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
+import json
 import pytest
+from aiohttp import web
 from unittest.mock import Mock, patch, AsyncMock
+from novelist.core.budget import BudgetExhausted
+from novelist.core.deadline import DeadlineExceeded, RequestTimeout
+from novelist.core.pipeline import ChapterPipeline
+from novelist.core.best_of import CandidateRanker
+from novelist.core.fact_index import FactIndex
+from novelist.core.llm_factory import LLMFactory
+from novelist.core.quality_metrics import QualityMetrics
+from novelist.core.story_bible import StoryBible
 from novelist.core.workflow import WorkflowManager
 from novelist.agents.creator_agent import CreatorAgent
 from novelist.agents.writer_agent import WriterAgent
@@ -156,3 +167,1954 @@ async def test_missing_story_seed(mock_agents):
     """测试缺少故事种子时的错误处理"""
     with pytest.raises(ValueError, match="未找到故事种子配置"):
         await mock_agents.run_workflow()
+
+
+def _register_all(manager):
+    """注册全部Agent"""
+    manager.register_agent("creator", CreatorAgent())
+    manager.register_agent("writer", WriterAgent())
+    manager.register_agent("supervisor", SupervisorAgent())
+    manager.register_agent("editor", EditorAgent())
+    return manager
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_editing_hit(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：未达标时直接使用提前启动的编辑结果"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续润色"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "修改后的内容"
+    # 第一轮评分时已推测启动第二轮编辑，不会重复调用
+    assert mock_editor_execute.call_count == 2
+    metrics = manager.get_speculation_metrics()
+    assert metrics["launched"] == 1
+    assert metrics["hits"] == 1
+    assert metrics["hit_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_editing_cancelled_on_pass(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：评分达标时取消提前启动的编辑并统计浪费"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：90\n建议：很好"}
+
+    await manager.run_workflow()
+
+    metrics = manager.get_speculation_metrics()
+    assert metrics["launched"] == 1
+    assert metrics["misses"] == 1
+    assert metrics["hit_rate"] == 0.0
+    assert metrics["wasted_tokens"] > 0
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_writer_revision(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：编辑轮次将用完时提前启动写作者修改"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "2")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：60\n建议：继续修改"}
+
+    await manager.run_workflow()
+
+    # 第一轮修订的修改已推测完成，无需额外的复评调用
+    assert mock_writer_execute.call_count == 2
+    assert mock_supervisor_execute.call_count == 4
+    assert manager.speculation_stats["hits"] >= 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("change", ["wording", "score", "failing"])
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_writer_kept_unless_verdict_changes(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    change,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：评审意见只是措辞不同时采用推测的写作者修改，评分或偏离章节变化时作废"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "2")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    reviews = 0
+
+    def evaluate(context):
+        nonlocal reviews
+        reviews += 1
+        score = 40 if change == "score" and reviews % 2 else 60
+        failing = "偏离章节：1\n" if change == "failing" and reviews % 2 else ""
+        return {"content": f"分数：{score}\n{failing}建议：第{reviews}次评审的措辞"}
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    # 每轮编辑都会改动草稿，评审意见的措辞随之变化
+    mock_editor_execute.side_effect = lambda context: {
+        "content": _echo_editor(context)["content"] + "改"
+    }
+    mock_supervisor_execute.side_effect = evaluate
+
+    await manager.run_workflow()
+
+    revisions = [
+        call.args[0]["prompt"]
+        for call in mock_writer_execute.call_args_list
+        if "评审意见：" in call.args[0]["prompt"]
+    ]
+    if change == "wording":
+        # 第2次评审与推测所依据的第1次结论相同，直接采用，不再复评
+        assert manager.speculation_stats["misses"] == 0
+        assert len(revisions) == 1 and "第1次评审的措辞" in revisions[0]
+        assert reviews == 4
+    else:
+        # 结论变化：推测作废，复评后按最新意见修改
+        assert manager.speculation_stats["misses"] >= 1
+        assert "第3次评审的措辞" in revisions[-1]
+        assert reviews > 4
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_edit_does_not_proofread_draft_under_evaluation(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测编辑只校对副本：正在评分的草稿不被修改，推测结果仍然可以采用"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    monkeypatch.setenv("LOCAL_PROOFREAD", "true")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.side_effect = [{"content": "他说,我们到了"}, {"content": "润色稿"}]
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续润色"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    evaluated = mock_supervisor_execute.call_args_list[0].args[0]["prompt"]
+    assert "他说,我们到了" in evaluated
+    speculative = mock_editor_execute.call_args_list[1].args[0]["prompt"]
+    assert "他说，我们到了" in speculative
+    assert manager.speculation_stats["hits"] == 1
+    assert result["final_draft"] == "润色稿"
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_edit_discarded_when_assessment_changes_draft(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：评分前的设定修正改动了草稿时，基于修正前版本的推测编辑作废"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "1")
+    monkeypatch.setenv("FACT_CHECK", "true")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "林晓月"}]
+    manager.update_context({"story_seed": seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "林晓月来到海边。林晓月笑了。林晓阅回头。"}
+
+    def edit(context):
+        if "设定冲突：" in context["prompt"]:
+            return {"content": "林晓月来到海边。林晓月笑了。林晓月回头。"}
+        return _echo_editor(context)
+
+    mock_editor_execute.side_effect = edit
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续润色"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "林晓月来到海边。林晓月笑了。林晓月回头。"
+    assert manager.speculation_stats["hits"] == 0
+    assert manager.speculation_stats["misses"] == 1
+    # 作废后基于修正后的版本重新编辑
+    assert "林晓阅" not in mock_editor_execute.call_args[0][0]["prompt"]
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_speculative_tasks_cancelled_when_run_fails(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试推测执行：工作流因异常中止时取消仍在进行的推测调用"""
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    cancelled = []
+
+    async def edit(context):
+        if mock_editor_execute.call_count > 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return {"content": "修改后的内容"}
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.side_effect = edit
+    mock_supervisor_execute.side_effect = RuntimeError("审核服务不可用")
+
+    with pytest.raises(RuntimeError):
+        await manager.run_workflow()
+
+    assert cancelled == [True]
+    assert manager._speculative_tasks == []
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_pipelined_chapter_workflow(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试按章节流水线执行工作流"""
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "第一章 初遇\n第二章 重逢"}
+    mock_writer_execute.return_value = {"content": "章节内容"}
+    mock_editor_execute.return_value = {"content": "润色后的章节"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["chapter_scores"] == [85, 85]
+    assert result["final_draft"] == "润色后的章节\n\n润色后的章节"
+    assert mock_writer_execute.call_count == 2
+    mock_save_draft.assert_called_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["legacy", "graph"])
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_pipeline_fallback_reuses_outline(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    engine,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试大纲无法按章节切分时，整体创作流程沿用已生成的大纲"""
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true")
+    monkeypatch.setenv("WORKFLOW_ENGINE", engine)
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "没有分章的大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "润色后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert mock_creator_execute.call_count == 1
+    assert "没有分章的大纲" in mock_writer_execute.call_args[0][0]["prompt"]
+    assert result["final_draft"] == "润色后的内容"
+
+
+_PIPELINE_OUTLINE = "第一章 初遇\n两人相遇\n第二章 重逢\n再次相见\n第三章 结局\n终成眷属"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", ["deadline", "budget"])
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_pipeline_interruption_keeps_accepted_chapters(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    limit,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试章节流水线因截止时间或预算中断时，以已通过的章节作为最终稿"""
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true")
+    if limit == "deadline":
+        monkeypatch.setenv("RUN_DEADLINE_SECONDS", "0.5")
+    else:
+        monkeypatch.setenv("RUN_TOKEN_BUDGET", "10000")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    async def write(context):
+        chapter = mock_writer_execute.call_count
+        if chapter == 3:
+            # 第三章：截止时间下挂起，预算下返回超出预算的用量
+            await asyncio.sleep(10 if limit == "deadline" else 0.1)
+            return {"content": "第三章 结局\n正文三", "usage": {"prompt_tokens": 20000}}
+        return {"content": f"第{'一二'[chapter - 1]}章\n正文{chapter}"}
+
+    mock_creator_execute.return_value = {"content": _PIPELINE_OUTLINE}
+    mock_writer_execute.side_effect = write
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await asyncio.wait_for(manager.run_workflow(), 5)
+
+    assert result["final_draft"] == "第一章\n正文1\n\n第二章\n正文2"
+    mock_save_draft.assert_called_once_with("第一章\n正文1\n\n第二章\n正文2")
+
+
+def _echo_editor(context):
+    """原样返回待润色内容的编辑"""
+    prompt = context["prompt"]
+    draft = prompt.split("待润色内容：\n", 1)[1]
+    return {"content": draft}
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_zero_score_rewrites_only_failing_sections(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    workflow_manager,
+    mock_agents,
+    mock_story_seed,
+):
+    """测试评分为0时只重写偏离大纲的章节"""
+    mock_creator_execute.return_value = {"content": "第一章 初遇\n第二章 重逢"}
+    mock_writer_execute.side_effect = [
+        {"content": "第一章 初遇\n正文一\n\n第二章 重逢\n跑题的正文"},
+        {"content": "第二章 重逢\n重写的正文"},
+    ]
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：0\n偏离章节：2\n建议：第二章跑题"},
+        {"content": "分数：85\n偏离章节：无\n建议：很好"},
+    ]
+    workflow_manager.update_context({"story_seed": mock_story_seed})
+
+    result = await workflow_manager.run_workflow()
+
+    assert result["final_draft"] == "第一章 初遇\n正文一\n\n第二章 重逢\n重写的正文"
+    # 大纲和第一章都没有重新生成
+    assert mock_creator_execute.call_count == 1
+    assert mock_writer_execute.call_count == 2
+    rewrite_prompt = mock_writer_execute.call_args_list[1].args[0]["prompt"]
+    assert "跑题的正文" in rewrite_prompt
+    assert "正文一" not in rewrite_prompt
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+async def test_evaluate_content_parses_failing_sections(
+    mock_execute, workflow_manager, mock_agents
+):
+    """测试解析评估意见中的偏离章节"""
+    mock_execute.return_value = {"content": "分数：0\n偏离章节：1, 3\n建议：重写"}
+    score, _ = await workflow_manager.evaluate_content("outline", "content")
+    assert score == 0
+    assert workflow_manager.last_failing_sections == [0, 2]
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+async def test_incremental_evaluation_rescores_changed_sections(
+    mock_execute, monkeypatch
+):
+    """测试增量评估只重新评估改动过的章节"""
+    monkeypatch.setenv("INCREMENTAL_EVALUATION", "true")
+    manager = _register_all(WorkflowManager())
+    mock_execute.return_value = {"content": "分数：80\n建议：不错"}
+
+    outline = "第一章 初遇\n第二章 重逢"
+    draft = "第一章 初遇\n正文一\n\n第二章 重逢\n正文二"
+    score, feedback = await manager.evaluate_content(outline, draft)
+    assert score == 80
+    assert mock_execute.call_count == 2
+    # 每章只发送对应的大纲
+    first_prompt = mock_execute.call_args_list[0].args[0]["prompt"]
+    assert "第二章 重逢" not in first_prompt
+
+    mock_execute.return_value = {"content": "分数：60\n建议：一般"}
+    edited = "第一章 初遇\n正文一\n\n第二章 重逢\n改过的正文二"
+    score, feedback = await manager.evaluate_content(outline, edited)
+    assert mock_execute.call_count == 3
+    assert 60 < score < 80
+    assert "分数：" in feedback.split("\n")[0]
+    assert manager.section_score_cache.hits == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+async def test_incremental_evaluation_zero_section(mock_execute, monkeypatch):
+    """测试任一章节为0分时总分为0并标记该章节"""
+    monkeypatch.setenv("INCREMENTAL_EVALUATION", "true")
+    manager = _register_all(WorkflowManager())
+    mock_execute.side_effect = [
+        {"content": "分数：90\n建议：很好"},
+        {"content": "分数：0\n建议：跑题"},
+    ]
+
+    score, _ = await manager.evaluate_content(
+        "第一章 初遇\n第二章 重逢", "第一章 初遇\n正文一\n\n第二章 重逢\n正文二"
+    )
+    assert score == 0
+    assert manager.last_failing_sections == [1]
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_fused_editing_trusts_confident_self_assessment(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试融合模式：自评远高于阈值时不再单独调用审核者"""
+    monkeypatch.setenv("FUSED_EDITING", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {
+        "content": "润色后的内容\n【自我评估】\n分数：95\n建议：很好"
+    }
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "润色后的内容"
+    mock_supervisor_execute.assert_not_called()
+    assert manager.fused_stats["self_assessed"] == 1
+    editor_prompt = mock_editor_execute.call_args.args[0]["prompt"]
+    assert "故事大纲" in editor_prompt and "【自我评估】" in editor_prompt
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_fused_editing_verifies_near_threshold(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试融合模式：自评接近阈值或缺失时由审核者复核"""
+    monkeypatch.setenv("FUSED_EDITING", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.side_effect = [
+        {"content": "润色一\n【自我评估】\n分数：82\n建议：还行"},
+        {"content": "润色二"},
+    ]
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：70\n建议：继续润色"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "润色二"
+    assert mock_supervisor_execute.call_count == 2
+    assert manager.fused_stats["self_assessed"] == 0
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_local_proofread_skips_editor_when_clean(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试本地校对修正后文本已干净时跳过LLM编辑"""
+    monkeypatch.setenv("LOCAL_PROOFREAD", "true")
+    monkeypatch.setenv("SKIP_EDITOR_WHEN_CLEAN", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "她必竟到了海边,看见了灯塔。"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "她毕竟到了海边，看见了灯塔。"
+    mock_editor_execute.assert_not_called()
+    assert manager.proofread_stats == {"fixed": 2, "skipped_editor": 1}
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_converged_edit_ends_editing_loop(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试编辑不再改动内容时提前结束编辑循环"""
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "1")
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "5")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：60\n建议：继续修改"}
+
+    await manager.run_workflow()
+
+    assert mock_editor_execute.call_count == 2
+    assert mock_supervisor_execute.call_count == 1
+    assert manager.convergence_stats["converged"] == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_score_plateau_ends_editing_loop(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试评分停滞时提前结束编辑循环"""
+    monkeypatch.setenv("MAX_REVISION_CYCLES", "1")
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "6")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.side_effect = [
+        {"content": f"第{i}版内容完全不同"} for i in range(6)
+    ]
+    mock_supervisor_execute.side_effect = [
+        {"content": f"分数：{score}\n建议：继续修改"} for score in (60, 61, 61)
+    ]
+
+    await manager.run_workflow()
+
+    assert mock_supervisor_execute.call_count == 3
+    assert manager.convergence_stats["plateaued"] == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_budget_exhaustion_finalizes_best_draft(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试预算耗尽时以评分最高的版本结束"""
+    monkeypatch.setenv("RUN_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    usage = {"prompt_tokens": 100, "completion_tokens": 50}
+    mock_creator_execute.return_value = {"content": "故事大纲", "usage": usage}
+    mock_writer_execute.return_value = {"content": "故事内容", "usage": usage}
+    mock_editor_execute.side_effect = [
+        {"content": "较好的版本", "usage": usage},
+        {"content": "较差的版本", "usage": usage},
+    ]
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：70\n建议：继续", "usage": usage},
+        {"content": "分数：50\n建议：变差了", "usage": usage},
+    ]
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "较好的版本"
+    assert result["budget"]["tokens"] == 900
+    assert result["budget"]["by_agent"]["supervisor"]["calls"] == 2
+    mock_save_draft.assert_called_once_with("较好的版本")
+
+
+@pytest.mark.parametrize("policy", ["finalize", "skip_optional", "downgrade"])
+def test_finalize_policy_stops_at_soft_limit(policy, monkeypatch):
+    """测试finalize策略超过软上限就结束（为进行中的调用留出余量），其他策略到硬上限才结束"""
+    monkeypatch.setenv("RUN_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("BUDGET_POLICY", policy)
+    manager = WorkflowManager()
+    manager.budget.record("writer", 850, 0)
+
+    if policy == "finalize":
+        with pytest.raises(BudgetExhausted):
+            manager._check_budget()
+    else:
+        manager._check_budget()
+
+    manager.budget.record("writer", 150, 0)
+    with pytest.raises(BudgetExhausted):
+        manager._check_budget()
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_budget_downgrade_policy_switches_model(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试downgrade策略在超过软上限后改用降级模型"""
+    monkeypatch.setenv("RUN_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("BUDGET_POLICY", "downgrade")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {
+        "content": "故事大纲",
+        "usage": {"prompt_tokens": 500, "completion_tokens": 350},
+    }
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    await manager.run_workflow()
+
+    writer_context = mock_writer_execute.call_args.args[0]
+    assert writer_context["llm_config"]["model"] == "deepseek-chat-33b"
+    assert "llm_config" not in mock_creator_execute.call_args.args[0]
+
+
+def test_unknown_budget_policy(monkeypatch):
+    """测试未知预算策略"""
+    monkeypatch.setenv("BUDGET_POLICY", "unknown")
+    with pytest.raises(ValueError, match="未知的预算策略"):
+        WorkflowManager()
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_model_cascade_escalates_after_failed_round(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试模型级联：首轮未达标后写作者和编辑升级到大模型"""
+    monkeypatch.setenv("MODEL_CASCADE", "true")
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续修改"},
+        {"content": "分数：60\n建议：继续修改"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    writer_models = [
+        call.args[0]["llm_config"]["model"]
+        for call in mock_writer_execute.call_args_list
+    ]
+    assert writer_models == ["deepseek-chat-33b", "deepseek-chat-67b"]
+    assert result["cascade"]["writer"]["escalations"] == 1
+    assert result["cascade"]["editor"]["model"] == "deepseek-chat-33b"
+    assert result["cascade"]["creator"]["escalations"] == 0
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_request_coalescing_across_workflows(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试两个工作流同时发出相同请求时只调用一次上游"""
+    monkeypatch.setenv("REQUEST_COALESCING", "true")
+    managers = [_register_all(WorkflowManager()) for _ in range(2)]
+    for manager in managers:
+        manager.update_context({"story_seed": mock_story_seed})
+        # 固定seed的采样结果可复现，才允许合并
+        manager._agent_llm_configs["creator"] = {"temperature": 0.9, "seed": 7}
+
+    async def slow_creator(context):
+        await asyncio.sleep(0.01)
+        return {"content": "故事大纲"}
+
+    mock_creator_execute.side_effect = slow_creator
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    results = await asyncio.gather(*(m.run_workflow() for m in managers))
+
+    assert mock_creator_execute.await_count == 1
+    assert [r["final_draft"] for r in results] == ["修改后的内容"] * 2
+    # 只有发出请求的工作流计入用量
+    creator_calls = [
+        r["budget"]["by_agent"].get("creator", {}).get("calls", 0) for r in results
+    ]
+    assert sorted(creator_calls) == [0, 1]
+    assert sum(r["coalescing"]["coalesced"] for r in results) >= 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+async def test_request_coalescing_skips_unseeded_sampling(
+    mock_creator_execute, monkeypatch
+):
+    """测试temperature大于0且没有固定seed的相同请求不合并，各自采样"""
+    monkeypatch.setenv("REQUEST_COALESCING", "true")
+    managers = [_register_all(WorkflowManager()) for _ in range(2)]
+    for manager in managers:
+        manager._agent_llm_configs["creator"] = {"temperature": 0.9}
+
+    async def slow_creator(context):
+        await asyncio.sleep(0.01)
+        return {"content": "故事大纲"}
+
+    mock_creator_execute.side_effect = slow_creator
+
+    await asyncio.gather(*(m._call_agent("creator", "写大纲") for m in managers))
+
+    assert mock_creator_execute.await_count == 2
+    assert [m.coalesce_stats["coalesced"] for m in managers] == [0, 0]
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_prompts_keep_stable_prefix_and_report_cache_ratio(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试大纲位于草稿之前，并统计前缀缓存命中比例"""
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {
+        "content": "故事内容",
+        "usage": {"prompt_tokens": 100, "prompt_cache_hit_tokens": 60},
+    }
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续修改"},
+        {"content": "分数：60\n建议：继续修改"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    revision_prompt = mock_writer_execute.call_args_list[1].args[0]["prompt"]
+    evaluation_prompt = mock_supervisor_execute.call_args_list[0].args[0]["prompt"]
+    prefix = manager.prompt_builder.prefix("故事大纲")
+    assert prefix.startswith("故事设定：\n标题: 测试故事")
+    assert revision_prompt.startswith(prefix)
+    assert evaluation_prompt.startswith(prefix)
+    assert revision_prompt.index("继续修改") < revision_prompt.index("修改后的内容")
+    assert result["prompt_cache"]["cached_ratio"] == 0.6
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_workflow_publishes_events(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    mock_story_seed,
+):
+    """测试工作流在事件总线上发布运行、阶段、流式片段和评分事件"""
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    subscription = manager.events.subscribe(maxsize=100)
+
+    def streaming_writer(context):
+        context["on_token"]("故事")
+        context["on_token"]("内容")
+        return {"content": "故事内容"}
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.side_effect = streaming_writer
+    mock_editor_execute.return_value = {"content": "修改后的内容"}
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    await manager.run_workflow()
+
+    events = subscription.drain()
+    types = [event["type"] for event in events]
+    assert types[0] == "run_start" and types[-1] == "run_end"
+    assert events[-1]["data"]["status"] == "succeeded"
+    assert [e["data"]["text"] for e in events if e["type"] == "token"] == ["故事", "内容"]
+    assert [e["data"]["score"] for e in events if e["type"] == "score"] == [85.0]
+    assert types.count("stage_start") == types.count("stage_end") == 4
+    assert "on_retry" in mock_creator_execute.call_args.args[0]
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_graph_engine_runs_revision_cycle(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试阶段图引擎：编辑轮次用完后修改，再次编辑后达标结束"""
+    monkeypatch.setenv("WORKFLOW_ENGINE", "graph")
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.side_effect = [
+        {"content": "故事内容"},
+        {"content": "修改后的故事"},
+    ]
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.side_effect = [
+        {"content": "分数：60\n建议：继续修改"},
+        {"content": "分数：85\n建议：很好"},
+    ]
+
+    result = await manager.run_workflow()
+
+    assert result["graph"]["trace"] == [
+        "outline",
+        "draft",
+        "edit",
+        "evaluate",
+        "revise",
+        "edit",
+        "evaluate",
+    ]
+    assert result["final_draft"] == "修改后的故事"
+    revision_prompt = mock_writer_execute.call_args.args[0]["prompt"]
+    assert "继续修改" in revision_prompt
+    mock_save_draft.assert_called_once_with("修改后的故事")
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_graph_engine_zero_score_loop_is_bounded(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试阶段图引擎：评分始终为0时受编辑和修订轮次限制，以当前版本结束而不是报错"""
+    monkeypatch.setenv("WORKFLOW_ENGINE", "graph")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "第一章 初遇\n第二章 重逢"}
+    mock_writer_execute.return_value = {
+        "content": "第一章 初遇\n正文一\n\n第二章 重逢\n跑题的正文"
+    }
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：0\n偏离章节：2"}
+
+    result = await manager.run_workflow()
+
+    trace = result["graph"]["trace"]
+    assert trace.count("outline") <= manager.max_revision_cycles
+    assert trace.count("rewrite_sections") <= 6
+    assert result["final_draft"]
+    mock_save_draft.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_graph_engine_prefetches_edit_while_scoring(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试阶段图引擎：开启推测执行时，下一轮编辑与评分并行执行并被采用"""
+    monkeypatch.setenv("WORKFLOW_ENGINE", "graph")
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    active = 0
+    overlapped = False
+
+    async def edit(context):
+        nonlocal active
+        active += 1
+        await asyncio.sleep(0.01)
+        active -= 1
+        return _echo_editor(context)
+
+    async def supervise(context):
+        nonlocal overlapped
+        await asyncio.sleep(0.005)
+        overlapped = overlapped or active > 0
+        score = 60 if mock_supervisor_execute.call_count == 1 else 85
+        return {"content": f"分数：{score}\n建议：继续"}
+
+    mock_editor_execute.side_effect = edit
+    mock_supervisor_execute.side_effect = supervise
+
+    result = await manager.run_workflow()
+
+    assert overlapped
+    assert "prefetch_edit" in result["graph"]["trace"]
+    assert manager.speculation_stats["hits"] == 1
+    assert mock_editor_execute.call_count == 2
+    assert result["final_draft"] == "故事内容"
+
+
+def test_unknown_workflow_engine(monkeypatch):
+    """测试未知的工作流引擎"""
+    monkeypatch.setenv("WORKFLOW_ENGINE", "unknown")
+    with pytest.raises(ValueError, match="未知的工作流引擎"):
+        WorkflowManager()
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_run_deadline_cancels_hung_call_and_finalizes_best_draft(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试运行超过截止时间时取消挂起的调用，并以评分最高的版本结束"""
+    monkeypatch.setenv("RUN_DEADLINE_SECONDS", "0.3")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    cancelled = asyncio.Event()
+    edits = iter(["较好的版本"])
+
+    async def editor(context):
+        try:
+            return {"content": next(edits)}
+        except StopIteration:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.return_value = {"content": "故事内容"}
+    mock_editor_execute.side_effect = editor
+    mock_supervisor_execute.return_value = {"content": "分数：70\n建议：继续"}
+
+    result = await asyncio.wait_for(manager.run_workflow(), 5)
+
+    assert result["final_draft"] == "较好的版本"
+    assert cancelled.is_set()
+    mock_save_draft.assert_called_once_with("较好的版本")
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_request_timeout_is_retried_not_treated_as_run_deadline(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试单次请求超过LLM配置的timeout时重试，而不是当作运行截止时间结束"""
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    manager._agent_llm_configs["writer"] = {"timeout": 0.1}
+    attempts = 0
+
+    async def write(context):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            await asyncio.sleep(10)
+        return {"content": "故事内容"}
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.side_effect = write
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await asyncio.wait_for(manager.run_workflow(), 5)
+
+    assert attempts == 2
+    assert result["final_draft"] == "故事内容"
+    mock_save_draft.assert_called_once_with("故事内容")
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+async def test_request_timeout_raises_after_retries(
+    mock_writer_execute, mock_creator_execute, monkeypatch, mock_story_seed
+):
+    """测试单次请求重试后仍然超时时抛出RequestTimeout"""
+    monkeypatch.setenv("REQUEST_TIMEOUT_RETRIES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    manager._agent_llm_configs["writer"] = {"timeout": 0.1}
+
+    async def hang(context):
+        await asyncio.sleep(10)
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.side_effect = hang
+
+    with pytest.raises(RequestTimeout, match="writer请求超时"):
+        await asyncio.wait_for(manager.run_workflow(), 5)
+    assert mock_writer_execute.call_count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pipeline", [False, True])
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_stage_timeout_finalizes_best_draft(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    pipeline,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试内置循环和章节流水线的阶段超时：超时的阶段被取消，以目前的最佳版本结束"""
+    monkeypatch.setenv("STAGE_TIMEOUTS", "edit=0.3")
+    monkeypatch.setenv("CONVERGENCE_DETECTION", "false")
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true" if pipeline else "false")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+    # 请求自身的timeout长于阶段超时，超时属于阶段而不是可重试的单次请求
+    manager._agent_llm_configs["editor"] = {"timeout": 5}
+    cancelled = asyncio.Event()
+    edits = 0
+
+    async def editor(context):
+        nonlocal edits
+        edits += 1
+        if edits == 1:
+            return _echo_editor(context)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    if pipeline:
+        mock_creator_execute.return_value = {"content": _PIPELINE_OUTLINE}
+        mock_writer_execute.side_effect = [
+            {"content": "第一章\n正文1"},
+            {"content": "第二章\n正文2"},
+            {"content": "第三章\n正文3"},
+        ]
+        score = 85
+        expected = "第一章\n正文1"
+    else:
+        mock_creator_execute.return_value = {"content": "故事大纲"}
+        mock_writer_execute.return_value = {"content": "故事内容"}
+        score = 70
+        expected = "故事内容"
+    mock_editor_execute.side_effect = editor
+    mock_supervisor_execute.return_value = {"content": f"分数：{score}\n建议：继续"}
+
+    result = await asyncio.wait_for(manager.run_workflow(), 5)
+
+    assert cancelled.is_set()
+    assert edits == 2
+    assert result["final_draft"] == expected
+
+
+def test_unknown_deadline_policy(monkeypatch):
+    """测试未知的截止时间策略"""
+    monkeypatch.setenv("DEADLINE_POLICY", "unknown")
+    with pytest.raises(ValueError, match="未知的截止时间策略"):
+        WorkflowManager()
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_truncated_output_is_continued_and_stitched(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试输出被截断时自动续写，并去掉续写开头重复的内容"""
+    monkeypatch.setenv("MAX_EDITING_CYCLES", "1")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "故事大纲"}
+    mock_writer_execute.side_effect = [
+        {
+            "content": "第一章 春天\n她推开窗，看见院子里的桃花开了",
+            "finish_reason": "length",
+            "usage": {"prompt_tokens": 100, "completion_tokens": 4096},
+        },
+        {
+            "content": "看见院子里的桃花开了，满树粉红。",
+            "finish_reason": "stop",
+            "usage": {"prompt_tokens": 150, "completion_tokens": 20},
+        },
+    ]
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：90\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "第一章 春天\n她推开窗，看见院子里的桃花开了，满树粉红。"
+    assert result["output_tokens"]["continuations"] == 1
+    first_prompt = mock_writer_execute.call_args_list[0].args[0]["prompt"]
+    continuation_prompt = mock_writer_execute.call_args_list[1].args[0]["prompt"]
+    assert continuation_prompt.startswith(first_prompt)
+    assert "长度限制被截断" in continuation_prompt
+    assert result["budget"]["by_agent"]["writer"]["calls"] == 2
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+async def test_continuation_stops_after_limit(mock_writer_execute, monkeypatch):
+    """测试续写次数达到上限后保留已拼接的内容"""
+    monkeypatch.setenv("MAX_CONTINUATIONS", "1")
+    manager = _register_all(WorkflowManager())
+    mock_writer_execute.return_value = {"content": "片段", "finish_reason": "length"}
+
+    result = await manager._call_agent("writer", "写一章")
+
+    assert result["content"] == "片段片段"
+    assert mock_writer_execute.call_count == 2
+    assert manager.output_stats["truncated"] == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_adaptive_max_tokens_sizes_calls(
+    mock_editor_execute, mock_supervisor_execute, monkeypatch
+):
+    """测试按预计输出长度设置max_tokens，且不超过配置的上限"""
+    monkeypatch.setenv("ADAPTIVE_MAX_TOKENS", "true")
+    manager = _register_all(WorkflowManager())
+    manager.current_draft = "短短的一段草稿。"
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+    mock_editor_execute.return_value = {"content": "润色后的草稿。"}
+
+    await manager.evaluate_content("大纲", manager.current_draft)
+    await manager._edit_draft()
+
+    supervisor_config = mock_supervisor_execute.call_args.args[0]["llm_config"]
+    assert supervisor_config["max_tokens"] == 666
+    editor_config = mock_editor_execute.call_args.args[0]["llm_config"]
+    assert editor_config["max_tokens"] == 256
+    assert manager.output_stats["sized_calls"] == 2
+    assert manager.output_stats["reserved_saved"] == (2048 - 666) + (2048 - 256)
+
+    manager.current_draft = "长" * 10000
+    await manager._edit_draft()
+    assert "llm_config" not in mock_editor_execute.call_args.args[0]
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_story_bible_replaces_outline_in_chapter_prompts(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试故事圣经：章节prompt使用前文摘要和结尾，不再包含完整大纲"""
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true")
+    monkeypatch.setenv("STORY_BIBLE", "true")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [
+        {"name": "林晓月", "role": "主角", "age": 24, "occupation": "设计师"}
+    ]
+    manager.update_context({"story_seed": seed})
+
+    outline = "第一章 初遇\n雨夜相遇。\n第二章 重逢\n咖啡馆重逢。\n第三章 告别\n车站告别。"
+    mock_creator_execute.return_value = {"content": outline}
+    writer_prompts = []
+
+    def write(context):
+        writer_prompts.append(context["prompt"])
+        heading = context["prompt"].split("本章大纲：\n", 1)[1].split("\n", 1)[0]
+        return {"content": f"{heading}\n她推开门。雨还在下。故事继续。"}
+
+    mock_writer_execute.side_effect = write
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["chapter_scores"] == [85, 85, 85]
+    assert all("原始大纲：" not in prompt for prompt in writer_prompts)
+    assert "林晓月（主角，24岁，设计师）" in writer_prompts[0]
+    assert "车站告别" not in writer_prompts[0]
+
+    # 已通过的章节进入故事圣经，之后的章节prompt带上前文摘要和前一章结尾
+    prompt = ChapterPipeline(manager)._build_chapter_prompt(
+        {"index": 2, "outline": "第三章 告别", "feedback": None, "text": None}
+    )
+    assert "第一章 初遇：她推开门。…故事继续。" in prompt
+    assert "前文结尾：\n第二章 重逢\n她推开门。" in prompt
+    assert "第三章 告别：" not in prompt
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+async def test_story_bible_windows_full_draft_prompts(
+    mock_supervisor_execute, mock_writer_execute, mock_editor_execute, mock_story_seed
+):
+    """测试故事圣经：完整草稿的评估、修改和润色只带未通过章节的大纲和正文，结果合并回草稿"""
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "周宁"}]
+    manager.update_context({"story_seed": seed})
+    manager.story_bible = StoryBible(seed)
+    manager.fact_index = FactIndex(seed)
+    manager.original_outline = "第一章 初遇\n雨夜相遇。\n\n第二章 重逢\n咖啡馆重逢。"
+    chapter_one = "第一章 初遇\n雨夜，周宁今年十九岁。她犹豫了很久。她推开门。"
+    manager.current_draft = chapter_one + "\n\n第二章 重逢\n他们在海边重逢。"
+
+    # 已通过的章节进入故事圣经，设定索引从正文中确立的事实同时记为既定事实
+    manager._record_accepted_chapter(0, chapter_one)
+    assert "周宁19岁" in manager.story_bible.facts
+
+    mock_supervisor_execute.return_value = {"content": "分数：70\n建议：加强"}
+    await manager.evaluate_content(manager.original_outline, manager.current_draft)
+    prompt = mock_supervisor_execute.call_args.args[0]["prompt"]
+    assert "- 周宁19岁" in prompt
+    assert "待处理章节的大纲：\n第二章 重逢\n咖啡馆重逢。" in prompt
+    # 已通过的章节只以摘要出现在故事圣经中
+    assert "雨夜相遇" not in prompt and "她犹豫了很久" not in prompt
+    assert "第一章 初遇\n（本章已通过" in prompt
+    assert "他们在海边重逢。" in prompt
+
+    # 写作者只返回待处理的章节，已通过的章节原样保留
+    mock_writer_execute.return_value = {"content": "第二章 重逢\n他们在咖啡馆重逢。"}
+    await manager._revise_rejected_draft("建议：加强")
+    assert "她犹豫了很久" not in mock_writer_execute.call_args.args[0]["prompt"]
+    assert manager.current_draft == chapter_one + "\n\n第二章 重逢\n他们在咖啡馆重逢。"
+
+    # 编辑原样保留占位说明时同样只替换待处理的章节
+    mock_editor_execute.side_effect = lambda context: {
+        "content": _echo_editor(context)["content"].replace("咖啡馆", "街角咖啡馆")
+    }
+    await manager._edit_draft()
+    assert manager.current_draft == chapter_one + "\n\n第二章 重逢\n他们在街角咖啡馆重逢。"
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_fact_check_fixes_conflicts_before_evaluation(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试设定预检：疑似错写的人名和其余冲突一起报告，只把所在章节交给编辑"""
+    monkeypatch.setenv("FACT_CHECK", "true")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "林晓月", "age": 24}]
+    manager.update_context({"story_seed": seed})
+
+    chapter_one = "第一章 初遇\n林晓月来到海边。林晓月笑了。"
+    mock_creator_execute.return_value = {"content": "大纲"}
+    mock_writer_execute.return_value = {
+        "content": f"{chapter_one}\n\n第二章 风波\n林晓阅回头，三十岁的林晓月站在那里。"
+    }
+    fix_prompts = []
+
+    def edit(context):
+        if "设定冲突：" in context["prompt"]:
+            fix_prompts.append(context["prompt"])
+            return {"content": "第二章 风波\n林晓月回头，她站在那里。"}
+        return _echo_editor(context)
+
+    mock_editor_execute.side_effect = edit
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == f"{chapter_one}\n\n第二章 风波\n林晓月回头，她站在那里。"
+    # 只有第二章交给编辑修正，且只需一次评分
+    assert len(fix_prompts) == 1
+    assert "三十岁的林晓月" in fix_prompts[0]
+    assert "“林晓阅”（应为：林晓月）" in fix_prompts[0]
+    assert "林晓月来到海边" not in fix_prompts[0]
+    assert mock_supervisor_execute.call_count == 1
+    assert result["fact_check"] == {
+        "flagged": 2,
+        "targeted_fixes": 1,
+        "skipped_evaluations": 0,
+    }
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_fact_check_sends_pipelined_chapter_back_without_scoring(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试流水线中有设定冲突的章节不评分，直接带着冲突列表重写"""
+    monkeypatch.setenv("PIPELINE_CHAPTERS", "true")
+    monkeypatch.setenv("FACT_CHECK", "true")
+    manager = _register_all(WorkflowManager())
+    manager.update_context({"story_seed": mock_story_seed})
+
+    mock_creator_execute.return_value = {"content": "第一章 初遇\n第二章 重逢"}
+
+    def write(context):
+        if "设定冲突" in context["prompt"]:
+            return {"content": "盛夏的午后。"}
+        return {"content": "那年冬天。"}
+
+    mock_writer_execute.side_effect = write
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert result["final_draft"] == "盛夏的午后。\n\n盛夏的午后。"
+    assert mock_writer_execute.call_count == 4
+    assert mock_supervisor_execute.call_count == 2
+    assert result["fact_check"]["skipped_evaluations"] == 2
+    assert manager.fact_index.timeline == {0: ["夏"], 1: ["夏"]}
+
+
+_LOOP_PARAGRAPHS = [
+    "林晓月走在海边，风吹起她的长发，她想起了很多年前那个炎热的夏天。",
+    "陈志远在远处看着她，心里盘算着公司明天就要发布的那款新产品。",
+    "海浪一遍遍拍打着礁石，远处的灯塔在暮色里亮起了第一束光。",
+]
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+async def test_repetition_guard_aborts_looping_stream(mock_writer_execute, monkeypatch):
+    """测试复读检测：流式输出陷入复读时中止调用，只保留不重复的内容"""
+    monkeypatch.setenv("REPETITION_GUARD", "true")
+    manager = _register_all(WorkflowManager())
+    streamed = []
+
+    async def write(context):
+        # 复读的写作者：前三段之后不断重复第二、三段
+        for paragraph in _LOOP_PARAGRAPHS + _LOOP_PARAGRAPHS[1:] * 50:
+            for chunk in (paragraph[:10], paragraph[10:] + "\n"):
+                streamed.append(chunk)
+                context["on_token"](chunk)
+                await asyncio.sleep(0)
+        return {"content": "".join(streamed)}
+
+    mock_writer_execute.side_effect = write
+
+    result = await manager._call_agent("writer", "写一章")
+
+    assert result["finish_reason"] == "repetition"
+    assert result["content"] == "\n".join(_LOOP_PARAGRAPHS)
+    assert len(streamed) < 20
+    metrics = manager.get_repetition_metrics()
+    assert metrics["aborted"] == 1
+    assert metrics["repetition_ratio"] > 0.3
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+async def test_repetition_guard_aborts_coalesced_stream(mock_writer_execute, monkeypatch):
+    """测试复读检测对合并的请求同样生效：所有调用者都中止后取消共享的上游请求"""
+    monkeypatch.setenv("REPETITION_GUARD", "true")
+    monkeypatch.setenv("REQUEST_COALESCING", "true")
+    managers = [_register_all(WorkflowManager()) for _ in range(2)]
+    for manager in managers:
+        manager._agent_llm_configs["writer"] = {"temperature": 0.7, "seed": 3}
+    streamed = []
+
+    async def write(context):
+        for paragraph in _LOOP_PARAGRAPHS + _LOOP_PARAGRAPHS[1:] * 50:
+            for chunk in (paragraph[:10], paragraph[10:] + "\n"):
+                streamed.append(chunk)
+                context["on_token"](chunk)
+                await asyncio.sleep(0)
+        return {"content": "".join(streamed)}
+
+    mock_writer_execute.side_effect = write
+
+    results = await asyncio.gather(
+        *(m._call_agent("writer", "写一章") for m in managers)
+    )
+
+    assert mock_writer_execute.call_count == 1
+    assert len(streamed) < 20
+    for result in results:
+        assert result["finish_reason"] == "repetition"
+        assert result["content"] == "\n".join(_LOOP_PARAGRAPHS)
+    assert [m.get_repetition_metrics()["aborted"] for m in managers] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_repetition_guard_aborts_real_llm_stream(monkeypatch):
+    """测试复读检测通过Agent的流式HTTP请求生效：检测到复读后断开端点的流"""
+    monkeypatch.setenv("REPETITION_GUARD", "true")
+    sent = []
+
+    async def handle(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        try:
+            for paragraph in _LOOP_PARAGRAPHS + _LOOP_PARAGRAPHS[1:] * 50:
+                chunk = {"choices": [{"delta": {"content": paragraph + "\n"}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                sent.append(paragraph)
+                await asyncio.sleep(0.01)
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            pass
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(
+        LLMFactory(),
+        "_config",
+        {
+            "agents": {
+                "writer": {
+                    "llm_config": {
+                        "model": "m",
+                        "api_base": f"http://127.0.0.1:{port}/v1",
+                        "timeout": 10,
+                    }
+                }
+            }
+        },
+    )
+    monkeypatch.setattr(LLMFactory, "_pools", {})
+    manager = WorkflowManager()
+    writer = WriterAgent()
+    manager.register_agent("writer", writer)
+    try:
+        result = await manager._call_agent("writer", "写一章")
+    finally:
+        await writer.close()
+        await runner.cleanup()
+
+    assert result["finish_reason"] == "repetition"
+    assert result["content"] == "\n".join(_LOOP_PARAGRAPHS)
+    assert len(sent) < 20
+    assert manager.get_repetition_metrics()["aborted"] == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_repetition_guard_trims_duplicate_paragraphs(mock_editor_execute, monkeypatch):
+    """测试复读检测：非流式输出中的近似重复段落被删除，重复占比计入统计"""
+    monkeypatch.setenv("REPETITION_GUARD", "true")
+    manager = _register_all(WorkflowManager())
+    first, second, third = _LOOP_PARAGRAPHS
+    mock_editor_execute.return_value = {
+        "content": f"{first}\n\n{second}\n\n{first.replace('，', '、')}\n\n{third}"
+    }
+
+    result = await manager._call_agent("editor", "润色")
+
+    assert result["content"] == f"{first}\n\n{second}\n\n{third}"
+    metrics = manager.get_repetition_metrics()
+    assert metrics["trimmed_paragraphs"] == 1
+    assert metrics["aborted"] == 0
+    assert metrics["repetition_ratio"] == pytest.approx(0.25, abs=0.05)
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+async def test_repetition_guard_keeps_outline_entries(mock_creator_execute, monkeypatch):
+    """测试复读检测不删除大纲中结构相似的段落"""
+    monkeypatch.setenv("REPETITION_GUARD", "true")
+    manager = _register_all(WorkflowManager())
+    first, second, _ = _LOOP_PARAGRAPHS
+    outline = f"{first}\n\n{second}\n\n{first.replace('，', '、')}"
+    mock_creator_execute.return_value = {"content": outline}
+
+    result = await manager._call_agent("creator", "写大纲")
+
+    assert result["content"] == outline
+    assert manager.get_repetition_metrics()["trimmed_paragraphs"] == 0
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+async def test_quality_metrics_prefilter_and_evaluation_signal(
+    mock_supervisor_execute, monkeypatch, mock_story_seed
+):
+    """测试本地质量指标：不合格的草稿不调用审核者直接判0分，合格的草稿附上指标评估"""
+    monkeypatch.setenv("QUALITY_METRICS", "true")
+    monkeypatch.setenv("QUALITY_MIN_CHARS", "40")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "林晓月"}]
+    manager.quality_metrics = QualityMetrics.from_seed(
+        seed, min_chars=manager.quality_min_chars
+    )
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    score, evaluation = await manager.evaluate_content("大纲", "林晓月笑了。")
+    assert score == 0.0
+    assert "正文过短" in evaluation
+    assert mock_supervisor_execute.call_count == 0
+
+    score, _ = await manager.evaluate_content("大纲", "\n\n".join(_LOOP_PARAGRAPHS))
+    assert score == 85.0
+    prompt = mock_supervisor_execute.call_args[0][0]["prompt"]
+    assert "本地指标" in prompt
+    assert "段落数：3" in prompt
+    assert manager.quality_stats == {"measured": 2, "rejected": 1}
+
+
+_GOOD_DRAFT = (
+    "林晓月在城市的夏天遇见了陈志远。\n\n"
+    "“你也在等这班车吗？”陈志远问。林晓月笑着点了点头，晚风吹乱了她的头发。"
+)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["legacy", "graph"])
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_quality_prefilter_reject_revises_instead_of_restarting(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    engine,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试本地预检未通过的草稿带着预检结果交给写作者修改，不重新创作大纲"""
+    monkeypatch.setenv("WORKFLOW_ENGINE", engine)
+    monkeypatch.setenv("QUALITY_METRICS", "true")
+    monkeypatch.setenv("QUALITY_MIN_CHARS", "20")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "林晓月"}, {"name": "陈志远"}]
+    manager.update_context({"story_seed": seed})
+
+    mock_creator_execute.return_value = {"content": "大纲"}
+    mock_writer_execute.side_effect = [
+        {"content": "海边的风很大，浪花一遍遍拍打着礁石，远处的灯塔亮了起来。"},
+        {"content": _GOOD_DRAFT},
+    ]
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert mock_creator_execute.call_count == 1
+    assert mock_writer_execute.call_count == 2
+    revision_prompt = mock_writer_execute.call_args_list[1][0][0]["prompt"]
+    assert "本地预检未通过" in revision_prompt
+    assert "没有出现任何设定中的人物" in revision_prompt
+    assert mock_supervisor_execute.call_count == 1
+    assert result["final_draft"] == _GOOD_DRAFT
+    assert result["quality"]["rejected"] == 1
+
+
+@pytest.mark.asyncio
+@patch("novelist.core.workflow.WorkflowManager._save_draft")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+@patch("novelist.agents.writer_agent.WriterAgent.execute")
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.editor_agent.EditorAgent.execute")
+async def test_best_of_n_keeps_locally_best_first_draft(
+    mock_editor_execute,
+    mock_supervisor_execute,
+    mock_writer_execute,
+    mock_creator_execute,
+    mock_save_draft,
+    monkeypatch,
+    mock_story_seed,
+):
+    """测试多候选生成：首稿并发生成N个候选，只有本地排名第一的候选进入编辑"""
+    monkeypatch.setenv("BEST_OF_N", "3")
+    monkeypatch.setenv("BEST_OF_STAGES", "draft")
+    monkeypatch.setenv("QUALITY_MIN_CHARS", "20")
+    manager = _register_all(WorkflowManager())
+    seed = dict(mock_story_seed)
+    seed["characters"] = [{"name": "林晓月"}, {"name": "陈志远"}]
+    manager.update_context({"story_seed": seed})
+
+    mock_creator_execute.return_value = {"content": "大纲"}
+    seeds = []
+
+    def write(context):
+        seeds.append(context["llm_config"]["seed"])
+        if context["llm_config"]["seed"] == 1:
+            return {"content": _GOOD_DRAFT}
+        return {"content": "\n\n".join([_LOOP_PARAGRAPHS[0]] * 6)}
+
+    mock_writer_execute.side_effect = write
+    mock_editor_execute.side_effect = _echo_editor
+    mock_supervisor_execute.return_value = {"content": "分数：85\n建议：很好"}
+
+    result = await manager.run_workflow()
+
+    assert sorted(seeds) == [0, 1, 2]
+    assert mock_creator_execute.call_count == 1
+    assert result["final_draft"] == _GOOD_DRAFT
+    assert result["best_of"] == {
+        "rounds": 1,
+        "candidates": 3,
+        "failed": 0,
+        "judged": 0,
+        "judge_overrides": 0,
+    }
+
+
+@pytest.mark.asyncio
+@patch("novelist.agents.supervisor_agent.SupervisorAgent.execute")
+@patch("novelist.agents.creator_agent.CreatorAgent.execute")
+async def test_best_of_n_judge_confirms_winner(
+    mock_creator_execute, mock_supervisor_execute, monkeypatch, mock_story_seed
+):
+    """测试多候选生成：审核者一次调用在排名靠前的候选中选出最优者，失败的候选被忽略"""
+    monkeypatch.setenv("BEST_OF_N", "3")
+    monkeypatch.setenv("BEST_OF_JUDGE", "true")
+    monkeypatch.setenv("BEST_OF_JUDGE_TOP", "2")
+    manager = _register_all(WorkflowManager())
+    manager.candidate_ranker = CandidateRanker(QualityMetrics(min_chars=0))
+    outlines = {
+        0: "第一章 初遇\n两人在海边相遇。\n\n第二章 重逢\n多年后再次相见。",
+        1: "两人在海边相遇，多年后再次相见。",
+    }
+
+    def create(context):
+        sample = context["llm_config"]["seed"]
+        if sample == 2:
+            raise RuntimeError("连接失败")
+        return {"content": outlines[sample]}
+
+    mock_creator_execute.side_effect = create
+    mock_supervisor_execute.return_value = {"content": "最佳候选：2\n理由：更简洁"}
+
+    result = await manager._generate_best("outline", "creator", "写大纲", sectioned=True)
+
+    assert result["content"] == outlines[1]
+    assert mock_supervisor_execute.call_count == 1
+    judge_prompt = mock_supervisor_execute.call_args[0][0]["prompt"]
+    # 按本地排名交给审核者：划分了章节的大纲排在前面
+    assert judge_prompt.index("候选1：\n第一章") < judge_prompt.index("候选2：\n两人")
+    assert manager.best_of_stats == {
+        "rounds": 1,
+        "candidates": 2,
+        "failed": 1,
+        "judged": 1,
+        "judge_overrides": 1,
+    }
+
+
+def test_unknown_best_of_stage(monkeypatch):
+    """测试未知的多候选阶段"""
+    monkeypatch.setenv("BEST_OF_STAGES", "outline,edit")
+    with pytest.raises(ValueError, match="未知的多候选阶段"):
+        WorkflowManager()